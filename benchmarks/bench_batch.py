@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""
+Benchmark for batch rendering in worker processes.
+
+Writes (or, with --render, renders and returns) a batch of large pages with
+OpenPost.write_batch() using increasing numbers of worker processes, and reports the throughput
+and speedup over rendering in a single process.  With one worker the batch is rendered in the
+calling process, the same as the inline baseline.  Run from the root of the repository:
+
+    python benchmarks/bench_batch.py --pages 10000 --fields 20 --size 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpost     # noqa: E402  pylint: disable=wrong-import-position
+
+
+def make_forms(pages, fields, size):
+    """Generate the form data for each page."""
+    value = 'x' * size
+    for page in range(pages):
+        yield {'field{0}'.format(field): '{0} {1}'.format(page, value) for field in range(fields)}
+
+
+def run(poster, args, workers):
+    """Write or render the batch, returning the elapsed time in seconds."""
+    forms = make_forms(args.pages, args.fields, args.size)
+    start = time.perf_counter()
+    if not args.render:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster.file_name = os.path.join(temp_dir, 'page')
+            poster.write_batch(forms, workers=workers, chunk_size=args.chunk_size)
+            return time.perf_counter() - start
+    for _page in poster.render_batch(forms, workers=workers, chunk_size=args.chunk_size):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark."""
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Benchmark OpenPost batch rendering in worker processes.")
+    parser.add_argument("--pages", type=int, default=10000, help="Number of pages in the batch (default: 10000)")
+    parser.add_argument("--fields", type=int, default=20, help="Number of fields in each page (default: 20)")
+    parser.add_argument("--size", type=int, default=2000, help="Size of each field value (default: 2000)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Pages rendered by a worker at a time (default: 100)")
+    parser.add_argument("--workers", type=int, nargs='+', default=sorted({1, 2, 4, cpus}),
+                        help="Numbers of worker processes to try (default: 1 2 4 and the number of CPUs)")
+    parser.add_argument("--render", action='store_true', help="Return the rendered pages to the parent process rather than writing them to files")
+    args = parser.parse_args()
+
+    poster = openpost.OpenPost('https://example.com/submit', manifest=False)
+    baseline = run(poster, args, 0)
+    print("{0} pages, {1} fields of {2} characters, {3} CPUs".format(args.pages, args.fields, args.size, cpus))
+    print("{0:>8}  {1:>10}  {2:>12}  {3:>8}".format('workers', 'seconds', 'pages/sec', 'speedup'))
+    print("{0:>8}  {1:>10.3f}  {2:>12.0f}  {3:>8.2f}".format('inline', baseline, args.pages / baseline, 1))
+    for workers in args.workers:
+        elapsed = run(poster, args, workers)
+        print("{0:>8}  {1:>10.3f}  {2:>12.0f}  {3:>8.2f}".format(workers, elapsed, args.pages / elapsed, baseline / elapsed))
+
+
+if __name__ == "__main__":
+    main()
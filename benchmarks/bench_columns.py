@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+
+"""
+Benchmark for columnar bulk rendering.
+
+Renders one page per row of a table, first by building an OpenPost object for each row and
+calling make_html(), then with OpenPost.render_columns(), and reports the throughput of each.
+Run from the root of the repository:
+
+    python benchmarks/bench_columns.py --rows 20000 --columns 10
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpost     # noqa: E402  pylint: disable=wrong-import-position
+
+
+def make_columns(rows, columns, size):
+    """Make the columnar data for the table."""
+    return {'column{0}'.format(column): ['{0} {1}'.format(row, 'x' * size) for row in range(rows)] for column in range(columns)}
+
+
+def by_row(url, data):
+    """Render each row with its own OpenPost object, returning the elapsed time in seconds."""
+    start = time.perf_counter()
+    keys = list(data.keys())
+    for values in zip(*data.values()):
+        openpost.OpenPost(url, form_data=dict(zip(keys, values)), manifest=False).make_html()
+    return time.perf_counter() - start
+
+
+def by_column(url, data):
+    """Render every row with render_columns(), returning the elapsed time in seconds."""
+    start = time.perf_counter()
+    for _page in openpost.OpenPost(url, manifest=False).render_columns(data):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark OpenPost columnar bulk rendering.")
+    parser.add_argument("--rows", type=int, default=20000, help="Number of rows in the table (default: 20000)")
+    parser.add_argument("--columns", type=int, default=10, help="Number of columns in the table (default: 10)")
+    parser.add_argument("--size", type=int, default=20, help="Size of each value (default: 20)")
+    args = parser.parse_args()
+
+    url = 'https://example.com/submit'
+    data = make_columns(args.rows, args.columns, args.size)
+    print("{0} rows, {1} columns of {2} characters".format(args.rows, args.columns, args.size))
+    print("{0:>8}  {1:>10}  {2:>12}  {3:>8}".format('method', 'seconds', 'pages/sec', 'speedup'))
+    baseline = by_row(url, data)
+    print("{0:>8}  {1:>10.3f}  {2:>12.0f}  {3:>8.2f}".format('row', baseline, args.rows / baseline, 1))
+    elapsed = by_column(url, data)
+    print("{0:>8}  {1:>10.3f}  {2:>12.0f}  {3:>8.2f}".format('column', elapsed, args.rows / elapsed, baseline / elapsed))
+
+
+if __name__ == "__main__":
+    main()
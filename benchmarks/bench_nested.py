@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""
+Benchmark for rendering a nested document as form data.
+
+Compares flattening the document by hand in Python (walking it recursively and calling
+add_key() for each leaf) and then rendering, with passing the document as the form data and
+letting the renderer flatten it as it goes, reporting the time for each.  Run from the root of
+the repository:
+
+    python benchmarks/bench_nested.py --records 1000 --fields 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpost     # noqa: E402  pylint: disable=wrong-import-position
+
+
+def add_leaves(poster, path, value):
+    """Add the leaves of a nested value to the form data one key at a time."""
+    if isinstance(value, dict):
+        for name, child in value.items():
+            add_leaves(poster, '{0}[{1}]'.format(path, name), child)
+    else:
+        poster.add_key(path, value)
+
+
+def by_hand(document):
+    """Flatten the document with add_key(), then render it."""
+    poster = openpost.OpenPost('https://example.com/submit')
+    for key, value in document.items():
+        add_leaves(poster, key, value)
+    return poster.make_html_bytes()
+
+
+def native(document):
+    """Render the document as nested form data."""
+    return openpost.OpenPost('https://example.com/submit', form_data=document).make_html_bytes()
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark OpenPost rendering of nested form data.")
+    parser.add_argument("--records", type=int, default=1000, help="Number of records in the document (default: 1000)")
+    parser.add_argument("--fields", type=int, default=100, help="Number of fields in each record (default: 100)")
+    args = parser.parse_args()
+
+    document = {'records': {str(record): {'field{0}'.format(field): 'value' for field in range(args.fields)} for record in range(args.records)}}
+    print("{0} leaves".format(args.records * args.fields))
+    print("{0:>10}  {1:>10}  {2:>12}".format('method', 'seconds', 'bytes'))
+    for name, method in (('by hand', by_hand), ('native', native)):
+        start = time.perf_counter()
+        page = method(document)
+        elapsed = time.perf_counter() - start
+        print("{0:>10}  {1:>10.3f}  {2:>12}".format(name, elapsed, len(page)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+
+"""
+Benchmark for rendering and writing small pages.
+
+Compares the text path (make_html() followed by a buffered text write, as write_html() used to
+do) with the pre-encoded path (make_html_bytes(), and write_html() writing the encoded segments
+with os.writev()), reporting the pages per second for each.  Run from the root of the
+repository:
+
+    python benchmarks/bench_render.py --pages 20000 --fields 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpost     # noqa: E402  pylint: disable=wrong-import-position
+
+
+def text_render(poster, pages):
+    """Render each page with make_html()."""
+    for _page in range(pages):
+        poster.make_html()
+
+
+def bytes_render(poster, pages):
+    """Render each page with make_html_bytes()."""
+    for _page in range(pages):
+        poster.make_html_bytes()
+
+
+def text_write(poster, pages):
+    """Render each page with make_html() and write it with a buffered text write."""
+    for _page in range(pages):
+        html = poster.make_html()
+        with open(poster.file_name, 'w', encoding='utf-8') as output_file:
+            output_file.write(html)
+
+
+def bytes_write(poster, pages):
+    """Render and write each page with write_html(), using the encoded segments and os.writev()."""
+    for _page in range(pages):
+        poster.write_html()
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark OpenPost rendering and writing of small pages.")
+    parser.add_argument("--pages", type=int, default=20000, help="Number of pages to render (default: 20000)")
+    parser.add_argument("--fields", type=int, default=10, help="Number of fields in each page (default: 10)")
+    parser.add_argument("--size", type=int, default=20, help="Size of each field value (default: 20)")
+    args = parser.parse_args()
+
+    form_data = {'field{0}'.format(field): 'x' * args.size for field in range(args.fields)}
+    print("{0} pages, {1} fields of {2} characters".format(args.pages, args.fields, args.size))
+    print("{0:>16}  {1:>10}  {2:>12}".format('method', 'seconds', 'pages/sec'))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        poster = openpost.OpenPost('https://example.com/submit', os.path.join(temp_dir, 'page'), form_data=form_data, manifest=False)
+        for name, method in (('make_html', text_render), ('make_html_bytes', bytes_render), ('text write', text_write), ('writev', bytes_write)):
+            start = time.perf_counter()
+            method(poster, args.pages)
+            elapsed = time.perf_counter() - start
+            print("{0:>16}  {1:>10.3f}  {2:>12.0f}".format(name, elapsed, args.pages / elapsed))
+
+
+if __name__ == "__main__":
+    main()
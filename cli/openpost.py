@@ -24,18 +24,41 @@
 #   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
 #                                                                               #
 #################################################################################
+# pylint: disable=too-many-lines
 """
 Python script used to open a POST request from the command line in a browser window.
 """
 
 import argparse
+import atexit
+import bisect
+import collections
+import contextlib
+import cProfile
+import csv
+import ctypes
+import gzip
+import hashlib
 import html
+import itertools
+import json
+import mmap
 import os
+import re
+import select
+import struct
+import subprocess
 import sys
 import time
+import tracemalloc
 import uuid
 import webbrowser
 
+try:
+    import fcntl
+except ImportError:     # Not available on Windows, where the manifest is not locked.
+    fcntl = None
+
 SCRIPT_NAME = 'OpenPost'
 SCRIPT_VERS = '0.05'
 SCRIPT_COPYRIGHT = '2019-2020'
@@ -46,6 +69,48 @@ DEFAULT_HTML_FILE = 'openpost.html'
 DEFAULT_TIME_TO_LIVE = 5
 DEFAULT_STDIN_KEY = 'stdin'
 
+MANIFEST_NAME = '.openpost-manifest'
+ORPHAN_GRACE = 60
+STARTUP_SWEEP_LIMIT = 1000
+COMPACT_LINES = 1000        # Minimum number of lines appended to a manifest between compactions
+MANIFEST_BATCH = 1000       # Number of files written with --vary before they are added to the manifest
+UNIQUE_NAME_ATTEMPTS = 100
+DEFAULT_SHARD_WIDTH = 2
+MAX_SHARD_WIDTH = 8
+HEX_DIGITS = frozenset('0123456789abcdef')
+READ_GRACE = 0.5
+STREAM_CHUNK_SIZE = 65536
+DEFAULT_MAX_PAGES = 20
+REMOTE_TIMEOUT = 5
+BATCH_CONTROLLERS = (webbrowser.Mozilla, webbrowser.Chrome)    # Browser commands accepting several urls
+ARCHIVE_LOCK_NAME = '.openpost-archive.lock'
+ARCHIVE_SEGMENT_NAME = 'segment-{0:06d}'
+ARCHIVE_SEGMENT_PATTERN = re.compile(r'^segment-(\d{6})\.gz$')
+EXPIRY_PATTERN = re.compile(r'^(\d+(?:\.\d*)?)\t', re.MULTILINE)
+ARCHIVE_SEGMENT_SIZE = 4 * 1024 * 1024
+DEFAULT_ARCHIVE_SIZE = 256
+WATCH_POLL_INTERVAL = 0.5
+
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_CLOEXEC = 0o2000000
+
+NAME_COUNTER = itertools.count(1)
+
+#   Number of lines which may still be appended to each manifest (by path) in this run before it is
+#   compacted, so that --vary and --watch do not grow a manifest without limit between sweeps.
+APPENDS_LEFT = {}
+
+#   Upper bounds (in seconds) of the buckets used for timing histograms in the run statistics.
+TIME_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+STATS = {'counters': {}, 'gauges': {}, 'histograms': {}}
+
+#   Wall time (in seconds) spent in each phase of the run, reported by --profile.
+PHASES = {}
+
 HTML_TEMPLATE = """\
 <html>
   <head>
@@ -60,6 +125,12 @@ HTML_TEMPLATE = """\
 </html>
 """
 
+STDIN_OPEN = "\n<textarea name='{0}' id='{0}' form='postform' style='display: none;'>"
+STDIN_CLOSE = "</textarea>\n"
+NON_SPACE = re.compile(rb'\S')
+TEXT_SPECIALS = re.compile(rb'[&<>]')
+TEXT_ESCAPES = {b'&': b'&amp;', b'<': b'&lt;', b'>': b'&gt;'}
+
 ########################################
 #   Error messages and return values   #
 ########################################
@@ -76,6 +147,14 @@ ERRORS = {
     109: "Invalid POST data item: No key/value separator.",
     110: "Invalid POST data item: No key specified.",
     111: "Invalid POST data: Empty list.",
+    112: "Unable to create temporary file: No unique name available.",
+    113: "Unable to write temporary file.",
+    114: "Unable to open temporary file in a browser.",
+    115: "Invalid shard layout.  Must be DEPTH or DEPTH:WIDTH, with WIDTH between 1 and 8 and DEPTH * WIDTH no more than 40.",
+    116: "Unable to write to output.",
+    117: "Unable to read form data file.",
+    118: "Invalid form data file: Must be a JSON object, a JSON list of [key, value] pairs, or a CSV file of key,value rows.",
+    119: "Nothing to watch: --watch needs form data read from files (KEY=@FILE, --json or --csv).",
 }
 
 
@@ -97,8 +176,620 @@ def date_filename():
     return time.strftime('%Y%m%d%H%M%S') + '.html'
 
 
+def unique_filename():
+    """Provides an html file name that will not collide with one chosen by another run, made
+    from the process id, a per-process counter and a random suffix.
+
+    Returns:
+        str -- File name
+    """
+    return 'openpost-{0}-{1}-{2}.html'.format(os.getpid(), next(NAME_COUNTER), uuid.uuid4().hex[:8])
+
+
+def shard_path(file_name, shard):
+    """Make the sharded subdirectory path for a file name.  Each level is named with hex digits
+    taken from a hash of the file name.  The layout matches the one used by the openpost module.
+
+    Arguments:
+        file_name {str} -- The file name
+        shard {tuple} -- (depth, width) of the sharded subdirectories
+
+    Returns:
+        str -- The relative path of the subdirectory, or '' if not sharded
+    """
+    depth, width = shard
+    if not depth:
+        return ''
+    digest = hashlib.sha1(file_name.encode('utf-8')).hexdigest()
+    return os.path.join(*[digest[level * width:(level + 1) * width] for level in range(depth)])
+
+
+def write_html_file(file_path, file_name, html_text, exclusive=False, shard=(0, DEFAULT_SHARD_WIDTH)):
+    """Write the temporary html file.  When exclusive, the file is only created if it does not
+    already exist (using O_EXCL), and a unique file name is used instead if it does.  This stops
+    concurrent runs sharing an output directory from overwriting (and then deleting) each
+    other's files.
+
+    Arguments:
+        file_path {str} -- Path to the directory for storing the temporary html file
+        file_name {str} -- The name to use when storing the temporary html file
+        html_text {str|iterable} -- The content of the html file, as a string or an iterable of bytes chunks
+
+    Keyword Arguments:
+        exclusive {bool} -- Never overwrite an existing file (default: {False})
+        shard {tuple} -- (depth, width) of the sharded subdirectories to store the file in (default: {(0, 2)})
+
+    Returns:
+        str -- Path and name of the file written
+    """
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_EXCL if exclusive else os.O_TRUNC)
+    for _attempt in range(UNIQUE_NAME_ATTEMPTS):
+        subdirectory = shard_path(file_name, shard)
+        if subdirectory:
+            os.makedirs(os.path.join(file_path, subdirectory), exist_ok=True)
+        html_file = os.path.join(file_path, subdirectory, file_name)
+        try:
+            handle = os.open(html_file, flags, 0o644)
+        except FileExistsError:
+            file_name = unique_filename()
+            continue
+        start = time.perf_counter()
+        try:
+            with open(handle, 'wb') as output_file:
+                if isinstance(html_text, str):
+                    output_file.write(html_text.encode('utf-8'))
+                else:
+                    output_file.writelines(html_text)
+                size = output_file.tell()
+        except BaseException:
+            #   Don't leave a partial file behind if streaming the content fails.
+            os.remove(html_file)
+            raise
+        observe_stat('write_seconds', time.perf_counter() - start)
+        count_stat('pages_written')
+        count_stat('bytes_written', size)
+        return html_file
+    exit_with_error(112)
+    return None
+
+
+########################################
+#   Manifest of written files          #
+########################################
+
+class LockedManifest():
+    """Opens the manifest file for a directory, holding an exclusive lock (or a shared lock,
+    if only reading) while in use.  The manifest lists one written file per line as
+    "EXPIRY<tab>NAME", where an expiry of "-" marks a file to be kept.  The format is shared
+    with the openpost module.  The same locking is used for the lock file of an archive directory.
+    """
+
+    def __init__(self, file_path, file_name=MANIFEST_NAME, shared=False):
+        self.path = os.path.join(file_path, file_name)
+        self.shared = shared
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'a+', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self.handle
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.handle.close()
+
+
+def read_manifest(handle):
+    """Read the entries from an open manifest file.
+
+    Arguments:
+        handle {file} -- The open manifest file
+
+    Returns:
+        dict -- Mapping of file name to expiry time (None if the file is to be kept)
+    """
+    handle.seek(0)
+    return parse_manifest(handle)
+
+
+def parse_manifest(lines):
+    """Parse the entries from the lines of a manifest.
+
+    Arguments:
+        lines {iterable} -- The lines of the manifest
+
+    Returns:
+        dict -- Mapping of file name to expiry time (None if the file is to be kept)
+    """
+    entries = {}
+    for line in lines:
+        expires, _sep, name = line.rstrip('\n').partition('\t')
+        if not name:
+            continue
+        try:
+            entries[name] = None if expires == '-' else float(expires)
+        except ValueError:
+            continue
+    return entries
+
+
+def manifest_entry(name, expires):
+    """Format a manifest entry.
+
+    Arguments:
+        name {str} -- File name relative to the output directory
+        expires {float} -- Expiry time, or None if the file is to be kept
+
+    Returns:
+        str -- The manifest line
+    """
+    return '{0}\t{1}\n'.format('-' if expires is None else '{0:.3f}'.format(expires), name)
+
+
+def record_file(html_file, expires, file_path=None):
+    """Add a written html file to the manifest of a directory.
+
+    Arguments:
+        html_file {str} -- Path and name of the html file
+        expires {float} -- Expiry time, or None if the file is to be kept
+
+    Keyword Arguments:
+        file_path {str} -- Directory holding the manifest, if the file is in a sharded subdirectory
+                           of it (default: {None}, the directory containing the file)
+    """
+    if file_path is None:
+        file_path, file_name = os.path.split(html_file)
+    else:
+        file_name = os.path.relpath(html_file, file_path).replace(os.sep, '/')
+    append_manifest(file_path or '.', [manifest_entry(file_name, expires)])
+
+
+def record_files(html_files, expires, file_path):
+    """Add a number of written html files to the manifest of a directory in a single update.
+
+    Arguments:
+        html_files {list} -- Path and name of each html file, within the directory or a sharded subdirectory of it
+        expires {float} -- Expiry time, or None if the files are to be kept
+        file_path {str} -- Directory holding the manifest
+    """
+    if html_files:
+        append_manifest(file_path, [manifest_entry(os.path.relpath(html_file, file_path).replace(os.sep, '/'), expires)
+                                    for html_file in html_files])
+
+
+def append_manifest(file_path, lines):
+    """Append entries to the manifest of a directory.  After every COMPACT_LINES lines appended
+    by this run (or as many lines as the manifest held after its last compaction, if more), the
+    manifest is rewritten without the repeated entries for a name and the entries for expired
+    files which no longer exist, as the openpost module does.
+
+    Arguments:
+        file_path {str} -- The directory holding the manifest
+        lines {list} -- The manifest lines to append
+    """
+    with LockedManifest(file_path) as handle:
+        handle.write(''.join(lines))
+        path = os.path.abspath(handle.name)
+        left = APPENDS_LEFT.get(path, COMPACT_LINES) - len(lines)
+        if left > 0:
+            APPENDS_LEFT[path] = left
+            return
+        now = time.time()
+        entries = {name: expires for name, expires in read_manifest(handle).items()
+                   if expires is None or expires > now or os.path.exists(os.path.join(file_path, name))}
+        rewrite_manifest(handle, entries)
+        APPENDS_LEFT[path] = max(COMPACT_LINES, len(entries))
+
+
+def rewrite_manifest(handle, entries):
+    """Replace the content of an open manifest file with the entries.
+
+    Arguments:
+        handle {file} -- The open manifest file
+        entries {dict} -- Mapping of file name to expiry time
+    """
+    handle.seek(0)
+    handle.truncate()
+    handle.write(''.join(manifest_entry(name, expires) for name, expires in entries.items()))
+
+
+def may_have_expired(text, now):
+    """Check quickly whether the text of a manifest has any entries with an expiry time that has
+    passed, without parsing the entries.  Repeated entries for a name are not checked, so a file
+    may since have been listed again as pending or kept.
+
+    Arguments:
+        text {str} -- The content of the manifest
+        now {float} -- The current time
+
+    Returns:
+        bool -- True if an expired file may be listed
+    """
+    return any(float(expires) <= now for expires in EXPIRY_PATTERN.findall(text))
+
+
+def expired_names(entries, now, limit=None):
+    """List the names of the expired files in the manifest entries, stopping after limit names.
+
+    Arguments:
+        entries {dict} -- Mapping of file name to expiry time
+        now {float} -- The current time
+
+    Keyword Arguments:
+        limit {int} -- Maximum number of names to list (default: {None})
+
+    Returns:
+        list -- The names of the expired files
+    """
+    return list(itertools.islice((name for name, expires in entries.items() if expires is not None and expires <= now), limit))
+
+
+def scan_directory(file_path, shard=(0, DEFAULT_SHARD_WIDTH), prefix=''):
+    """Iterate over the entries in a directory, including those in the sharded subdirectories
+    of the given layout.  Other subdirectories are not entered.
+
+    Arguments:
+        file_path {str} -- The directory to scan
+
+    Keyword Arguments:
+        shard {tuple} -- (depth, width) of the sharded subdirectories (default: {(0, 2)})
+        prefix {str} -- Relative path of the directory from the top directory (default: {''})
+
+    Yields:
+        tuple -- (relative name, os.DirEntry) for each entry
+    """
+    with os.scandir(file_path) as dir_entries:
+        for entry in dir_entries:
+            yield prefix + entry.name, entry
+            depth, width = shard
+            if depth and len(entry.name) == width and HEX_DIGITS.issuperset(entry.name) and entry.is_dir(follow_symlinks=False):
+                yield from scan_directory(entry.path, (depth - 1, width), prefix + entry.name + '/')
+
+
+def is_openpost_file(html_file):
+    """Check whether a file looks like an html file written by OpenPost.
+
+    Arguments:
+        html_file {str} -- Path and name of the html file
+
+    Returns:
+        bool -- True if the file has the OpenPost page title
+    """
+    try:
+        with open(html_file, 'rb') as input_file:
+            return b'<title>OpenPost Redirector</title>' in input_file.read(256)
+    except OSError:
+        return False
+
+
+def remove_expired(file_path, entries, now, limit=None):
+    """Remove the expired html files listed in the manifest, dropping their entries (and those
+    of expired files which no longer exist).  A file modified since it expired has been rewritten
+    under the same name, so it is left alone.  Must be called while holding the manifest lock.
+
+    Arguments:
+        file_path {str} -- The directory holding the manifest
+        entries {dict} -- The manifest entries, which are updated in place
+        now {float} -- The current time
+
+    Keyword Arguments:
+        limit {int} -- Maximum number of files to examine (default: {None})
+
+    Returns:
+        int -- Number of files removed
+    """
+    removed = 0
+    for name in expired_names(entries, now, limit):
+        html_file = os.path.join(file_path, name)
+        try:
+            if os.stat(html_file).st_mtime <= entries[name]:
+                os.remove(html_file)
+                removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError:
+            continue
+        del entries[name]
+    return removed
+
+
+def remove_orphans(file_path, entries, now, limit=None, shard=(0, DEFAULT_SHARD_WIDTH)):
+    """Remove the OpenPost html files not listed in the manifest which are older than the longest
+    allowed time-to-live.  The directory is scanned without holding the lock, and each file found
+    is checked again under the lock before it is removed.
+
+    Arguments:
+        file_path {str} -- The directory to sweep
+        entries {dict} -- The manifest entries read before scanning
+        now {float} -- The current time
+
+    Keyword Arguments:
+        limit {int} -- Maximum number of directory entries to examine (default: {None})
+        shard {tuple} -- (depth, width) of the sharded subdirectories to scan (default: {(0, 2)})
+
+    Returns:
+        int -- Number of files removed
+    """
+    found = [(name, entry.path) for name, entry in itertools.islice(scan_directory(file_path, shard), limit)
+             if name.endswith('.html') and name not in entries and entry.is_file(follow_symlinks=False)]
+    if not found:
+        return 0
+    removed = 0
+    with LockedManifest(file_path) as handle:
+        entries = read_manifest(handle)
+        for name, html_file in found:
+            try:
+                if name in entries or now - os.stat(html_file).st_mtime < ORPHAN_GRACE or not is_openpost_file(html_file):
+                    continue
+                os.remove(html_file)
+            except OSError:
+                continue
+            removed += 1
+    return removed
+
+
+def sweep_files(file_path, limit=None, orphans=False, shard=(0, DEFAULT_SHARD_WIDTH)):
+    """Remove expired html files listed in the manifest, then compact the manifest.  The manifest
+    is first read under a shared lock, and is only locked exclusively (and rewritten) when it
+    lists expired files.  Files are only removed while holding the exclusive lock, so a file being
+    rewritten under the same name by another process is left alone.  Kept files and unlisted
+    files are left alone, unless orphans is set.
+
+    Arguments:
+        file_path {str} -- The directory to sweep
+
+    Keyword Arguments:
+        limit {int} -- Maximum number of listed files, and of directory entries, to examine (default: {None})
+        orphans {bool} -- Also remove unlisted OpenPost html files older than the longest allowed
+                          time-to-live, including those in the sharded subdirectories (default: {False})
+        shard {tuple} -- (depth, width) of the sharded subdirectories searched for orphans (default: {(0, 2)})
+
+    Returns:
+        int -- Number of files removed
+    """
+    now = time.time()
+    removed = 0
+    with LockedManifest(file_path, shared=True) as handle:
+        handle.seek(0)
+        text = handle.read()
+    if may_have_expired(text, now):
+        with LockedManifest(file_path) as handle:
+            entries = read_manifest(handle)
+            count = len(entries)
+            removed = remove_expired(file_path, entries, now, limit)
+            if len(entries) < count:
+                rewrite_manifest(handle, entries)
+    else:
+        entries = parse_manifest(text.split('\n')) if orphans else {}
+    if orphans:
+        removed += remove_orphans(file_path, entries, now, limit, shard)
+    return removed
+
+
+def startup_sweep(file_path):
+    """Run a bounded sweep of the expired files in the output directory, ignoring any errors.
+
+    Arguments:
+        file_path {str} -- The output directory
+    """
+    try:
+        sweep_files(file_path, limit=STARTUP_SWEEP_LIMIT)
+    except OSError:
+        pass
+
+
+########################################
+#   Archive of kept pages              #
+########################################
+
+def archive_segments(archive_path):
+    """List the segment numbers in an archive directory, oldest first.
+
+    Arguments:
+        archive_path {str} -- The archive directory
+
+    Returns:
+        list -- The segment numbers
+    """
+    numbers = []
+    for name in os.listdir(archive_path):
+        match = ARCHIVE_SEGMENT_PATTERN.match(name)
+        if match:
+            numbers.append(int(match.group(1)))
+    return sorted(numbers)
+
+
+def evict_segments(archive_path, max_size):
+    """Remove the oldest segments of an archive until it is within its size limit, always
+    keeping the newest segment.
+
+    Arguments:
+        archive_path {str} -- The archive directory
+        max_size {int} -- Size limit in bytes
+    """
+    segments = archive_segments(archive_path)
+    paths = [[os.path.join(archive_path, ARCHIVE_SEGMENT_NAME.format(number) + extension) for extension in ('.gz', '.idx')] for number in segments]
+    sizes = [sum(os.path.getsize(path) for path in pair if os.path.exists(path)) for pair in paths]
+    total = sum(sizes)
+    for pair, size in zip(paths[:-1], sizes):
+        if total <= max_size:
+            break
+        for path in pair:
+            if os.path.exists(path):
+                os.remove(path)
+        total -= size
+
+
+def archive_pages(archive, pages):
+    """Add pages to an archive of compressed segment files.  Each page is appended to the newest
+    segment as a separate gzip member, with its offset recorded in the segment's index as
+    "OFFSET<tab>LENGTH<tab>TIME<tab>NAME", and a new segment is started once the newest one is
+    full.  The format is shared with the openpost module, which can read the pages back.
+
+    Arguments:
+        archive {tuple} -- (directory, size limit in bytes) of the archive
+        pages {iterable} -- The (name, html text) of each page
+
+    Returns:
+        int -- Number of pages added
+    """
+    archive_path, max_size = archive
+    os.makedirs(archive_path, exist_ok=True)
+    count = 0
+    with LockedManifest(archive_path, ARCHIVE_LOCK_NAME):
+        segments = archive_segments(archive_path)
+        number = segments[-1] if segments else 1
+        for name, html_text in pages:
+            segment = os.path.join(archive_path, ARCHIVE_SEGMENT_NAME.format(number))
+            if os.path.exists(segment + '.gz') and os.path.getsize(segment + '.gz') >= ARCHIVE_SEGMENT_SIZE:
+                number += 1
+                segment = os.path.join(archive_path, ARCHIVE_SEGMENT_NAME.format(number))
+            data = gzip.compress(html_text.encode('utf-8'))
+            with open(segment + '.gz', 'ab') as data_file:
+                offset = data_file.seek(0, os.SEEK_END)
+                data_file.write(data)
+            with open(segment + '.idx', 'a', encoding='utf-8') as index_file:
+                index_file.write('{0}\t{1}\t{2:.3f}\t{3}\n'.format(offset, len(data), time.time(), name))
+            count += 1
+        evict_segments(archive_path, max_size)
+    count_stat('pages_archived', count)
+    return count
+
+
+def archive_name(html_file):
+    """Make a name for a page which is unique to this addition to an archive, from the name of
+    its html file with the time, process id and a sequence number added, such as
+    'openpost-20200315T142501-1234-1.html'.  The form matches the one used by the openpost module.
+
+    Arguments:
+        html_file {str} -- Path and name of the temporary html file
+
+    Returns:
+        str -- The unique name
+    """
+    stem, extension = os.path.splitext(os.path.basename(html_file))
+    return '{0}-{1}-{2}-{3}{4}'.format(stem, time.strftime('%Y%m%dT%H%M%S'), os.getpid(), next(NAME_COUNTER), extension or '.html')
+
+
+def archive_file(html_file, archive, name=None):
+    """Add a temporary html file to an archive, if it still exists.
+
+    Arguments:
+        html_file {str} -- Path and name of the temporary html file
+        archive {tuple} -- (directory, size limit in bytes) of the archive
+
+    Keyword Arguments:
+        name {str} -- Name to add the page under (default: {None}, a unique name made by archive_name())
+    """
+    try:
+        with open(html_file, 'r', encoding='utf-8') as input_file:
+            archive_pages(archive, [(name or archive_name(html_file), input_file.read())])
+    except OSError:
+        pass
+
+
+########################################
+#   Run statistics                     #
+########################################
+
+def count_stat(name, amount=1):
+    """Add to a counter in the run statistics.
+
+    Arguments:
+        name {str} -- Name of the counter
+
+    Keyword Arguments:
+        amount {int} -- Amount to add (default: {1})
+    """
+    STATS['counters'][name] = STATS['counters'].get(name, 0) + amount
+
+
+def set_stat(name, value):
+    """Set a gauge in the run statistics.
+
+    Arguments:
+        name {str} -- Name of the gauge
+        value {int} -- The current value
+    """
+    STATS['gauges'][name] = value
+
+
+def observe_stat(name, value):
+    """Add a timing to a histogram in the run statistics.  The format matches the metrics
+    exported by the openpost module.
+
+    Arguments:
+        name {str} -- Name of the histogram
+        value {float} -- The time observed, in seconds
+    """
+    histogram = STATS['histograms'].setdefault(name, {'count': 0, 'sum': 0.0, 'buckets': dict.fromkeys([str(bound) for bound in TIME_BUCKETS] + ['+Inf'], 0)})
+    index = bisect.bisect_left(TIME_BUCKETS, value)
+    histogram['buckets'][str(TIME_BUCKETS[index]) if index < len(TIME_BUCKETS) else '+Inf'] += 1
+    histogram['count'] += 1
+    histogram['sum'] += value
+
+
+def print_stats():
+    """Print the run statistics to stderr as JSON."""
+    print(json.dumps(STATS, sort_keys=True), file=sys.stderr)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time a phase of the run, adding the wall time to the total for the phase.
+
+    Arguments:
+        name {str} -- Name of the phase
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES[name] = PHASES.get(name, 0.0) + time.perf_counter() - start
+
+
+def print_profile(profiler=None, profile_file=None):
+    """Print the wall time for each phase of the run and the peak memory use to stderr, and
+    save the cProfile statistics if requested.
+
+    Keyword Arguments:
+        profiler {cProfile.Profile} -- The profiler running since the arguments were parsed (default: {None})
+        profile_file {str} -- File to save the profiler statistics to (default: {None})
+    """
+    lines = ['Profile:']
+    for name, seconds in PHASES.items():
+        lines.append('  {0:<16}{1:10.3f} ms'.format(name, seconds * 1000))
+    if tracemalloc.is_tracing():
+        lines.append('  {0:<16}{1:10.1f} KiB'.format('peak memory', tracemalloc.get_traced_memory()[1] / 1024))
+        tracemalloc.stop()
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+        lines.append('  {0:<16}{1}'.format('cProfile stats', profile_file))
+    print('\n'.join(lines), file=sys.stderr)
+
+
+def start_reports(args):
+    """Start profiling the run and register the reports to print on exit, as requested by the
+    --stats, --profile and --profile-file options.
+
+    Arguments:
+        args {object} -- args object from the argparser
+    """
+    if args.stats:
+        atexit.register(print_stats)
+    if args.profile or args.PROFILE_FILE:
+        #   atexit runs the handlers last in, first out, so the profile is printed after the statistics.
+        profiler = None
+        if args.PROFILE_FILE:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        atexit.register(print_profile, profiler, args.PROFILE_FILE)
+        tracemalloc.start()
+
+
 def exit_with_error(error_number=-1):
-    """Print error message and exit with specified error number
+    """Print error message to stderr and exit with specified error number
 
     Arguments:
         error_number {int} -- Error number.
@@ -106,10 +797,10 @@ def exit_with_error(error_number=-1):
     err = int(error_number)
     if err:
         if err in ERRORS:
-            print("\n\n{0}\n\n".format(ERRORS[err],))
+            print("\n\n{0}\n\n".format(ERRORS[err],), file=sys.stderr)
             sys.exit(err)
         else:
-            print("\n\nUnknown error: {0}\n\n".format(err,))
+            print("\n\nUnknown error: {0}\n\n".format(err,), file=sys.stderr)
             sys.exit(err)
     else:
         sys.exit(0)
@@ -134,6 +825,22 @@ def test_url(url_to_test):
     return 0
 
 
+def make_url(args):
+    """Process the destination url information.
+
+    Arguments:
+        args {object} -- args object from the argparser
+
+    Returns:
+        str -- The validated url
+    """
+    url = str(args.url).strip()
+    err = test_url(url)
+    if err:
+        exit_with_error(err)
+    return url
+
+
 def parse_command_arguments(args=None):
     """Set up and process command line arguments.
 
@@ -141,22 +848,190 @@ def parse_command_arguments(args=None):
         dict -- Dictionary of arguments and options
     """
     arg_parser = argparse.ArgumentParser(description="{0} (v{1})\nOpens a POST request from the command line in a browser window.".format(SCRIPT_NAME, SCRIPT_VERS,))
-    arg_parser.add_argument("url", help="The destination URL to send the POST request.", type=str, metavar='URL')
+    arg_parser.add_argument("url", help="The destination URL to send the POST request.", type=str, metavar='URL', nargs='?')
     arg_parser.add_argument("post_data", help="The POST data to send in the form 'key=value'.  Multiple key/value sets are allowed, separated by spaces.",
                             metavar='KEY=VALUE', type=str, nargs='*')
     arg_parser.add_argument("-p", "--file-path", help="Output directory for the temporary HTML file.  Defaults to the current directory.",
                             type=str, metavar='FILEPATH', dest='FILEPATH')
+    arg_parser.add_argument("--shard", help="Spread the temporary HTML files over DEPTH levels of subdirectories of the output directory, "
+                            "each named with WIDTH (default {0}) hex digits from a hash of the file name.".format(DEFAULT_SHARD_WIDTH),
+                            type=str, metavar='DEPTH[:WIDTH]', dest='SHARD')
+    arg_parser.add_argument("--json", help="Add the form fields from a JSON file holding an object, or a list of [key, value] pairs.  May be used more than once.",
+                            type=str, metavar='JSON_FILE', dest='JSON_FILES', action='append')
+    arg_parser.add_argument("--csv", help="Add the form fields from a CSV file of key,value rows.  May be used more than once.",
+                            type=str, metavar='CSV_FILE', dest='CSV_FILES', action='append')
     arg_parser.add_argument("-s", "--stdin", help="Accepts an additional input value from stdin.", action='store_true')
     arg_parser.add_argument("--key", help="Key to use for input from stdin.  Defaults to '{0}'.".format(DEFAULT_STDIN_KEY),
                             type=str, metavar='STDIN_KEY', dest='STDIN_KEY')
     group1 = arg_parser.add_mutually_exclusive_group()
     group1.add_argument("-r", "--random-name", help="Set the temporary HTML file name to a random string.", action='store_true')
     group1.add_argument("-d", "--date-name", help="Set the temporary HTML file name to the current date/time string.", action='store_true')
+    group1.add_argument("-u", "--unique-name", help="Set the temporary HTML file name to a string unique to this run.", action='store_true')
     group1.add_argument("-f", "--file-name", help="Manually set the temporary HTML file name.", type=str, metavar='FILENAME', dest='FILENAME')
     group2 = arg_parser.add_mutually_exclusive_group()
     group2.add_argument("-k", "--keep-file", help="Do not delete the temporary HTML file.", action='store_true')
     group2.add_argument("-t", "--time-to-live", help="Set the number of seconds to wait before deleting the temporary HTML file.", type=float, metavar='SECONDS', dest='SECONDS')
-    return arg_parser.parse_args(args)
+    arg_parser.add_argument("--archive", help="Add kept HTML files (with -k or --vary) to a compressed archive in ARCHIVE_PATH instead of keeping them as separate files.",
+                            type=str, metavar='ARCHIVE_PATH', dest='ARCHIVE_PATH')
+    arg_parser.add_argument("--archive-size", help="Size limit of the archive in megabytes, above which the oldest pages are removed.  Defaults to {0}.".format(DEFAULT_ARCHIVE_SIZE,),
+                            type=float, metavar='MEGABYTES', dest='ARCHIVE_SIZE', default=DEFAULT_ARCHIVE_SIZE)
+    arg_parser.add_argument("-w", "--wait", help="Wait to delete the temporary HTML file before exiting, rather than handing the deletion to a background process.",
+                            action='store_true')
+    arg_parser.add_argument("--vary", help="Write a kept HTML file for every combination of the values for each key varied, without opening a browser unless --launch is used.  "
+                            "Values are separated by commas.  May be used more than once.", type=str, metavar='KEY=VALUE,...', dest='VARY', action='append')
+    arg_parser.add_argument("--launch", help="Open the HTML files written with --vary in the browser, starting the browser once for each group of files.",
+                            action='store_true')
+    arg_parser.add_argument("--max-pages", help="Maximum number of files opened by each browser command with --launch.  Defaults to {0}.".format(DEFAULT_MAX_PAGES),
+                            type=int, metavar='N', dest='MAX_PAGES', default=DEFAULT_MAX_PAGES)
+    group3 = arg_parser.add_mutually_exclusive_group()
+    group3.add_argument("-o", "--output", help="Write the HTML document to OUTPUT ('-' for stdout) instead of a temporary file, without opening a browser.",
+                        type=str, metavar='OUTPUT', dest='OUTPUT')
+    group3.add_argument("--output-fd", help="Write the HTML document to the inherited file descriptor N instead of a temporary file, without opening a browser.",
+                        type=int, metavar='N', dest='OUTPUT_FD')
+    arg_parser.add_argument("--watch", help="Keep running, and open the form again in a new temporary HTML file whenever one of its input files (KEY=@FILE, --json or --csv) "
+                            "changes, re-reading only the changed files.  Stop with Ctrl-C.", action='store_true')
+    arg_parser.add_argument("--stats", help="Print statistics for the run (pages and bytes written, timings, launch failures and files pending removal) to stderr as JSON.",
+                            action='store_true')
+    arg_parser.add_argument("--profile", help="Print the wall time for each phase of the run and the peak memory use to stderr.", action='store_true')
+    arg_parser.add_argument("--profile-file", help="Save cProfile statistics for the run to PROFILE_FILE (implies --profile).",
+                            type=str, metavar='PROFILE_FILE', dest='PROFILE_FILE')
+    arg_parser.add_argument("--sweep", help="Remove expired OpenPost files from the output directory, then exit.", action='store_true')
+    arg_parser.add_argument("--orphans", help="With --sweep, also remove OpenPost files not listed in the manifest that are more than {0} seconds old, "
+                            "including those in the --shard subdirectories.".format(ORPHAN_GRACE,), action='store_true')
+    arg_parser.add_argument("-a", "--after-read", help="Delete the temporary HTML file shortly after the browser has read it (Linux only), using the time-to-live as an upper limit.",
+                            action='store_true')
+    arg_parser.add_argument("--reap", help=argparse.SUPPRESS, type=str, dest='REAP_FILE')
+    arg_parser.add_argument("--archive-name", help=argparse.SUPPRESS, type=str, dest='ARCHIVE_NAME')
+    arg_parser.add_argument("--watch-fd", help=argparse.SUPPRESS, type=int, dest='WATCH_FD')
+    parsed = arg_parser.parse_args(args)
+    if parsed.url is None and not (parsed.sweep or parsed.REAP_FILE):
+        arg_parser.error("the following arguments are required: URL")
+    if parsed.VARY and (parsed.OUTPUT or parsed.OUTPUT_FD is not None):
+        arg_parser.error("argument --vary: not allowed with argument -o/--output or --output-fd")
+    if parsed.launch and not parsed.VARY:
+        arg_parser.error("argument --launch: only allowed with argument --vary")
+    if parsed.ARCHIVE_PATH and not (parsed.keep_file or parsed.VARY or parsed.REAP_FILE) or parsed.ARCHIVE_PATH and parsed.launch:
+        arg_parser.error("argument --archive: only allowed with argument -k/--keep-file or --vary, and not with --launch")
+    if parsed.watch and (parsed.VARY or parsed.OUTPUT or parsed.OUTPUT_FD is not None or parsed.after_read):
+        arg_parser.error("argument --watch: not allowed with argument --vary, -o/--output, --output-fd or -a/--after-read")
+    if parsed.orphans and not parsed.sweep:
+        arg_parser.error("argument --orphans: only allowed with argument --sweep")
+    if parsed.MAX_PAGES < 1:
+        arg_parser.error("argument --max-pages: must be at least 1")
+    return parsed
+
+
+def make_input_item(key, value):
+    """Format a single POST key/value pair as a form <input> item.
+
+    Arguments:
+        key {str} -- The form key
+        value {str} -- The value for the key
+
+    Returns:
+        str -- The form <input> item
+    """
+    return '{0}<input type="hidden" name="{1}" value="{2}">'.format(' ' * 6, html.escape(key), html.escape(value.strip()),)
+
+
+def make_variations(inputs):
+    """Process the --vary inputs, each in the form 'key=value1,value2,...', into the form
+    <input> items for each value of each key.
+
+    Arguments:
+        inputs {list} -- List of the key/values items
+
+    Returns:
+        dict -- Mapping of key to a list of form <input> items, one for each value
+    """
+    variations = {}
+    for item in inputs:
+        info = str(item).strip().split('=', 1)
+        if len(info) < 2:
+            exit_with_error(109)
+        key = info[0].strip()
+        if not key:
+            exit_with_error(110)
+        variations.setdefault(key, []).extend(make_input_item(key, value) for value in info[1].split(','))
+    return variations
+
+
+def render_variations(url, form_data, variations, base):
+    """Render the html for each combination of the values in the variations, one at a time.
+    The form <input> items for each value are only formatted once, and the combinations are
+    never all held in memory.
+
+    Arguments:
+        url {str} -- The validated destination url
+        form_data {list} -- The parts of the form common to all of the combinations (see make_form_parts())
+        variations {dict} -- Mapping of key to a list of form <input> items
+        base {str} -- The name to use as the base for the page names
+
+    Yields:
+        tuple -- (name, html document) for each combination, named from the base with the index of the combination added
+    """
+    total = 1
+    for items in variations.values():
+        total *= len(items)
+    width = len(str(total - 1))
+    separator = '\n' if form_data else ''
+    for index, items in enumerate(itertools.product(*variations.values())):
+        start = time.perf_counter()
+        html_text = render_page(url, form_data + [separator + '\n'.join(items)])
+        observe_stat('render_seconds', time.perf_counter() - start)
+        yield '{0}-{1:0{2}d}.html'.format(base, index, width), html_text
+
+
+def write_variations(file_path, file_name, url, form_data, variations, shard=(0, DEFAULT_SHARD_WIDTH), max_pages=0, archive=None):  # pylint: disable=too-many-arguments
+    """Write a temporary html file for each combination of the values in the variations, one at
+    a time, printing the path and name of each file as it is written.  The files are named from
+    the file name with the index of the combination added, and are kept.  If max_pages is set,
+    the files are also opened in the browser in groups of up to max_pages files, starting the
+    browser once for each group.  If there is an archive, the pages are added to the archive
+    instead of being written to files.
+
+    Arguments:
+        file_path {str} -- Path to the directory for storing the html files
+        file_name {str} -- The name to use as the base for the html file names
+        url {str} -- The validated destination url
+        form_data {list} -- The parts of the form common to all of the combinations (see make_form_parts())
+        variations {dict} -- Mapping of key to a list of form <input> items
+
+    Keyword Arguments:
+        shard {tuple} -- (depth, width) of the sharded subdirectories to store the files in (default: {(0, 2)})
+        max_pages {int} -- Number of files to open with each browser command, or 0 to not open the files (default: {0})
+        archive {tuple} -- (directory, size limit in bytes) of the archive to add the pages to (default: {None})
+
+    Returns:
+        int -- Number of files written (or pages archived)
+    """
+    pages = render_variations(url, form_data, variations, os.path.splitext(file_name)[0])
+    if archive is not None:
+        total = archive_pages(archive, pages)
+        print("Archived {0} pages.".format(total,))
+        return total
+    total = 0
+    launch = []
+    written = []
+    try:
+        for name, html_text in pages:
+            html_file = write_html_file(file_path, name, html_text, shard=shard)
+            written.append(html_file)
+            if len(written) >= MANIFEST_BATCH:
+                record_files(written, None, file_path)
+                written = []
+            print(html_file)
+            total += 1
+            if max_pages:
+                launch.append(html_file)
+                if len(launch) >= max_pages:
+                    launch_pages(launch)
+                    launch = []
+    finally:
+        record_files(written, None, file_path)
+    if launch:
+        launch_pages(launch)
+    return total
 
 
 def make_form_data_string(inputs):
@@ -177,9 +1052,7 @@ def make_form_data_string(inputs):
             exit_with_error(109)
         key = info[0].strip()
         if key:
-            value = html.escape(info[1].strip())
-            key = html.escape(key)
-            data_string += '{0}<input type="hidden" name="{1}" value="{2}">\n'.format(' ' * 6, key, value,)
+            data_string += make_input_item(key, info[1]) + '\n'
         else:
             exit_with_error(110)
     data_string = data_string.strip('\n')
@@ -230,6 +1103,44 @@ def make_file_path(args):
     return file_path
 
 
+def make_archive(args):
+    """Process the archive for kept files.
+
+    Arguments:
+        args {object} -- args object from the argparser
+
+    Returns:
+        tuple -- (directory, size limit in bytes) of the archive, or None if kept files are not archived
+    """
+    archive_path = getattr(args, 'ARCHIVE_PATH', None)
+    if not archive_path:
+        return None
+    return os.path.abspath(archive_path), int(getattr(args, 'ARCHIVE_SIZE', DEFAULT_ARCHIVE_SIZE) * 1024 * 1024)
+
+
+def make_shard(args):
+    """Process the sharded subdirectory layout information.
+
+    Arguments:
+        args {object} -- args object from the argparser
+
+    Returns:
+        tuple -- (depth, width) of the sharded subdirectories
+    """
+    shard = getattr(args, 'SHARD', None)
+    if shard is None:
+        return (0, DEFAULT_SHARD_WIDTH)
+    try:
+        parts = [int(part) for part in str(shard).split(':')]
+    except ValueError:
+        parts = []
+    if len(parts) == 1:
+        parts.append(DEFAULT_SHARD_WIDTH)
+    if len(parts) != 2 or parts[0] < 0 or not 0 < parts[1] <= MAX_SHARD_WIDTH or parts[0] * parts[1] > 40:
+        exit_with_error(115)
+    return tuple(parts)
+
+
 def make_file_name(args):
     """Process the temporary html file name information.
 
@@ -244,6 +1155,8 @@ def make_file_name(args):
         html_file = random_filename()
     elif args.date_name:
         html_file = date_filename()
+    elif args.unique_name:
+        html_file = unique_filename()
     elif 'FILENAME' in vars(args) and getattr(args, 'FILENAME') is not None:
         temp = str(getattr(args, 'FILENAME')).strip()
         if not temp:
@@ -254,69 +1167,792 @@ def make_file_name(args):
     return html_file
 
 
+def watch_reads(html_file):
+    """Start watching the temporary html file for reads using inotify (Linux only).
+
+    Arguments:
+        html_file {str} -- Path and name of the temporary html file
+
+    Returns:
+        int -- The inotify file descriptor, or None if the file cannot be watched
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        watch_fd = libc.inotify_init1(IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if watch_fd < 0:
+        return None
+    if libc.inotify_add_watch(watch_fd, os.fsencode(html_file), IN_OPEN | IN_CLOSE_NOWRITE | IN_DELETE_SELF) < 0:
+        os.close(watch_fd)
+        return None
+    return watch_fd
+
+
+def wait_for_read(watch_fd, time_to_live):
+    """Wait until the watched file has been read (opened and closed without writing).
+
+    Arguments:
+        watch_fd {int} -- The inotify file descriptor
+        time_to_live {float} -- Maximum number of seconds to wait
+
+    Returns:
+        bool -- True if the file was read, otherwise False
+    """
+    deadline = time.monotonic() + time_to_live
+    while time.monotonic() < deadline:
+        if not select.select([watch_fd], [], [], deadline - time.monotonic())[0]:
+            break
+        events = os.read(watch_fd, 4096)
+        for offset in range(0, len(events) - 15, 16):
+            mask = struct.unpack_from('iIII', events, offset)[1]
+            if mask & IN_CLOSE_NOWRITE:
+                return True
+            if mask & IN_DELETE_SELF:
+                return False
+    return False
+
+
+def remove_file_later(html_file, time_to_live, watch_fd=None, archive=None, name=None):
+    """Remove the temporary html file after the time-to-live has passed, or shortly after it
+    has been read if it is being watched for reads, first adding it to the archive if there is
+    one.
+
+    Arguments:
+        html_file {str} -- Path and name of the temporary html file
+        time_to_live {float} -- Seconds to delay before deleting the file
+
+    Keyword Arguments:
+        watch_fd {int} -- inotify file descriptor watching the file for reads (default: {None})
+        archive {tuple} -- (directory, size limit in bytes) of the archive to add the file to (default: {None})
+        name {str} -- Name to add the page to the archive under (default: {None}, a unique name)
+    """
+    start = time.monotonic()
+    if watch_fd is None:
+        time.sleep(time_to_live)
+    else:
+        if wait_for_read(watch_fd, time_to_live):
+            time.sleep(max(0, min(READ_GRACE, time_to_live - (time.monotonic() - start))))
+        os.close(watch_fd)
+    remove_page(html_file, archive, name)
+    set_stat('files_pending', 0)
+    observe_stat('cleanup_lag_seconds', time.monotonic() - start)
+
+
+def detach_cleanup(html_file, time_to_live, watch_fd=None, archive=None, name=None):
+    """Hand the removal of the temporary html file to a detached background process running
+    this script, so that the current run can exit as soon as the browser has been launched.
+
+    Arguments:
+        html_file {str} -- Path and name of the temporary html file
+        time_to_live {float} -- Seconds to delay before deleting the file
+
+    Keyword Arguments:
+        watch_fd {int} -- inotify file descriptor watching the file for reads (default: {None})
+        archive {tuple} -- (directory, size limit in bytes) of the archive to add the file to (default: {None})
+        name {str} -- Name to add the page to the archive under (default: {None}, a unique name)
+    """
+    if os.name == 'nt':
+        options = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        options = {'start_new_session': True}
+    command = [sys.executable, os.path.abspath(__file__), '--reap', os.path.abspath(html_file), '-t', str(time_to_live)]
+    if watch_fd is not None:
+        command += ['--watch-fd', str(watch_fd)]
+        options['pass_fds'] = (watch_fd,)
+    if archive is not None:
+        command += ['--archive', archive[0], '--archive-size', str(archive[1] / (1024 * 1024))]
+        if name:
+            command += ['--archive-name', name]
+    subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=True, **options)  # pylint: disable=consider-using-with
+
+
+def clean_up_later(args, html_file, time_to_live, watch_fd=None, archive=None, name=None):  # pylint: disable=too-many-arguments
+    """Remove the temporary html file once it is due, waiting for it if the -w option is used,
+    or otherwise handing it to a detached background process.
+
+    Arguments:
+        args {object} -- args object from the argparser
+        html_file {str} -- Path and name of the temporary html file
+        time_to_live {float} -- Seconds to delay before deleting the file
+
+    Keyword Arguments:
+        watch_fd {int} -- inotify file descriptor watching the file for reads (default: {None})
+        archive {tuple} -- (directory, size limit in bytes) of the archive to add the file to (default: {None})
+        name {str} -- Name to add the page to the archive under (default: {None}, a unique name)
+    """
+    if args.wait:
+        remove_file_later(html_file, time_to_live, watch_fd, archive, name)
+    else:
+        detach_cleanup(html_file, time_to_live, watch_fd, archive, name)
+
+
+def make_stdin_key(args):
+    """Process the form key to use for the input from stdin.
+
+    Arguments:
+        args {object} -- args object from the argparser
+
+    Returns:
+        str -- The form key for the stdin input
+    """
+    if 'STDIN_KEY' in vars(args).keys() and getattr(args, 'STDIN_KEY') is not None:
+        return str(getattr(args, 'STDIN_KEY')).strip()
+    return DEFAULT_STDIN_KEY
+
+
+def make_form_parts(args):
+    """Process the POST data inputs from the command line and the --json and --csv options into
+    the parts of the form.  The values of 'KEY=@FILE' inputs, and the fields in the --json and
+    --csv files, are not read until the form is rendered (see form_part_chunks()).
+
+    Arguments:
+        args {object} -- args object from the argparser
+
+    Returns:
+        list -- The parts of the form: strings of form items, or tuples describing the files to read
+    """
+    parts = []
+    plain = []
+    for item in args.post_data or []:
+        key, separator, value = str(item).strip().partition('=')
+        if separator and key.strip() and value.startswith('@') and not value.startswith('@@'):
+            if plain:
+                parts.append(make_form_data_string(plain))
+                plain = []
+            parts.append(('file', key.strip(), value[1:]))
+        else:
+            plain.append('{0}={1}'.format(key, value[1:]) if separator and value.startswith('@@') else item)
+    if plain:
+        parts.append(make_form_data_string(plain))
+    parts.extend(('json', path) for path in getattr(args, 'JSON_FILES', None) or [])
+    parts.extend(('csv', path) for path in getattr(args, 'CSV_FILES', None) or [])
+    return parts
+
+
+def make_form_content(args):
+    """Process the POST data inputs (from the command line, form data files and stdin) into the
+    parts of the form.
+
+    Arguments:
+        args {object} -- args object from the argparser
+
+    Returns:
+        list -- The parts of the form (see make_form_parts())
+    """
+    with phase('form data'):
+        form_data = make_form_parts(args)
+    stdin_key = make_stdin_key(args)
+
+    from_stdin = ''
+    if args.stdin:
+        with phase('stdin'):
+            for line in sys.stdin.readlines():
+                from_stdin += line
+            from_stdin = from_stdin.strip()
+
+    if from_stdin:
+        form_data.append(STDIN_OPEN.format(stdin_key) + from_stdin + STDIN_CLOSE)
+
+    return form_data
+
+
+def stripped_range(data):
+    """Find the range of a buffer without its leading and trailing whitespace, without copying it.
+
+    Arguments:
+        data {mmap} -- The buffer
+
+    Returns:
+        tuple -- (start, end) of the stripped data
+    """
+    match = NON_SPACE.search(data)
+    if match is None:
+        return 0, 0
+    start = match.start()
+    end = len(data)
+    while end > start:
+        chunk = data[max(start, end - STREAM_CHUNK_SIZE):end]
+        stripped = chunk.rstrip()
+        if stripped:
+            return start, end - len(chunk) + len(stripped)
+        end -= len(chunk)
+    return start, start
+
+
+def escape_chunk(chunk):
+    """Escape a chunk of UTF-8 encoded text for use inside a <textarea>, as html.escape() does
+    with quote=False.  The characters escaped are never part of a multi-byte character, so the
+    text can be split into chunks anywhere.  A chunk with nothing to escape is returned as is.
+
+    Arguments:
+        chunk {bytes|memoryview} -- The chunk of text
+
+    Returns:
+        bytes|memoryview -- The escaped chunk
+    """
+    if TEXT_SPECIALS.search(chunk) is None:
+        return chunk
+    return TEXT_SPECIALS.sub(lambda match: TEXT_ESCAPES[match.group()], chunk)
+
+
+def file_field_chunks(key, file_name):
+    """Read the value for a form field from a file, with the leading and trailing whitespace
+    removed as for stdin input, and the html special characters escaped.  Regular files are
+    memory-mapped and written straight into the output without being copied into Python strings
+    unless they need escaping.  Other files (such as pipes) are read in chunks.
+
+    Arguments:
+        key {str} -- The form key
+        file_name {str} -- Path and name of the file
+
+    Yields:
+        bytes -- Chunks of the form field
+    """
+    try:
+        with open(file_name, 'rb') as input_file:
+            yield STDIN_OPEN.format(html.escape(key)).encode('utf-8')
+            try:
+                mapped = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                yield from map(escape_chunk, read_stdin_chunks(input_file))
+            else:
+                with mapped:
+                    start, end = stripped_range(mapped)
+                    with memoryview(mapped) as view, view[start:end] as value:
+                        yield escape_chunk(value)
+            yield STDIN_CLOSE.encode('utf-8')
+    except OSError:
+        exit_with_error(117)
+
+
+def json_field_items(file_name):
+    """Read the form fields from a JSON file holding an object, or a list of [key, value] pairs.
+    Values which are not strings are included as JSON text.
+
+    Arguments:
+        file_name {str} -- Path and name of the file
+
+    Yields:
+        tuple -- (key, value) for each field
+    """
+    try:
+        with open(file_name, 'r', encoding='utf-8') as input_file:
+            data = json.load(input_file)
+    except OSError:
+        exit_with_error(117)
+    except ValueError:
+        exit_with_error(118)
+    if isinstance(data, dict):
+        data = list(data.items())
+    if not isinstance(data, list):
+        exit_with_error(118)
+    for item in data:
+        if not isinstance(item, (list, tuple)) or len(item) != 2 or not str(item[0]).strip():
+            exit_with_error(118)
+        key, value = item
+        yield str(key), value if isinstance(value, str) else json.dumps(value)
+
+
+def csv_field_items(file_name):
+    """Read the form fields from a CSV file of key,value rows, one row at a time.  Blank rows are
+    skipped.
+
+    Arguments:
+        file_name {str} -- Path and name of the file
+
+    Yields:
+        tuple -- (key, value) for each field
+    """
+    try:
+        with open(file_name, 'r', encoding='utf-8', newline='') as input_file:
+            for row in csv.reader(input_file):
+                if not row:
+                    continue
+                if len(row) != 2 or not row[0].strip():
+                    exit_with_error(118)
+                yield row[0].strip(), row[1]
+    except OSError:
+        exit_with_error(117)
+    except (csv.Error, UnicodeDecodeError):
+        exit_with_error(118)
+
+
+def form_part_chunks(part):
+    """Render a part of the form.
+
+    Arguments:
+        part {str|tuple} -- A string of form items, or a tuple describing a file to read (see make_form_parts())
+
+    Yields:
+        bytes -- Chunks of the form items
+    """
+    if isinstance(part, str):
+        yield part.encode('utf-8')
+    elif part[0] == 'file':
+        yield from file_field_chunks(part[1], part[2])
+    else:
+        items = json_field_items(part[1]) if part[0] == 'json' else csv_field_items(part[1])
+        for key, value in items:
+            yield ('\n' + make_input_item(key, value)).encode('utf-8')
+
+
+def render_page(url, parts):
+    """Render the html document for the parts of the form.  Pages made only from form items
+    given on the command line are rendered as a string.  Pages with values read from files are
+    rendered lazily, reading the files while the page is being written.
+
+    Arguments:
+        url {str} -- The validated destination url
+        parts {list} -- The parts of the form (see make_form_parts())
+
+    Returns:
+        str|iterator -- The html document as a string, or as an iterator of bytes chunks
+    """
+    if all(isinstance(part, str) for part in parts):
+        return HTML_TEMPLATE.format(url, ''.join(parts))
+    head, tail = HTML_TEMPLATE.split('{1}')
+    return itertools.chain([head.format(url).encode('utf-8')], itertools.chain.from_iterable(map(form_part_chunks, parts)), [tail.encode('utf-8')])
+
+
+def part_bytes(part):
+    """Render a part of the form into bytes which can be kept and reused for later pages.
+
+    Arguments:
+        part {str|tuple} -- A string of form items, or a tuple describing a file to read (see make_form_parts())
+
+    Returns:
+        bytes -- The form items
+    """
+    return b''.join(bytes(chunk) for chunk in form_part_chunks(part))
+
+
+def file_signature(file_name):
+    """Get the details of a file which change when it is rewritten or replaced.
+
+    Arguments:
+        file_name {str} -- Path and name of the file
+
+    Returns:
+        tuple -- (inode, size, modification time in nanoseconds), or None if the file cannot be read
+    """
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def watch_directories(file_names):
+    """Start watching the directories holding the input files for files written or moved into
+    place using inotify (Linux only).  Directories are watched rather than the files, so that
+    files replaced by editors saving through a rename are still seen.
+
+    Arguments:
+        file_names {set} -- Absolute path and name of each input file
+
+    Returns:
+        int -- The inotify file descriptor, or None if the directories cannot be watched
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        watch_fd = libc.inotify_init1(IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if watch_fd < 0:
+        return None
+    for directory in {os.path.dirname(file_name) for file_name in file_names}:
+        if libc.inotify_add_watch(watch_fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(watch_fd)
+            return None
+    return watch_fd
+
+
+def remove_page(html_file, archive=None, name=None):
+    """Remove a temporary html file, first adding it to the archive if there is one.
+
+    Arguments:
+        html_file {str} -- Path and name of the temporary html file
+
+    Keyword Arguments:
+        archive {tuple} -- (directory, size limit in bytes) of the archive to add the file to (default: {None})
+        name {str} -- Name to add the page to the archive under (default: {None}, a unique name)
+    """
+    if archive is not None:
+        archive_file(html_file, archive, name)
+    if os.path.exists(html_file):
+        os.remove(html_file)
+
+
+def wait_for_changes(signatures, watch_fd, pending, archive=None):
+    """Wait until one or more of the input files change, removing the temporary html files whose
+    time-to-live has passed meanwhile.  The files are checked whenever the inotify watch reports
+    activity in their directories, or every WATCH_POLL_INTERVAL seconds if there is no watch.
+
+    Arguments:
+        signatures {dict} -- Mapping of the path of each input file to its signature when last read (see file_signature())
+        watch_fd {int} -- inotify file descriptor watching the directories of the input files, or None to poll
+        pending {deque} -- (deadline, path) of each temporary html file waiting to be removed, in order of deadline
+
+    Keyword Arguments:
+        archive {tuple} -- (directory, size limit in bytes) of the archive to add removed files to (default: {None})
+
+    Returns:
+        set -- Paths of the input files which have changed
+    """
+    while True:
+        now = time.monotonic()
+        while pending and pending[0][0] <= now:
+            remove_page(pending.popleft()[1], archive)
+            set_stat('files_pending', len(pending))
+        timeout = pending[0][0] - now if pending else None
+        if watch_fd is None:
+            time.sleep(WATCH_POLL_INTERVAL if timeout is None else min(timeout, WATCH_POLL_INTERVAL))
+        elif select.select([watch_fd], [], [], timeout)[0]:
+            os.read(watch_fd, STREAM_CHUNK_SIZE)
+        changed = {file_name for file_name, signature in signatures.items() if file_signature(file_name) != signature}
+        if changed:
+            return changed
+
+
+def update_parts(form_data, rendered, changed):
+    """Render again the parts of the form read from the changed input files.  An unreadable or
+    invalid file is reported without exiting, and its part is left unchanged until the file
+    changes again.
+
+    Arguments:
+        form_data {list} -- The parts of the form (see make_form_parts())
+        rendered {list} -- The rendered bytes of each part, updated in place
+        changed {set} -- Absolute path and name of each changed input file
+
+    Returns:
+        bool -- True if every changed part was rendered
+    """
+    updated = True
+    for index, part in enumerate(form_data):
+        if isinstance(part, str) or os.path.abspath(part[-1]) not in changed:
+            continue
+        try:
+            rendered[index] = part_bytes(part)
+        except SystemExit:
+            updated = False
+    return updated
+
+
+def send_watched_page(args, chunks, delete_file):
+    """Write a temporary html file for the watched form and open it in the browser.  A new file
+    is always written, so a page still waiting to be removed is never overwritten.
+
+    Arguments:
+        args {object} -- args object from the argparser
+        chunks {list} -- The content of the html file, as bytes
+        delete_file {bool} -- The file is to be deleted rather than kept
+
+    Returns:
+        str -- Path and name of the file written
+    """
+    file_path = make_file_path(args)
+    with phase('write'):
+        try:
+            html_file = write_html_file(file_path, make_file_name(args), chunks, exclusive=True, shard=make_shard(args))
+        except OSError:
+            exit_with_error(113)
+        record_file(html_file, time.time() + make_time_to_live(args) if delete_file else None, file_path)
+    with phase('launch'):
+        open_in_browser(html_file, delete_file)
+    return html_file
+
+
+def watch_inputs(args, url, form_data):
+    """Open the form in the browser, and then open it again each time one of its input files
+    changes, until interrupted.  The rendered fields are kept between pages, so only the fields
+    read from the changed files are rendered again.  The temporary html files are removed once
+    their time-to-live has passed, and any still waiting are removed when interrupted.
+
+    Arguments:
+        args {object} -- args object from the argparser
+        url {str} -- The validated destination url
+        form_data {list} -- The parts of the form (see make_form_parts())
+    """
+    file_names = {os.path.abspath(part[-1]) for part in form_data if not isinstance(part, str)}
+    if not file_names:
+        exit_with_error(119)
+    archive = make_archive(args)
+    delete_file = not args.keep_file or archive is not None
+    signatures = {file_name: file_signature(file_name) for file_name in file_names}
+    head, tail = HTML_TEMPLATE.split('{1}')
+    head = head.format(url).encode('utf-8')
+    tail = tail.encode('utf-8')
+    with phase('format'):
+        start = time.perf_counter()
+        rendered = [part_bytes(part) for part in form_data]
+        observe_stat('render_seconds', time.perf_counter() - start)
+    watch_fd = watch_directories(file_names)
+    pending = collections.deque()
+    try:
+        while True:
+            html_file = send_watched_page(args, [head] + rendered + [tail], delete_file)
+            if delete_file:
+                pending.append((time.monotonic() + make_time_to_live(args), html_file))
+                set_stat('files_pending', len(pending))
+            while True:
+                changed = wait_for_changes(signatures, watch_fd, pending, archive)
+                signatures.update((file_name, file_signature(file_name)) for file_name in changed)
+                start = time.perf_counter()
+                if update_parts(form_data, rendered, changed):
+                    observe_stat('render_seconds', time.perf_counter() - start)
+                    break
+            count_stat('pages_resubmitted')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watch_fd is not None:
+            os.close(watch_fd)
+        while pending:
+            remove_page(pending.popleft()[1], archive)
+        set_stat('files_pending', 0)
+
+
+def read_stdin_chunks(stream):
+    """Read stdin in chunks as the data becomes available, with the leading and trailing
+    whitespace removed as for the whole input.  Trailing whitespace in a chunk is held back
+    until more data follows it.
+
+    Arguments:
+        stream {object} -- Binary input stream
+
+    Yields:
+        bytes -- Chunks of the input
+    """
+    read = stream.read1 if hasattr(stream, 'read1') else stream.read
+    started = False
+    pending = b''
+    for chunk in iter(lambda: read(STREAM_CHUNK_SIZE), b''):
+        if not started:
+            chunk = chunk.lstrip()
+        stripped = chunk.rstrip()
+        if stripped:
+            yield pending + stripped
+            started = True
+            pending = b''
+        if started:
+            pending += chunk[len(stripped):]
+
+
+def make_output_fd(args):
+    """Get the file descriptor to stream the html document to, from the -o and --output-fd options.
+
+    Arguments:
+        args {object} -- args object from the argparser
+
+    Returns:
+        tuple -- (file descriptor, True if opened here and to be closed), or (None, False) if not streaming
+    """
+    output_fd = getattr(args, 'OUTPUT_FD', None)
+    output = getattr(args, 'OUTPUT', None)
+    if output_fd is not None:
+        return output_fd, False
+    if output == '-':
+        return sys.stdout.fileno(), False
+    if output:
+        try:
+            return os.open(output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), True
+        except OSError:
+            exit_with_error(116)
+    return None, False
+
+
+def stream_html(args, url, output_fd, closefd=False):
+    """Stream the html document to a file descriptor, copying any stdin input into it as it is
+    read rather than holding all of it in memory.  No temporary file is written and no browser
+    is opened.
+
+    Arguments:
+        args {object} -- args object from the argparser
+        url {str} -- The validated destination url
+        output_fd {int} -- File descriptor to write the html document to
+
+    Keyword Arguments:
+        closefd {bool} -- Close the file descriptor when done (default: {False})
+    """
+    form_data = make_form_parts(args)
+    chunks = read_stdin_chunks(sys.stdin.buffer) if args.stdin else iter(())
+    first = next(chunks, None)
+    if not form_data and first is None:
+        exit_with_error(111)
+    head, tail = HTML_TEMPLATE.split('{1}')
+    try:
+        with open(output_fd, 'wb', closefd=closefd) as output:
+            size = output.write(head.format(url).encode('utf-8'))
+            for part in form_data:
+                for chunk in form_part_chunks(part):
+                    size += output.write(chunk)
+            if first is not None:
+                size += output.write(STDIN_OPEN.format(make_stdin_key(args)).encode('utf-8'))
+                size += output.write(first)
+                for chunk in chunks:
+                    size += output.write(chunk)
+                size += output.write(STDIN_CLOSE.encode('utf-8'))
+            size += output.write(tail.encode('utf-8'))
+    except OSError:
+        exit_with_error(116)
+    count_stat('pages_written')
+    count_stat('bytes_written', size)
+
+
+def open_in_browser(html_file, delete_file):
+    """Open the temporary html file in a new browser tab, exiting with an error (after removing
+    the file if it is not being kept) if the browser cannot be launched.
+
+    Arguments:
+        html_file {str} -- Path and name of the temporary html file
+        delete_file {bool} -- The file is to be deleted rather than kept
+    """
+    if not webbrowser.open_new_tab(html_file):
+        count_stat('launch_failures')
+        if delete_file:
+            os.remove(html_file)
+            set_stat('files_pending', 0)
+        exit_with_error(114)
+
+
+def browser_command(controller, html_files):
+    """Make a single command line opening all of the html files in new tabs, for the Firefox and
+    Chrome controllers, whose commands accept several files.  Other controllers (such as
+    xdg-open) take a single file.
+
+    Arguments:
+        controller {webbrowser.BaseBrowser} -- The browser controller
+        html_files {list} -- Path and name of each html file
+
+    Returns:
+        list -- The command line, or None if the controller cannot open several files with one command
+    """
+    if not isinstance(controller, BATCH_CONTROLLERS):
+        return None
+    action = controller.remote_action_newtab if controller.remote_action_newtab is not None else controller.remote_action_newwin
+    args = []
+    for html_file in html_files:
+        args.extend(arg.replace('%s', html_file).replace('%action', action or '') for arg in controller.remote_args)
+    return [controller.name] + [arg for arg in args if arg]
+
+
+def launch_pages(html_files):
+    """Open a group of html files in new browser tabs, starting the browser once with all of the
+    files as arguments where the browser supports it, and exiting with an error if the browser
+    cannot be launched.
+
+    Arguments:
+        html_files {list} -- Path and name of each html file
+    """
+    controller = webbrowser.get()
+    command = browser_command(controller, html_files)
+    if command is None:
+        failures = [html_file for html_file in html_files if not controller.open(html_file, 2)]
+        launched = not failures
+        count_stat('browser_launches', len(html_files))
+    else:
+        options = {'start_new_session': True} if os.name == 'posix' else {}
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, close_fds=True, **options)  # pylint: disable=consider-using-with
+            launched = process.wait(REMOTE_TIMEOUT) == 0
+        except subprocess.TimeoutExpired:
+            launched = True
+        except OSError:
+            launched = False
+        count_stat('browser_launches')
+    if not launched:
+        count_stat('launch_failures')
+        exit_with_error(114)
+
+
 def main():
     """Main processing loop.
     """
-    args = parse_command_arguments()
+    with phase('parse'):
+        args = parse_command_arguments()
+    start_reports(args)
+
+    if args.sweep:
+        print("Removed {0} files.".format(sweep_files(make_file_path(args), orphans=args.orphans, shard=make_shard(args)),))
+        return
+    if args.REAP_FILE:
+        remove_file_later(args.REAP_FILE, make_time_to_live(args), args.WATCH_FD, make_archive(args), args.ARCHIVE_NAME)
+        return
 
     #######################################
     #   Process the command line inputs   #
     #######################################
 
-    url = str(args.url).strip()
-    err = test_url(url)
-    if err:
-        exit_with_error(err)
+    url = make_url(args)
+
+    output_fd, closefd = make_output_fd(args)
+    if output_fd is not None:
+        with phase('write'):
+            stream_html(args, url, output_fd, closefd)
+        return
 
+    #   Kept files being archived are removed once they have been added to the archive.
+    archive = make_archive(args)
     delete_file = True
-    if args.keep_file:
+    if args.keep_file and archive is None:
         delete_file = False
 
     time_to_live = make_time_to_live(args)
     file_path = make_file_path(args)
+    with phase('sweep'):
+        startup_sweep(file_path)
     file_name = make_file_name(args)
-    html_file = os.path.join(file_path, file_name)
-    if args.post_data:
-        form_data = make_form_data_string(args.post_data)
-    else:
-        form_data = ''
+    shard = make_shard(args)
+    form_data = make_form_content(args)
 
-    if 'STDIN_KEY' in vars(args).keys() and getattr(args, 'STDIN_KEY') is not None:
-        stdin_key = str(getattr(args, 'STDIN_KEY')).strip()
-    else:
-        stdin_key = DEFAULT_STDIN_KEY
+    if args.VARY:
+        with phase('write'):
+            write_variations(file_path, file_name, url, form_data, make_variations(args.VARY), shard, args.MAX_PAGES if args.launch else 0, archive)
+        return
 
-    from_stdin = ''
-    if args.stdin:
-        for line in sys.stdin.readlines():
-            from_stdin += line
-        from_stdin = from_stdin.strip()
-
-    if not form_data and not from_stdin:
+    if not form_data:
         exit_with_error(111)
-
-    if from_stdin:
-        form_data += "\n<textarea name='{0}' id='{0}' form='postform' style='display: none;'>{1}</textarea>\n".format(stdin_key, from_stdin.strip())
-
-    html_text = HTML_TEMPLATE.format(url, form_data,)
+    if args.watch:
+        watch_inputs(args, url, form_data)
+        return
+    with phase('format'):
+        start = time.perf_counter()
+        html_text = render_page(url, form_data)
+        observe_stat('render_seconds', time.perf_counter() - start)
 
     #################################
     #   Write temporary HTML file   #
     #################################
 
-    with open(html_file, 'w', encoding='utf-8') as output_file:
-        output_file.write(html_text)
+    #   Only a name set with --file-name may overwrite an existing file.
+    with phase('write'):
+        try:
+            html_file = write_html_file(file_path, file_name, html_text, exclusive=getattr(args, 'FILENAME', None) is None, shard=shard)
+        except OSError:
+            exit_with_error(113)
+        record_file(html_file, time.time() + time_to_live if delete_file else None, file_path)
+    set_stat('files_pending', 1 if delete_file else 0)
 
-    webbrowser.open_new_tab(html_file)
+    watch_fd = watch_reads(html_file) if delete_file and args.after_read else None
+    with phase('launch'):
+        open_in_browser(html_file, delete_file)
 
     ##################################
     #   Remove temporary HTML file   #
     ##################################
 
     if delete_file:
-        time.sleep(time_to_live)
-        if os.path.exists(html_file):
-            os.remove(html_file)
+        name = None
+        if archive is not None:
+            name = archive_name(html_file)
+            print("Archiving the page as {0}".format(name,))
+        with phase('cleanup'):
+            clean_up_later(args, html_file, time_to_live, watch_fd, archive, name)
 
 ##############################################################################
 
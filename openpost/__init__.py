@@ -25,17 +25,96 @@
 #                                                                               #
 #################################################################################
 
-# pylint: disable=R0902, R0913
+# pylint: disable=C0302, R0902, R0913, R0914
 
 """Creates an html POST request file and allows opening in a browser window."""
 
+import concurrent.futures
+import contextlib
+import copy
+import functools
+import hashlib
+import itertools
 import os
 # import html
 # import re
+import threading
 import time
 import webbrowser
+from collections.abc import Iterable, Mapping
 
-__version__ = "0.3"
+from openpost import batch, columns, direct, encoded, inotify, product
+from openpost.dispatch import Dispatcher  # noqa: F401
+from openpost.archive import Archive, unique_name  # noqa: F401
+from openpost.delivery import (DELIVERIES, DELIVERY_AUTO, DELIVERY_DATA, DELIVERY_FILE, DELIVERY_SERVER,  # noqa: F401
+                               DELIVERY_TMPFS, DeliveryLimits, PageServer, choose_delivery, estimate_size,
+                               make_data_url, tmpfs_directory)
+from openpost.fields import FieldStream, validate_field
+from openpost.manifest import list_files, record_file, record_files, shard_filename, shard_path, sweep_files  # noqa: F401
+from openpost.metrics import REGISTRY as METRICS
+from openpost.nested import NESTED_TYPES, flatten, flatten_items, form_value
+from openpost.overlay import FormOverlay, FrozenForm
+from openpost.session import Session
+
+__version__ = "0.4"
+
+STARTUP_SWEEP_LIMIT = 1000
+
+CLEANUP_TTL = 'ttl'
+CLEANUP_ACCESS = 'access'
+ACCESS_GRACE = 0.5      # Seconds to keep a file after it has been read
+
+PENDING_CHUNKS = 2 * (os.cpu_count() or 1)
+
+#   Reference counts and last sent modification times for output files with a pending cleanup
+#   in this process, used to keep a shared (content-named) page until its last sender is done.
+_PAGE_REFS = {}
+_PAGE_LOCK = threading.Lock()
+
+#   Output directories which have already had a startup sweep in this process.
+_SWEPT_DIRS = set()
+
+#   Stack of (OpenPost object, form data overrides) in effect in each thread.
+_THREAD_OVERRIDES = threading.local()
+
+#   Connections shared by the direct submissions which do not provide their own pool.
+_DIRECT_POOL = direct.ConnectionPool()
+
+
+def get_metrics(as_json=False):
+    """Get the metrics recorded while writing and sending pages in this process.
+
+    Keyword Arguments:
+        as_json {bool} -- Return the metrics as a JSON string rather than a dictionary (default: False)
+
+    Returns:
+        {dict} -- Mapping of 'counters', 'gauges' and 'histograms' to the values of each metric by name
+    """
+    return METRICS.as_json() if as_json else METRICS.as_dict()
+
+
+def _write_product_chunk(template, values, start, stop):
+    """Write the output html files for a range of the combinations of values.  This is a module
+    level function taking only picklable arguments, so that it can be run by the workers of a
+    process pool (see OpenPost.write_product()).
+
+    Arguments:
+        template {tuple} -- (object, base name, index width), where the object is the picklable copy
+                            made by OpenPost._product_template()
+        values {dict} -- Mapping of key to a list of values for the key
+        start {int} -- Index of the first combination to write
+        stop {int} -- Index after the last combination to write
+
+    Returns:
+        {int} -- The number of files written
+    """
+    poster, base, width = template
+    written = 0
+    for index, variant in enumerate(poster.iter_product(values, start, stop), start):
+        variant.file_name = '{0}-{1:0{2}d}.html'.format(base, index, width)
+        if variant.write_html():
+            written += 1
+    return written
 
 
 class OpenPost():
@@ -57,7 +136,13 @@ class OpenPost():
 </html>
 """
 
-    def __init__(self, url=None, file_name=None, keep_file=False, time_to_live=5, form_data=None, headers=None, body=None, new_tab=True):
+    FIELD_TEMPLATE = "<textarea name='{0}' id='{0}' form='postform' style='display: none;'>{1}</textarea>\n"
+    #   Fields of nested and multi-valued values have no id, as their keys repeat or are bracket paths.
+    NESTED_FIELD_TEMPLATE = "<textarea name='{0}' form='postform' style='display: none;'>{1}</textarea>\n"
+
+    def __init__(self, url=None, file_name=None, keep_file=False, time_to_live=5, form_data=None, headers=None, body=None, new_tab=True,
+                 content_name=False, manifest=True, cleanup=CLEANUP_TTL, shard_depth=0, shard_width=2, archive=None,
+                 delivery=DELIVERY_FILE, delivery_limits=None):
         """Creates an html POST request file and allows opening in a browser window.
 
         Keyword Arguments:
@@ -65,10 +150,26 @@ class OpenPost():
             file_name {str} -- Path and name of the output html file (default: 'OpenPost.html')
             keep_file {bool} -- Keep the output html file after opening in browser (default: False)
             time_to_live {float} -- Number of seconds to delay before removing the output html file (0-60) (default: 5)
-            form_data {dict} -- The key:value data to include in the POST request (default: {})
+            form_data {dict} -- The key:value data to include in the POST request, or an iterable of (key, value) pairs
+                                which is read once while rendering (default: {})
             headers {str|list} -- Lines to include in the <head> section of the html file (default: None)
             body {str} -- Additional lines to include in the <body> section of the html file (default: None)
             new_tab {bool} -- Open the html file in a new browser tab (default: True)
+            content_name {bool} -- Name the output html file by a hash of its content, reusing an unexpired
+                                   copy instead of rewriting it (default: False)
+            manifest {bool} -- Record written files in the output directory's manifest, and sweep the expired files
+                               listed in it the first time the directory is used (default: True)
+            cleanup {str} -- When to remove the output html file: 'ttl' after time_to_live seconds, or 'access' shortly
+                             after it has been read (Linux only), with time_to_live as an upper limit (default: 'ttl')
+            shard_depth {int} -- Number of levels of hash-named subdirectories of the output directory to spread the output
+                                 html files over (default: 0)
+            shard_width {int} -- Number of hex digits in each subdirectory name, giving 16 ** shard_width subdirectories
+                                 per level (1-8) (default: 2)
+            archive {Archive} -- Archive to store kept pages in, rather than keeping the output html files (default: None)
+            delivery {str} -- How send_post() delivers the page: 'file', 'data', 'tmpfs', 'server', or 'auto' to choose
+                              by the estimated size of the page (default: 'file')
+            delivery_limits {DeliveryLimits} -- Largest page size delivered by each path of the 'auto' strategy, or None
+                                                for the defaults (default: None)
         """
         self.form_data = self._validate_data(form_data)
         self.url = url
@@ -78,7 +179,42 @@ class OpenPost():
         self.headers = headers
         self.body = body
         self.new_tab = new_tab
+        self.content_name = content_name
+        self.manifest = manifest
+        self.cleanup = cleanup
+        self.shard_depth = shard_depth
+        self.shard_width = shard_width
+        self.archive = archive
+        self.delivery = delivery
+        self.delivery_limits = delivery_limits
+        self.output_file = None
+        self.archive_name = None
+        self.active_session = None
         self.written = False    # Depricated as of v0.3
+        self._frozen = None
+        self._frozen_source = None
+        self._encoded_frame = None
+
+    @classmethod
+    def session(cls, directory=None, browser=None, launch_window=0.05, max_pages=20, **defaults):
+        """Start a session for sending a number of requests, for use as a context manager.  The
+        session shares an output directory, a batched browser launcher and a cleanup queue between
+        the sends made within it, so that sending does not wait for each file to be removed, and
+        the pages sent within a short window are opened with a single browser command.  All of
+        the files still pending are removed when the session is closed.
+
+        Keyword Arguments:
+            directory {str} -- Output directory for the html files, or None to use a temporary directory
+                               owned by (and removed with) the session (default: None)
+            browser {str} -- Name of the browser to use, as passed to webbrowser.get() (default: None)
+            launch_window {float} -- Seconds to collect pages before opening them together (default: 0.05)
+            max_pages {int} -- Maximum number of pages opened by each browser command (default: 20)
+            defaults -- Keyword arguments used for every OpenPost object made in the session
+
+        Returns:
+            {Session} -- The new session
+        """
+        return Session(cls, directory, browser, launch_window, max_pages, **defaults)
 
     @staticmethod
     def version():
@@ -109,21 +245,31 @@ class OpenPost():
 
     @staticmethod
     def _validate_data(form_data):
-        """Validate the data to be used in the form
+        """Validate the data to be used in the form.  A list or tuple of (key, value) pairs is
+        validated immediately, while any other iterable of pairs (such as a generator or a
+        mapping's items() view) is wrapped as a FieldStream and validated one item at a time as
+        it is rendered.
 
         Arguments:
-            form_data {dict} -- Dictionary of key:value data to include in the POST request
+            form_data {dict} -- Dictionary (or other mapping) of key:value data, or an iterable of
+                                (key, value) pairs, to include in the POST request
 
         Raises:
-            ValueError: Form_data not a dictionary
+            ValueError: Form_data not a dictionary or an iterable of (key, value) pairs
 
         Returns:
             {dict} -- The key:value data to include in the POST request
         """
+        if isinstance(form_data, FieldStream):
+            return form_data
         if not form_data:
             return {}
-        if isinstance(form_data, dict):
+        if isinstance(form_data, Mapping):
             return form_data
+        if isinstance(form_data, (list, tuple)):
+            return dict(validate_field(item) for item in form_data)
+        if isinstance(form_data, Iterable) and not isinstance(form_data, (str, bytes)):
+            return FieldStream(form_data)
         raise ValueError('Form_data not a dictionary')
 
     @staticmethod
@@ -172,19 +318,187 @@ class OpenPost():
                 return temp
         return 'OpenPost.html'
 
+    @staticmethod
+    def _content_filename(name, html):
+        """Make the content-addressed output file name for the POST html file.
+
+        Arguments:
+            name {str} -- Path and file name requested for the output file
+            html {str} -- The content of the html file
+
+        Returns:
+            {str} -- File path and name based on the hash of the content
+        """
+        digest = hashlib.sha256(html.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(os.path.dirname(name), digest + '.html')
+
+    def _page_expired(self, filename):
+        """Check whether an existing output file has passed its time-to-live.  The expiry is
+        measured from the last modification time, which is refreshed whenever the file is reused.
+
+        Arguments:
+            filename {str} -- Path and name of the output file
+
+        Returns:
+            {bool} -- True if the file is missing or expired, otherwise False
+        """
+        try:
+            modified = os.stat(filename).st_mtime
+        except OSError:
+            return True
+        if self._keeps_file():
+            return False
+        return time.time() - modified >= self.time_to_live
+
+    @staticmethod
+    def _startup_sweep(directory):
+        """Run a bounded sweep of the expired files listed in the manifest the first time an output
+        directory is used in this process.
+
+        Arguments:
+            directory {str} -- The output directory
+        """
+        with _PAGE_LOCK:
+            if directory in _SWEPT_DIRS:
+                return
+            _SWEPT_DIRS.add(directory)
+        try:
+            sweep_files(directory, limit=STARTUP_SWEEP_LIMIT)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _modified_time(filename):
+        try:
+            return os.stat(filename).st_mtime
+        except OSError:
+            return None
+
+    def _acquire_file(self, filename):
+        """Add a reference to an output file that is waiting to be removed.  The caller must
+        hold _PAGE_LOCK, in the same locked section that wrote or reused the file, so that no
+        other thread can release (and remove) the file in between.
+
+        Arguments:
+            filename {str} -- Path and name of the output file
+        """
+        entry = _PAGE_REFS.setdefault(filename, [0, None])
+        entry[0] += 1
+        entry[1] = self._modified_time(filename)
+
+    @staticmethod
+    def _reserve_file(filename):
+        """Add a reference to an output file that is about to be written and sent.  If the file
+        is still waiting to be removed after an earlier send from this process (such as a send
+        from another thread sharing this object), a numbered variant of the name is used instead
+        so that the pending file is not overwritten.
+
+        Arguments:
+            filename {str} -- Path and name of the output file
+
+        Returns:
+            {str} -- Path and name of the reserved output file
+        """
+        base = filename[:-len('.html')]
+        with _PAGE_LOCK:
+            candidate = filename
+            for count in itertools.count(2):
+                if candidate not in _PAGE_REFS:
+                    break
+                candidate = '{0}-{1}.html'.format(base, count)
+            _PAGE_REFS[candidate] = [1, None]
+        return candidate
+
+    def _release_file(self, filename):
+        """Drop one reference to an output file, removing the file when no other send in this
+        process depends on it and (for content-named files) its expiry has not been extended by
+        another process since it was last sent from this one.
+
+        Arguments:
+            filename {str} -- Path and name of the output file
+        """
+        with _PAGE_LOCK:
+            entry = _PAGE_REFS.get(filename, [1, None])
+            entry[0] -= 1
+            if entry[0] > 0:
+                return
+            _PAGE_REFS.pop(filename, None)
+            if self.content_name and entry[1] is not None and self._modified_time(filename) != entry[1]:
+                return
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _keeps_file(self):
+        """Check whether the output html file is kept after sending, rather than being removed
+        (after being added to the archive, if kept pages are archived).
+
+        Returns:
+            {bool} -- True if the file is kept
+        """
+        return self.keep_file and self.archive is None
+
+    def _archive_file(self, filename, name):
+        """Add the content of an output file to the archive.
+
+        Arguments:
+            filename {str} -- Path and name of the output file
+            name {str} -- The name to add the page to the archive under
+        """
+        try:
+            with open(filename, 'rb') as input_file:
+                self.archive.add(name, input_file.read())
+        except OSError:
+            return
+        METRICS.inc('pages_archived')
+
+    def _watch_reads(self, filename):
+        """Start watching the output file for reads if the access cleanup strategy is in use.
+
+        Arguments:
+            filename {str} -- Path and name of the output file
+
+        Returns:
+            {inotify.Watch} -- The watch, or None if the time-to-live alone is to be used
+        """
+        if self.cleanup != CLEANUP_ACCESS or self._keeps_file() or not inotify.available():
+            return None
+        try:
+            return inotify.Watch(filename)
+        except OSError:
+            return None
+
+    def _wait_for_cleanup(self, watch):
+        """Wait until the output file is due to be removed.  This is after the time-to-live, or
+        shortly after the file has been read if it is being watched for reads.
+
+        Arguments:
+            watch {inotify.Watch} -- The watch on the output file, or None
+        """
+        if watch is None:
+            time.sleep(self.time_to_live)
+            return
+        with watch:
+            deadline = time.monotonic() + self.time_to_live
+            if watch.wait_for(inotify.IN_CLOSE_NOWRITE, self.time_to_live):
+                time.sleep(max(0, min(ACCESS_GRACE, deadline - time.monotonic())))
+
     def clear_data(self):
         """Clears the data used for the POST request form.
         """
         self.form_data = {}
+        self._frozen = None
 
     def add_key(self, key, value):
         """Add or update a data key used for the POST request form.
 
         Arguments:
             key {str} -- Key used in the form
-            value {str} -- Value for the specified key
+            value {str|dict|list} -- Value for the specified key, which may be a mapping (for nested fields) or a
+                                     list (for a multi-valued field)
         """
-        self.form_data[key] = str(value)
+        self._materialize_data()
+        self.form_data[key] = form_value(value)
+        self._frozen = None
 
     def delete_key(self, key):
         """Remove a data key used for the POST request form.
@@ -192,59 +506,677 @@ class OpenPost():
         Arguments:
             key {str} -- Key to be removed from the form
         """
+        self._materialize_data()
         self.form_data.pop(key, None)
+        self._frozen = None
 
-    def make_html(self):
-        """Make the content of the output html file.
+    def _materialize_data(self):
+        """Read streamed form data into a dictionary, so that it can be changed or reused."""
+        if isinstance(self.form_data, FieldStream):
+            self.form_data = dict(self.form_data)
+
+    def _frozen_form(self):
+        """Get an immutable snapshot of the form data, reusing the previous snapshot if the data
+        has not been changed through add_key(), delete_key(), clear_data() or by assigning a new
+        form_data.
 
         Returns:
-            {str} -- The content of the html file, or '' if an error
+            {FrozenForm} -- Snapshot of the form data
+        """
+        if isinstance(self.form_data, FrozenForm):
+            return self.form_data
+        self._materialize_data()
+        if self._frozen is None or self._frozen_source is not self.form_data:
+            self._frozen = FrozenForm(self._validate_data(self.form_data))
+            self._frozen_source = self.form_data
+        return self._frozen
+
+    def derive(self, **overrides):
+        """Make a copy of this object with some of the form data changed.  The copy shares an
+        immutable snapshot of this object's form data (including the rendered html for each
+        field), and only stores the changed keys.  Other properties are copied, and may be
+        changed on the new object without affecting this one.
+
+        Keyword Arguments:
+            Keys to add or change in the form data, with a value of None to remove a key
+
+        Returns:
+            {OpenPost} -- The new object
+        """
+        if isinstance(self.form_data, FormOverlay):
+            overlay = self.form_data
+        else:
+            overlay = FormOverlay({}, self._frozen_form())
+        derived = copy.copy(self)
+        derived.form_data = overlay.derive({key: None if value is None else form_value(value) for key, value in overrides.items()})
+        derived.output_file = None
+        derived.archive_name = None
+        return derived
+
+    def iter_product(self, values, start=0, stop=None):
+        """Generate a derived object (see derive()) for each combination of the values provided
+        for a set of keys, in the same order as itertools.product.  The combinations are generated
+        one at a time and are never all held in memory.
+
+        Arguments:
+            values {dict} -- Mapping of key to a list of values for the key
+
+        Keyword Arguments:
+            start {int} -- Index of the first combination to generate (default: 0)
+            stop {int} -- Index after the last combination to generate, or None for all (default: None)
+
+        Yields:
+            {OpenPost} -- The derived object for each combination
+        """
+        for combination in product.iter_product(values, start, stop):
+            yield self.derive(**combination)
+
+    def render_product(self, values, start=0, stop=None):
+        """Generate the content of the output html file for each combination of the values
+        provided for a set of keys (see iter_product()).
+
+        Arguments:
+            values {dict} -- Mapping of key to a list of values for the key
+
+        Keyword Arguments:
+            start {int} -- Index of the first combination to generate (default: 0)
+            stop {int} -- Index after the last combination to generate, or None for all (default: None)
+
+        Yields:
+            {str} -- The content of the html file for each combination
+        """
+        for variant in self.iter_product(values, start, stop):
+            yield variant.make_html()
+
+    def write_product(self, values, executor=None, chunk_size=1000):
+        """Write an output html file for each combination of the values provided for a set of
+        keys (see iter_product()).  Each file is named from file_name with the index of the
+        combination added, such as 'OpenPost-0042.html', and is kept.  If an executor (such as a
+        concurrent.futures.ProcessPoolExecutor) is provided, the combinations are split into
+        chunks which are written by the executor's workers, with only a few chunks pending at
+        any time.
+
+        Arguments:
+            values {dict} -- Mapping of key to a list of values for the key
+
+        Keyword Arguments:
+            executor {concurrent.futures.Executor} -- Executor used to write the chunks (default: None)
+            chunk_size {int} -- Number of combinations in each chunk (default: 1000)
+
+        Returns:
+            {int} -- The number of files written
+        """
+        total = product.product_size(values)
+        template = (self._product_template(), os.path.splitext(self._make_filename(self.file_name))[0], len(str(total - 1)))
+        if executor is None:
+            return _write_product_chunk(template, values, 0, total)
+        written = 0
+        pending = set()
+        for start in range(0, total, chunk_size):
+            if len(pending) >= PENDING_CHUNKS:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                written += sum(future.result() for future in done)
+            pending.add(executor.submit(_write_product_chunk, template, values, start, min(start + chunk_size, total)))
+        written += sum(future.result() for future in concurrent.futures.wait(pending)[0])
+        return written
+
+    def _product_template(self):
+        """Make the copy of this object that the combinations of write_product() are derived from.
+        It holds only picklable state, so that it can be sent to the workers of a process pool: the
+        frozen form data, and no archive or session (the files are kept as they are).
+
+        Returns:
+            {OpenPost} -- The copy
+        """
+        template = copy.copy(self)
+        if not isinstance(self.form_data, FormOverlay):
+            template.form_data = FormOverlay({}, self._frozen_form())
+        template.keep_file = True
+        template.archive = None
+        template.active_session = None
+        template.output_file = None
+        template.archive_name = None
+        return template
+
+    def render_batch(self, forms, workers=None, chunk_size=100):
+        """Render the content of the output html file for each of a batch of forms, using a pool
+        of worker processes for large batches.  The forms are read into a list, which is handed to
+        each worker once, and the workers render ranges of chunk_size forms, with only a few ranges
+        pending at any time.  The fields are rendered with FIELD_TEMPLATE.  Every
+        page is sent back to this process, which limits the throughput, so write_batch() should be
+        used where the pages are to be written to files.
+
+        Arguments:
+            forms {iterable} -- The form data (a mapping or iterable of (key, value) pairs) for each page
+
+        Keyword Arguments:
+            workers {int} -- Number of worker processes, 0 or 1 to render in this process, or None for one
+                             per CPU (default: None)
+            chunk_size {int} -- Number of forms rendered by a worker at a time (default: 100)
+
+        Yields:
+            {bytes} -- The content of the html file for each form, encoded as UTF-8 (b'' if the form is empty)
+        """
+        frame = self._page_frame() + (self.FIELD_TEMPLATE, self.NESTED_FIELD_TEMPLATE)
+        yield from batch.render_chunks(frame, forms, workers, chunk_size)
+
+    def write_batch(self, forms, workers=None, chunk_size=100):
+        """Write an output html file for each of a batch of forms, using a pool of worker
+        processes which render and write the files directly, sending back only the file names
+        (see render_batch()).  Each file is
+        named from file_name with the index of the form added, such as 'OpenPost-42.html', and
+        is kept.  Forms with no fields are skipped.  If there is an archive, the pages are added
+        to the archive under these names instead of being written to files.
+
+        Arguments:
+            forms {iterable} -- The form data (a mapping or iterable of (key, value) pairs) for each page
+
+        Keyword Arguments:
+            workers {int} -- Number of worker processes, 0 or 1 to render in this process, or None for one
+                             per CPU (default: None)
+            chunk_size {int} -- Number of forms rendered by a worker at a time (default: 100)
+
+        Returns:
+            {int} -- The number of files written (or pages archived)
+        """
+        filename = self._make_filename(self.file_name)
+        base = os.path.splitext(os.path.basename(filename))[0]
+        if self.archive is not None:
+            pages = self.render_batch(forms, workers, chunk_size)
+            written = self.archive.add_pages(('{0}-{1}.html'.format(base, index), page) for index, page in enumerate(pages) if page)
+            METRICS.inc('pages_archived', written)
+            return written
+        directory = os.path.dirname(filename) or '.'
+        layout = (directory, base, self.shard_depth, self.shard_width)
+        frame = self._page_frame() + (self.FIELD_TEMPLATE, self.NESTED_FIELD_TEMPLATE)
+        written = 0
+        for filenames in batch.write_chunks(frame, forms, layout, workers, chunk_size):
+            if self.manifest:
+                record_files(filenames, None, directory)
+            written += len(filenames)
+        METRICS.inc('pages_written', written)
+        return written
+
+    def render_columns(self, data):
+        """Render the content of an output html file for each row of columnar form data, such as
+        a table with one POST request per row.  Each column is rendered in a single pass, with
+        the field markup for its key formatted once for all of the rows.  Fields of the object's
+        own form data whose keys are not columns are included in every page, before the columns.
+
+        Arguments:
+            data {dict|DataFrame} -- Mapping of key to a list (or array) of values for each row, or a pandas DataFrame
+
+        Raises:
+            ValueError: Not columnar data, or columns not the same length
+            TypeError: A column is a string rather than a sequence of values
+
+        Yields:
+            {str} -- The content of the html file for each row
+        """
+        items = columns.column_items(data)
+        keys = {key for key, _values in items}
+        snapshot = self._snapshot()
+        pairs = snapshot if isinstance(snapshot, FieldStream) else snapshot.items()
+        fixed = ''.join(self._render_field(key, value) for key, value in pairs if key not in keys)
+        head, tail = self._page_frame()
+        yield from columns.render_rows(head, tail, fixed, items, self.FIELD_TEMPLATE)
+
+    def write_columns(self, data):
+        """Write an output html file for each row of columnar form data, as described for
+        render_columns().  Each file is named from file_name with the index of the row added,
+        such as 'OpenPost-42.html', and is kept.  If there is an archive, the pages are added to
+        the archive under these names instead of being written to files.
+
+        Arguments:
+            data {dict|DataFrame} -- Mapping of key to a list (or array) of values for each row, or a pandas DataFrame
+
+        Returns:
+            {int} -- The number of files written (or pages archived)
+        """
+        filename = self._make_filename(self.file_name)
+        base = os.path.splitext(os.path.basename(filename))[0]
+        pages = self.render_columns(data)
+        if self.archive is not None:
+            written = self.archive.add_pages(('{0}-{1}.html'.format(base, index), page) for index, page in enumerate(pages))
+            METRICS.inc('pages_archived', written)
+            return written
+        directory = os.path.dirname(filename) or '.'
+        filenames = []
+        for index, page in enumerate(pages):
+            filenames.append(self._shard_filename(directory, '{0}-{1}.html'.format(base, index)))
+            self._write_file(filenames[-1], page)
+        if self.manifest:
+            record_files(filenames, None, directory)
+        return len(filenames)
+
+    @classmethod
+    def _render_field(cls, key, value):
+        """Make the html for a single form field, or for each of the fields of a nested or
+        multi-valued value (see nested.flatten()), which are rendered without an id.
+
+        Arguments:
+            key {str} -- Key used in the form
+            value {str|dict|list} -- Value for the specified key
+
+        Returns:
+            {str} -- The html for the field
+        """
+        if value.__class__ is not str and isinstance(value, NESTED_TYPES):
+            return ''.join(cls.NESTED_FIELD_TEMPLATE.format(path, str(leaf).strip()) for path, leaf in flatten(key, value))
+        return cls.FIELD_TEMPLATE.format(key, str(value).strip())
+
+    @contextlib.contextmanager
+    def overrides(self, **fields):
+        """Override some of the form data for sends made from the current thread only, while in
+        the with block.  Other threads sharing this object are not affected.
+
+        Keyword Arguments:
+            Keys to add or change in the form data, with a value of None to remove a key
+
+        Yields:
+            {OpenPost} -- This object
+        """
+        stack = _THREAD_OVERRIDES.__dict__.setdefault('stack', [])
+        stack.append((self, fields))
+        try:
+            yield self
+        finally:
+            stack.pop()
+
+    def _thread_overrides(self):
+        """Get the form data overrides in effect for this object in the current thread.
+
+        Returns:
+            {dict} -- The overrides, or None if there are none
+        """
+        stack = getattr(_THREAD_OVERRIDES, 'stack', ())
+        if not stack:
+            return None
+        merged = {}
+        for owner, fields in stack:
+            if owner is self:
+                merged.update(fields)
+        return merged or None
+
+    def _snapshot(self):
+        """Take a consistent snapshot of the form data to render, with the current thread's
+        overrides applied.  A dictionary is copied in a single step, so the snapshot is not
+        affected by other threads calling add_key() or delete_key() while it is rendered.
+
+        Returns:
+            {Mapping} -- The form data to render
+        """
+        data = self._validate_data(self.form_data)
+        overrides = self._thread_overrides()
+        if isinstance(data, FieldStream):
+            if overrides is None:
+                return data
+            data = dict(data)
+        if isinstance(data, FormOverlay):
+            snapshot = data.copy()
+        elif isinstance(data, FrozenForm):
+            snapshot = data
+        else:
+            snapshot = FrozenForm(data) if overrides else dict(data)
+        if overrides:
+            if not isinstance(snapshot, FormOverlay):
+                snapshot = FormOverlay({}, snapshot)
+            snapshot = snapshot.derive({key: None if value is None else form_value(value) for key, value in overrides.items()})
+        return snapshot
+
+    def _html_parts(self, data=None):
+        """Make the content of the output html file as a sequence of parts, rendering the form
+        fields as the parts are consumed.  Streamed form data is read and validated as it is
+        rendered.  The form data is rendered from a snapshot (see _snapshot()).
+
+        Keyword Arguments:
+            data {Mapping} -- The snapshot of the form data to render, or None to take one (default: None)
+
+        Returns:
+            {iterator} -- The parts of the html file, or None if there is no form data
+        """
+        head, tail = self._page_frame()
+        if data is None:
+            data = self._snapshot()
+        if not data:
+            return None
+        if isinstance(data, (FormOverlay, FrozenForm, FieldStream)):
+            lines = iter(data.lines(self._render_field))
+        else:
+            lines = (self._render_field(key, data[key]) for key in data.keys())
+        first = next(lines, None)
+        if first is None:
+            return None
+        return itertools.chain([head, first], lines, [tail])
+
+    def _encoded_parts(self, data=None):
+        """Make the content of the output html file as a list of segments encoded as UTF-8.  The
+        head and tail of the page are encoded once and reused while the url, headers and body
+        are unchanged, and the parts of each field around its value are encoded once per key
+        (see encoded.field_segments()), so only the field values are encoded for each page.  For
+        a snapshot (such as the form data of a derived object), the encoded html of each field is
+        cached on the snapshot and only the changed fields are encoded.
+
+        Keyword Arguments:
+            data {Mapping} -- The snapshot of the form data to render, or None to take one (default: None)
+
+        Returns:
+            {list} -- The segments of the html file, or None if there is no form data
+        """
+        frame = self._page_frame()
+        cached = self._encoded_frame
+        if cached is None or cached[0] != frame:
+            cached = self._encoded_frame = (frame, frame[0].encode('utf-8'), frame[1].encode('utf-8'))
+        if data is None:
+            data = self._snapshot()
+        if isinstance(data, (FormOverlay, FrozenForm)):
+            fields = data.lines(self._render_field, encode=True)
+        else:
+            fields = encoded.encode_fields(self.FIELD_TEMPLATE, data if isinstance(data, FieldStream) else data.items(), self.NESTED_FIELD_TEMPLATE)
+        if not fields:
+            return None
+        return [cached[1]] + fields + [cached[2]]
+
+    def _page_frame(self):
+        """Make the parts of the output html file before and after the form fields.
+
+        Returns:
+            {tuple} -- (head, tail) of the html file
         """
         url = self._validate_url(self.url)
         headers = self._make_string(self.headers)
         body = self._make_string(self.body)
-        data = self._validate_data(self.form_data)
-        if not data:
-            return ''
-        form_content = ''
-        for key in data.keys():
-            form_content += "<textarea name='{0}' id='{0}' form='postform' style='display: none;'>{1}</textarea>\n".format(key, str(data[key]).strip())
-        return self.HTML_TEMPLATE.format(headers, url, form_content, body)
+        head, tail = self.HTML_TEMPLATE.split('{2}')
+        return head.format(headers, url), tail.format(headers, url, '', body)
+
+    def make_html_bytes(self):
+        """Make the content of the output html file encoded as UTF-8, from pre-encoded template
+        segments (see _encoded_parts()).
+
+        Returns:
+            {bytes} -- The content of the html file, or b'' if there is no form data
+        """
+        start = time.perf_counter()
+        parts = self._encoded_parts()
+        html = b''.join(parts) if parts is not None else b''
+        METRICS.observe('render_seconds', time.perf_counter() - start)
+        return html
+
+    def make_html(self):
+        """Make the content of the output html file.
+
+        Returns:
+            {str} -- The content of the html file, or '' if an error
+        """
+        start = time.perf_counter()
+        parts = self._html_parts()
+        html = ''.join(parts) if parts is not None else ''
+        METRICS.observe('render_seconds', time.perf_counter() - start)
+        return html
 
     def write_html(self):
-        """Prepare and write the output html file.
+        """Prepare and write the output html file.  If the content_name flag has been set, an
+        existing unexpired file with the same content is reused (and its expiry extended) rather
+        than being written again.  The path of the file is stored in the output_file property.
 
         Returns:
             {bool} -- True if the file was successfully written, otherwise false
         """
-        filename = self._make_filename(self.file_name)
-        html = self.make_html()
-        if not html:
+        filename = self._write_html()
+        if filename is None:
             return False
-        with open(filename, 'w', encoding='utf-8') as output_file:
-            output_file.write(html)
+        self.output_file = filename
         return True
 
-    def send_post(self):
+    def _write_html(self, reserve=False, data=None, directory=None):
+        """Write the output html file, returning its path rather than storing it so that sends
+        from several threads sharing this object each get the path of their own file.
+
+        Keyword Arguments:
+            reserve {bool} -- Hold a reference to the file (see _reserve_file()) until it is released
+                              after sending (default: False)
+            data {Mapping} -- The snapshot of the form data to render, or None to take one (default: None)
+            directory {str} -- Directory to write the file in, or None for the directory of file_name (default: None)
+
+        Returns:
+            {str} -- Path and name of the file written, or None if there is no form data
+        """
+        filename = self._make_filename(self.file_name)
+        html = self._file_parts(data)
+        if html is None:
+            return None
+        directory = directory or os.path.dirname(filename) or '.'
+        if self.manifest:
+            self._startup_sweep(directory)
+        if self.content_name:
+            html = ''.join(html)
+            filename = self._content_filename(filename, html)
+        filename = self._shard_filename(directory, os.path.basename(filename))
+        if self.content_name:
+            with _PAGE_LOCK:
+                if not self._page_expired(filename):
+                    try:
+                        os.utime(filename)
+                        METRICS.inc('pages_reused')
+                    except FileNotFoundError:
+                        # Removed by the sweep of another process since the expiry was checked
+                        self._write_file(filename, html)
+                else:
+                    self._write_file(filename, html)
+                if reserve:
+                    self._acquire_file(filename)
+        else:
+            if reserve:
+                filename = self._reserve_file(filename)
+            try:
+                self._write_file(filename, html)
+            except BaseException:
+                if reserve:
+                    self._release_file(filename)
+                raise
+        if self.manifest:
+            record_file(filename, None if self._keeps_file() else time.time() + self.time_to_live, directory)
+        return filename
+
+    def _file_parts(self, data=None):
+        """Make the content to write to the output html file.  Pages are rendered as encoded
+        segments, except for content-named pages (which are hashed as text) and streamed form
+        data (which is rendered while it is written rather than held in memory).
+
+        Keyword Arguments:
+            data {Mapping} -- The snapshot of the form data to render, or None to take one (default: None)
+
+        Returns:
+            {list|iterator} -- The encoded segments or parts of the html file, or None if there is no form data
+        """
+        if data is None:
+            data = self._snapshot()
+        if self.content_name or isinstance(data, FieldStream):
+            return self._html_parts(data)
+        return self._encoded_parts(data)
+
+    def _shard_filename(self, directory, name):
+        """Make the path for an output file, placing it in a sharded subdirectory of the output
+        directory (created if needed) if sharding is in use.
+
+        Arguments:
+            directory {str} -- The output directory
+            name {str} -- The output file name
+
+        Returns:
+            {str} -- Path and name of the output file
+        """
+        return shard_filename(directory, name, self.shard_depth, self.shard_width)
+
+    @staticmethod
+    def _write_file(filename, html):
+        """Write the output html file from a string, a sequence of parts, or a list of encoded
+        segments (written with a single os.writev() call), removing the partly written file if
+        the form data turns out to be invalid while it is being written."""
+        if isinstance(html, str):
+            html = [html]
+        start = time.perf_counter()
+        if isinstance(html, list) and isinstance(html[0], bytes):
+            handle = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+            try:
+                size = encoded.write_segments(handle, html)
+            finally:
+                os.close(handle)
+        else:
+            try:
+                with open(filename, 'w', encoding='utf-8') as output_file:
+                    output_file.writelines(html)
+                    size = output_file.tell()
+            except ValueError:
+                os.remove(filename)
+                raise
+        METRICS.observe('write_seconds', time.perf_counter() - start)
+        METRICS.inc('pages_written')
+        METRICS.inc('bytes_written', size)
+
+    def submit(self, pool=None, headers=None):
+        """Send the POST request described by the output html file directly, without writing a
+        file or opening a browser.  The form data (with the current thread's overrides applied)
+        is encoded as application/x-www-form-urlencoded and posted to the url through a pool of
+        persistent connections.
+
+        Keyword Arguments:
+            pool {direct.ConnectionPool} -- The connection pool to use, which sets the concurrency limit and
+                                            retries, or None for a pool shared within this process (default: None)
+            headers {dict} -- Additional HTTP request headers (default: None)
+
+        Raises:
+            ValueError: Invalid url or form data
+            OSError: Unable to connect to the host
+
+        Returns:
+            {direct.Response} -- The response, with its status and timing, or None if there is no form data
+        """
+        url = self._validate_url(self.url)
+        data = self._snapshot()
+        pairs = data if isinstance(data, FieldStream) else data.items()
+        fields = [(key, str(value).strip()) for key, value in flatten_items(pairs)]
+        if not fields:
+            return None
+        return (pool or _DIRECT_POOL).post_form(url, fields, headers)
+
+    def _choose_delivery(self, data):
+        """Choose how to deliver the page to the browser.  Kept (or archived) pages and content-named
+        pages are always written to a regular file, as is a page for a 'tmpfs' delivery when there
+        is no memory-backed directory.
+
+        Arguments:
+            data {Mapping} -- The snapshot of the form data to render
+
+        Raises:
+            ValueError: Invalid delivery strategy
+
+        Returns:
+            {str} -- The delivery path: 'file', 'data', 'tmpfs' or 'server'
+        """
+        delivery = self.delivery
+        if delivery not in DELIVERIES:
+            raise ValueError('Invalid delivery strategy')
+        if self.keep_file or self.content_name:
+            return DELIVERY_FILE
+        if delivery == DELIVERY_AUTO:
+            size = None if isinstance(data, FieldStream) else estimate_size(self._page_frame(), flatten_items(data.items()), self.FIELD_TEMPLATE)
+            return choose_delivery(size, self.delivery_limits)
+        if delivery == DELIVERY_TMPFS and tmpfs_directory() is None:
+            return DELIVERY_FILE
+        return delivery
+
+    def _prepare_delivery(self, keep_file, watch_reads):
+        """Make the page available to the browser by the delivery path chosen for it: as a 'data:'
+        url, from a loopback server, or by writing the output html file (to a memory-backed
+        directory for the 'tmpfs' path).
+
+        Arguments:
+            keep_file {bool} -- The output html file is kept after sending
+            watch_reads {bool} -- Watch for the page being read, if the access cleanup strategy is in use
+
+        Returns:
+            {tuple} -- (delivery path, path or url to open, function removing the page or None if nothing is to be
+                       removed, watch on the page or None), or None if there is no form data
+        """
+        data = self._snapshot()
+        delivery = self._choose_delivery(data)
+        if delivery == DELIVERY_DATA:
+            segments = self._encoded_parts(data)
+            return None if segments is None else (delivery, make_data_url(segments), None, None)
+        if delivery == DELIVERY_SERVER:
+            if isinstance(data, FieldStream):
+                parts = self._html_parts(data)
+                if parts is None:
+                    return None
+                render = functools.partial(next, iter([parts]), None)     # Streamed form data can only be sent once
+            elif data:
+                render = functools.partial(self._encoded_parts, data)
+            else:
+                return None
+            server = PageServer(render)
+            watch = server if watch_reads and self.cleanup == CLEANUP_ACCESS else None
+            return delivery, server.url, server.close, watch
+        directory = tmpfs_directory() if delivery == DELIVERY_TMPFS else None
+        filename = self._write_html(reserve=not keep_file, data=data, directory=directory)
+        if filename is None:
+            return None
+        watch = self._watch_reads(filename) if watch_reads else None
+        return delivery, filename, None if keep_file else functools.partial(self._release_file, filename), watch
+
+    def send_post(self, dispatcher=None):
         """Open the output POST html file in the default web browser, automatically writing the
         output html file if it has not already been written.  Automatically removes the output
-        file after the specified time delay unless the keep_file flag has been set.
+        file after the specified time delay unless the keep_file flag has been set.  With the
+        'access' cleanup strategy, the file is instead removed shortly after the browser has read
+        it, with the time delay used as an upper limit.  The page is delivered by the path set by
+        the delivery property (see _prepare_delivery()).  A kept page being archived is added to
+        the archive under a unique name (see archive.unique_name()), which is stored in the
+        archive_name property.
+
+        Keyword Arguments:
+            dispatcher {Dispatcher} -- Dispatcher to queue the page with, waiting while its queue is full,
+                                       or None to open the page now (default: None)
 
         Returns:
             {bool} -- True if the file was successfully opened, otherwise false
         """
-        filename = self._make_filename(self.file_name)
-        if not self.write_html():
+        keep_file = self._keeps_file()
+        archived = self.keep_file and not keep_file
+        session = dispatcher if dispatcher is not None else self.active_session
+        prepared = self._prepare_delivery(keep_file, session is None)
+        if prepared is None:
             return False
-        if self.new_tab:
-            webbrowser.open_new_tab(filename)
+        delivery, target, remove, watch = prepared
+        METRICS.inc('deliveries_{0}'.format(delivery))
+        self.output_file = target
+        archive_name = self.archive_name = unique_name(target) if archived else None
+        if remove is not None:
+            METRICS.add('files_pending', 1)
+        launched = time.monotonic()
+
+        def release():
+            if archived:
+                self._archive_file(target, archive_name)
+            remove()
+            METRICS.add('files_pending', -1)
+            METRICS.observe('cleanup_lag_seconds', time.monotonic() - launched)
+
+        #   Within a session or dispatcher, removing the file is left to its cleanup queue
+        if session is not None:
+            opened = session.launch(target, self.new_tab, self.time_to_live, None if remove is None else release)
+        elif self.new_tab:
+            opened = webbrowser.open_new_tab(target)
         else:
-            webbrowser.open(filename)
+            opened = webbrowser.open(target)
+        if not opened:
+            METRICS.inc('launch_failures')
+            if dispatcher is not None:
+                return False
 
         #   Remove temporary HTML file
-        if not self.keep_file:
-            time.sleep(self.time_to_live)
-            if os.path.exists(filename):
-                os.remove(filename)
+        if remove is not None and session is None:
+            self._wait_for_cleanup(watch)
+            release()
 
         return True
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Keeps pages in a size-bounded archive of compressed segment files.
+
+Pages are appended to the newest segment file of an archive directory, each as a separate gzip
+member, so that any one page can be read back by seeking to its offset and decompressing it
+alone.  A new segment is started once the newest one reaches the segment size, and the oldest
+segments are removed once the archive exceeds its size limit.  Each segment has an index file
+listing its pages, one entry per line in the form "OFFSET<tab>LENGTH<tab>TIME<tab>NAME".  When a
+name appears more than once, the newest entry wins.  The same format is used by the command line
+utility, so either can add to the other's archive.
+"""
+
+import gzip
+import itertools
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:     # Not available on Windows, where the archive is not locked.
+    fcntl = None
+
+LOCK_NAME = '.openpost-archive.lock'
+SEGMENT_NAME = 'segment-{0:06d}'
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{6})\.gz$')
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+_NAME_COUNTER = itertools.count(1)
+
+
+def unique_name(name):
+    """Make a name for a page which is unique to this addition to an archive, from the name of
+    its html file with the time, process id and a sequence number added, such as
+    'OpenPost-20200315T142501-1234-7.html'.  The same form is used by the command line utility.
+
+    Arguments:
+        name {str} -- The name of the page's html file
+
+    Returns:
+        {str} -- The unique name
+    """
+    stem, extension = os.path.splitext(os.path.basename(name))
+    return '{0}-{1}-{2}-{3}{4}'.format(stem, time.strftime('%Y%m%dT%H%M%S'), os.getpid(), next(_NAME_COUNTER), extension or '.html')
+
+
+class _LockedArchive():
+    """Holds an exclusive lock on an archive directory while in use."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, LOCK_NAME)
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'a', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX)
+        return self.handle
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.handle.close()     # Closing the file also releases the lock
+
+
+class Archive():
+    """A directory of compressed segment files holding pages, with the oldest segments removed
+    once the total size passes a limit.
+    """
+
+    def __init__(self, directory, segment_size=DEFAULT_SEGMENT_SIZE, max_size=DEFAULT_MAX_SIZE):
+        """Open an archive, creating the directory if required.
+
+        Arguments:
+            directory {str} -- The archive directory
+
+        Keyword Arguments:
+            segment_size {int} -- Size in bytes at which a new segment is started (default: 4 MiB)
+            max_size {int} -- Total size in bytes above which the oldest segments are removed (default: 256 MiB)
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._indexes = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, number, extension):
+        return os.path.join(self.directory, SEGMENT_NAME.format(number) + extension)
+
+    def _segments(self):
+        """List the segment numbers, oldest first."""
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _segment_size(self, number):
+        size = 0
+        for extension in ('.gz', '.idx'):
+            try:
+                size += os.path.getsize(self._path(number, extension))
+            except OSError:
+                pass
+        return size
+
+    def _index(self, number):
+        """Read the index of a segment, reusing the cached copy if the index has not grown.
+
+        Arguments:
+            number {int} -- The segment number
+
+        Returns:
+            {dict} -- Mapping of page name to (offset, length, time)
+        """
+        path = self._path(number, '.idx')
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return {}
+        cached = self._indexes.get(number)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        entries = {}
+        with open(path, 'r', encoding='utf-8') as input_file:
+            for line in input_file:
+                fields = line.rstrip('\n').split('\t', 3)
+                if len(fields) == 4:
+                    try:
+                        entries[fields[3]] = (int(fields[0]), int(fields[1]), float(fields[2]))
+                    except ValueError:
+                        continue
+        self._indexes[number] = (size, entries)
+        return entries
+
+    def add(self, name, page):
+        """Add a page to the archive.
+
+        Arguments:
+            name {str} -- The name of the page, such as the name of its html file
+            page {str|bytes} -- The content of the page
+        """
+        self.add_pages([(name, page)])
+
+    def add_pages(self, pages):
+        """Add a number of pages to the archive in a single update.
+
+        Arguments:
+            pages {iterable} -- The (name, content) of each page, with the content as str or bytes
+
+        Returns:
+            {int} -- The number of pages added
+        """
+        count = 0
+        with self._lock, _LockedArchive(self.directory):
+            segments = self._segments()
+            number = segments[-1] if segments else 1
+            files = self._open_segment(number)
+            try:
+                for name, page in pages:
+                    if files[0].tell() >= self.segment_size:
+                        self._close_segment(files)
+                        number += 1
+                        files = self._open_segment(number)
+                    data = gzip.compress(page.encode('utf-8') if isinstance(page, str) else page)
+                    offset = files[0].tell()
+                    files[0].write(data)
+                    files[1].write('{0}\t{1}\t{2:.3f}\t{3}\n'.format(offset, len(data), time.time(), name))
+                    count += 1
+            finally:
+                self._close_segment(files)
+            self._evict()
+        return count
+
+    def _open_segment(self, number):
+        """Open the data and index files of a segment for appending.
+
+        Arguments:
+            number {int} -- The segment number
+
+        Returns:
+            {tuple} -- (data file, index file)
+        """
+        data_file = open(self._path(number, '.gz'), 'ab')     # pylint: disable=consider-using-with
+        data_file.seek(0, os.SEEK_END)
+        return data_file, open(self._path(number, '.idx'), 'a', encoding='utf-8')     # pylint: disable=consider-using-with
+
+    @staticmethod
+    def _close_segment(files):
+        files[0].close()
+        files[1].close()
+
+    def _evict(self):
+        """Remove the oldest segments until the archive is within its size limit, always keeping
+        the newest segment."""
+        segments = self._segments()
+        sizes = [self._segment_size(number) for number in segments]
+        total = sum(sizes)
+        for number, size in zip(segments[:-1], sizes):
+            if total <= self.max_size:
+                break
+            for extension in ('.gz', '.idx'):
+                try:
+                    os.remove(self._path(number, extension))
+                except OSError:
+                    pass
+            self._indexes.pop(number, None)
+            total -= size
+
+    def get(self, name):
+        """Read a page back from the archive, using the segment indexes to find it.
+
+        Arguments:
+            name {str} -- The name of the page
+
+        Raises:
+            KeyError: No page with the name in the archive
+
+        Returns:
+            {bytes} -- The content of the page
+        """
+        with self._lock, _LockedArchive(self.directory):
+            for number in reversed(self._segments()):
+                entry = self._index(number).get(name)
+                if entry is not None:
+                    with open(self._path(number, '.gz'), 'rb') as data_file:
+                        data_file.seek(entry[0])
+                        return gzip.decompress(data_file.read(entry[1]))
+        raise KeyError(name)
+
+    def names(self):
+        """List the pages in the archive.
+
+        Returns:
+            {dict} -- Mapping of the name of each page to the time it was added, oldest first
+        """
+        pages = {}
+        with self._lock, _LockedArchive(self.directory):
+            for number in self._segments():
+                for name, entry in sorted(self._index(number).items(), key=lambda item: item[1][0]):
+                    pages.pop(name, None)
+                    pages[name] = entry[2]
+        return pages
+
+    def size(self):
+        """Get the total size of the archive's segment and index files.
+
+        Returns:
+            {int} -- The size in bytes
+        """
+        return sum(self._segment_size(number) for number in self._segments())
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Renders batches of pages in a pool of worker processes.
+
+Rendering large forms is CPU-bound, so a batch rendered in a single process only uses one core.
+Here the whole batch (the parts of the page shared by every page, and the form data of each
+page) is handed to each worker once, when the worker starts, and each task then only names a
+range of the pages.  The workers flatten, render and encode the pages themselves, and either
+write them directly to their files, returning only the names, or return the encoded bytes.
+Returning the bytes means pickling every page back to the parent process, which then limits the
+throughput, so writing is the path that benefits from more workers.  A pool is only started when
+there is more than one worker and the batch has several chunks, as otherwise starting the
+workers costs more than rendering the pages.
+"""
+
+import collections
+import concurrent.futures
+import os
+
+from openpost.manifest import shard_filename
+from openpost.nested import NESTED_TYPES, flatten
+
+ENCODING = 'utf-8'
+MIN_POOL_TASKS = 4      # Batches of fewer chunks than this are rendered in the calling process
+
+#   The batch being rendered, set in each worker process by _init_worker().
+_BATCH = {}
+
+
+def _init_worker(frame, forms, layout=None):
+    """Store the batch in a worker process.
+
+    Arguments:
+        frame {tuple} -- (head, tail, field template, nested field template) shared by every page
+        forms {list} -- The form data for each page
+
+    Keyword Arguments:
+        layout {tuple} -- (directory, base name, shard depth, shard width) of the files written (default: None)
+    """
+    _BATCH['head'], _BATCH['tail'], _BATCH['field'], _BATCH['nested'] = frame
+    _BATCH['forms'] = forms
+    _BATCH['layout'] = layout
+
+
+def compact_form(form_data):
+    """Convert form data to the flattened fields rendered by render_page().
+
+    Arguments:
+        form_data {dict} -- Mapping (or iterable of (key, value) pairs) of the form data, which may
+                            include nested and multi-valued values (see nested.flatten())
+
+    Returns:
+        {tuple} -- Tuple of (key, value, nested) for each field, with the key and value as strings and
+                   nested set for the fields of nested and multi-valued values
+    """
+    items = form_data.items() if hasattr(form_data, 'items') else form_data
+    fields = []
+    for key, value in items:
+        if value.__class__ is not str and isinstance(value, NESTED_TYPES):
+            fields.extend((str(path), str(leaf), True) for path, leaf in flatten(key, value))
+        else:
+            fields.append((str(key), str(value), False))
+    return tuple(fields)
+
+
+def render_page(fields):
+    """Render and encode a page in a worker process.
+
+    Arguments:
+        fields {tuple} -- The flattened fields of the page (see compact_form())
+
+    Returns:
+        {bytes} -- The encoded page, or b'' if there are no fields
+    """
+    if not fields:
+        return b''
+    template, nested_template = _BATCH['field'], _BATCH['nested']
+    parts = [_BATCH['head']]
+    parts.extend((nested_template if nested else template).format(key, value.strip()) for key, value, nested in fields)
+    parts.append(_BATCH['tail'])
+    return ''.join(parts).encode(ENCODING)
+
+
+def _render_range(start, stop):
+    """Render a range of the pages of the batch.
+
+    Returns:
+        {list} -- The encoded page for each form
+    """
+    return [render_page(compact_form(form_data)) for form_data in _BATCH['forms'][start:stop]]
+
+
+def _write_range(start, stop):
+    """Render a range of the pages of the batch and write them to their files, skipping pages
+    with no fields.  Each file is named from the base name with the index of the page added.
+
+    Returns:
+        {list} -- The names of the files written
+    """
+    directory, base, depth, width = _BATCH['layout']
+    written = []
+    for index, form_data in enumerate(_BATCH['forms'][start:stop], start):
+        page = render_page(compact_form(form_data))
+        if not page:
+            continue
+        filename = shard_filename(directory, '{0}-{1}.html'.format(base, index), depth, width)
+        with open(filename, 'wb') as output_file:
+            output_file.write(page)
+        written.append(filename)
+    return written
+
+
+def run_batch(function, frame, forms, layout=None, workers=None, chunk_size=100, pending=None):
+    """Run a function over the ranges of a batch in a pool of worker processes, yielding the
+    results in order with only a limited number of ranges pending at any time.  The batch is
+    handed to each worker once, when it starts.  The ranges are run in this process instead if
+    there is only one worker, or fewer than MIN_POOL_TASKS ranges.
+
+    Arguments:
+        function {callable} -- Function run with the (start, stop) of each range
+        frame {tuple} -- (head, tail, field template, nested field template) shared by every page
+        forms {iterable} -- The form data for each page, which is read into a list
+
+    Keyword Arguments:
+        layout {tuple} -- (directory, base name, shard depth, shard width) of the files written (default: None)
+        workers {int} -- Number of worker processes, 0 or 1 to run the ranges in this process, or None
+                         for one per CPU (default: None)
+        chunk_size {int} -- Number of pages in each range (default: 100)
+        pending {int} -- Maximum number of ranges submitted but not yet finished, or None for twice the
+                         number of workers (default: None)
+
+    Yields:
+        The result for each range
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    forms = forms if isinstance(forms, list) else list(forms)
+    chunk_size = max(1, chunk_size)
+    ranges = [(start, min(start + chunk_size, len(forms))) for start in range(0, len(forms), chunk_size)]
+    if workers <= 1 or len(ranges) < MIN_POOL_TASKS:
+        _init_worker(frame, forms, layout)
+        try:
+            for start, stop in ranges:
+                yield function(start, stop)
+        finally:
+            _BATCH.clear()
+        return
+    pending = pending or 2 * workers
+    queue = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(frame, forms, layout)) as executor:
+        for start, stop in ranges:
+            if len(queue) >= pending:
+                yield queue.popleft().result()
+            queue.append(executor.submit(function, start, stop))
+        while queue:
+            yield queue.popleft().result()
+
+
+def render_chunks(frame, forms, workers=None, chunk_size=100):
+    """Render pages in worker processes.
+
+    Arguments:
+        frame {tuple} -- (head, tail, field template, nested field template) shared by every page
+        forms {iterable} -- The form data for each page
+
+    Keyword Arguments:
+        workers {int} -- Number of worker processes (see run_batch()) (default: None)
+        chunk_size {int} -- Number of pages rendered by a worker at a time (default: 100)
+
+    Yields:
+        {bytes} -- The encoded page for each form, in order
+    """
+    for pages in run_batch(_render_range, frame, forms, workers=workers, chunk_size=chunk_size):
+        yield from pages
+
+
+def write_chunks(frame, forms, layout, workers=None, chunk_size=100):
+    """Render pages in worker processes, which write them directly to their files.
+
+    Arguments:
+        frame {tuple} -- (head, tail, field template, nested field template) shared by every page
+        forms {iterable} -- The form data for each page
+        layout {tuple} -- (directory, base name, shard depth, shard width) of the files, which are named
+                          from the base name with the index of the page added
+
+    Keyword Arguments:
+        workers {int} -- Number of worker processes (see run_batch()) (default: None)
+        chunk_size {int} -- Number of pages rendered by a worker at a time (default: 100)
+
+    Yields:
+        {list} -- The names of the files written for each chunk, in order
+    """
+    yield from run_batch(_write_range, frame, forms, layout, workers, chunk_size)
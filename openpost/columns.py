@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Renders one page per row of columnar form data.
+
+The data is a mapping of key to a column of values (lists, arrays or anything else that can be
+iterated), or a pandas DataFrame when pandas is installed.  Each column is converted and rendered
+in a single pass, with the markup around the value formatted once for the key and reused for
+every row, and the pages are then joined together row by row.  For a DataFrame the conversion
+is done with pandas' vectorized string methods.
+"""
+
+try:
+    import pandas
+except ImportError:     # Optional, for DataFrame input
+    pandas = None
+
+
+def column_items(columns):
+    """Validate columnar form data.
+
+    Arguments:
+        columns {dict|DataFrame} -- Mapping of key to a column of values, or a pandas DataFrame
+
+    Raises:
+        ValueError: Not columnar data, or columns not the same length
+        TypeError: A column is a string rather than a sequence of values
+
+    Returns:
+        {list} -- (key, column) for each column
+    """
+    if pandas is not None and isinstance(columns, pandas.DataFrame):
+        return [(str(key), columns[key]) for key in columns.columns]
+    if not hasattr(columns, 'items'):
+        raise ValueError('Columns not a dictionary or DataFrame')
+    for key, values in columns.items():
+        if isinstance(values, (str, bytes)):
+            raise TypeError('Column {0!r} is a string, not a sequence of values'.format(key))
+    items = [(str(key), values if hasattr(values, '__len__') else list(values)) for key, values in columns.items()]
+    if len({len(values) for _key, values in items}) > 1:
+        raise ValueError('Columns not the same length')
+    return items
+
+
+def render_column(key, values, template):
+    """Render the field html for every value in a column.  The template is formatted once for
+    the key, and each value is converted to a string and stripped, as for a single page.
+
+    Arguments:
+        key {str} -- Key used in the form
+        values {iterable} -- The column of values
+        template {str} -- The field template, with '{0}' for the key and '{1}' for the value
+
+    Returns:
+        {list} -- The html for the field in each row
+    """
+    before, after = (part.format(key) for part in template.split('{1}'))
+    if pandas is not None and isinstance(values, pandas.Series):
+        return (before + values.astype(str).str.strip() + after).tolist()
+    return [before + value + after for value in map(str.strip, map(str, values))]
+
+
+def render_rows(head, tail, fixed, columns, template):
+    """Render the page for each row of the columns.
+
+    Arguments:
+        head {str} -- The html before the form fields
+        tail {str} -- The html after the form fields
+        fixed {str} -- The html for fields included in every page
+        columns {list} -- (key, column) for each column
+        template {str} -- The field template
+
+    Yields:
+        {str} -- The html for each row
+    """
+    rendered = [render_column(key, values, template) for key, values in columns]
+    head += fixed
+    for fields in zip(*rendered):
+        yield head + ''.join(fields) + tail
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Chooses how to deliver a page to the browser from its estimated size.
+
+Writing a regular file is not the cheapest path for every page.  A page can be written to a
+memory-backed (tmpfs) directory, avoiding the disk.  As /dev/shm is shared by all users, pages
+are written to a private directory made in it for each process.  A huge page is served from a
+loopback HTTP server, streaming it to the browser as it is rendered rather than writing it out
+first.  The size is estimated from the form data before rendering.  A page can also be opened
+directly as a 'data:' url, with nothing written or removed, but most browsers refuse to open a
+top-level 'data:' url, so that path is only used when asked for and is never chosen by size.
+"""
+
+import atexit
+import base64
+import collections
+import http.server
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+
+DELIVERY_FILE = 'file'
+DELIVERY_AUTO = 'auto'
+DELIVERY_DATA = 'data'
+DELIVERY_TMPFS = 'tmpfs'
+DELIVERY_SERVER = 'server'
+DELIVERIES = (DELIVERY_FILE, DELIVERY_AUTO, DELIVERY_DATA, DELIVERY_TMPFS, DELIVERY_SERVER)
+
+TMPFS_DIRECTORY = '/dev/shm'
+DATA_URL_PREFIX = 'data:text/html;charset=utf-8;base64,'
+SERVER_HOST = '127.0.0.1'
+
+#   Private memory-backed directory made for the output files of each process (by process id), or None if
+#   none could be made.
+_TMPFS_DIRECTORIES = {}
+_TMPFS_LOCK = threading.Lock()
+
+#   Largest estimated page size (in bytes) delivered by each path of the 'auto' strategy.
+DeliveryLimits = collections.namedtuple('DeliveryLimits', ['tmpfs'], defaults=[16 * 1024 * 1024])
+
+
+def estimate_size(frame, pairs, field_template):
+    """Estimate the size of a rendered page from its form data, without rendering it.
+
+    Arguments:
+        frame {tuple} -- (head, tail) of the page
+        pairs {iterable} -- The (key, value) pairs of the form data
+        field_template {str} -- Template for each field, with {0} for the key and {1} for the value
+
+    Returns:
+        {int} -- The estimated size in characters
+    """
+    overhead = len(field_template.format('', ''))
+    uses = field_template.count('{0}')
+    return len(frame[0]) + len(frame[1]) + sum(overhead + uses * len(key) + len(str(value)) for key, value in pairs)
+
+
+def tmpfs_directory():
+    """Get the private memory-backed directory for output files.  This is made (readable and
+    writable by the owner only) in /dev/shm the first time it is needed in this process, and is
+    removed when the process exits.  Since no other user or process writes to it, the output
+    files in it are not overwritten, removed or replaced with links by anyone else.
+
+    Returns:
+        {str} -- The directory, or None if there is none
+    """
+    pid = os.getpid()
+    with _TMPFS_LOCK:
+        directory = _TMPFS_DIRECTORIES.get(pid, '')
+        if directory is None or directory and os.path.isdir(directory):
+            return directory
+        try:
+            directory = tempfile.mkdtemp(prefix='openpost-', dir=TMPFS_DIRECTORY)
+        except OSError:
+            directory = None
+        else:
+            atexit.register(shutil.rmtree, directory, True)
+        _TMPFS_DIRECTORIES[pid] = directory
+        return directory
+
+
+def choose_delivery(size, limits=None):
+    """Choose the cheapest delivery path for a page opened in a browser.  A 'data:' url is never
+    chosen, as most browsers refuse to open one as a page.
+
+    Arguments:
+        size {int} -- Estimated size of the page, or None if it is not known (streamed form data)
+
+    Keyword Arguments:
+        limits {DeliveryLimits} -- Largest page size for each path, or None for the defaults (default: None)
+
+    Returns:
+        {str} -- The delivery path: 'tmpfs', 'file' or 'server'
+    """
+    limits = limits or DeliveryLimits()
+    if size is None:
+        return DELIVERY_SERVER
+    if size <= limits.tmpfs:
+        return DELIVERY_TMPFS if tmpfs_directory() is not None else DELIVERY_FILE
+    return DELIVERY_SERVER
+
+
+def make_data_url(segments):
+    """Make a 'data:' url holding a page.
+
+    Arguments:
+        segments {list} -- The content of the page, as bytes segments
+
+    Returns:
+        {str} -- The url
+    """
+    return DATA_URL_PREFIX + base64.b64encode(b''.join(segments)).decode('ascii')
+
+
+class _PageHandler(http.server.BaseHTTPRequestHandler):
+    """Answers requests for the page of a PageServer, and nothing else."""
+
+    def do_GET(self):   # pylint: disable=invalid-name
+        """Stream the page, or answer 404 for any other path and 410 once a one-time page has been sent."""
+        page = self.server.page
+        if self.path != page.path:
+            self.send_error(404)
+            return
+        parts = page.render()
+        if parts is None:
+            self.send_error(410)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        for part in parts:
+            self.wfile.write(part if isinstance(part, bytes) else part.encode('utf-8'))
+        page.served.set()
+
+    def log_message(self, format, *args):   # pylint: disable=redefined-builtin
+        pass
+
+
+class PageServer():
+    """Serves a single page from a loopback HTTP server running in a background thread.  The
+    page is given a random path, so it cannot be guessed by other local users, and is rendered
+    for each request as it is written to the browser.  It has the same waiting interface as an
+    inotify.Watch, so the 'access' cleanup strategy can stop the server once the page has been
+    read.
+    """
+
+    def __init__(self, render):
+        """Start serving a page.
+
+        Arguments:
+            render {callable} -- Function (with no arguments) returning the parts of the page (str or
+                                 bytes), or None if the page can no longer be sent
+        """
+        self.render = render
+        self.path = '/{0}.html'.format(secrets.token_urlsafe(16))
+        self.served = threading.Event()
+        self._server = http.server.ThreadingHTTPServer((SERVER_HOST, 0), _PageHandler)
+        self._server.daemon_threads = True
+        self._server.page = self
+        self.url = 'http://{0}:{1}{2}'.format(SERVER_HOST, self._server.server_address[1], self.path)
+        self._closed = False
+        self._lock = threading.Lock()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def wait_for(self, _mask, timeout):
+        """Wait until the page has been sent to the browser.
+
+        Arguments:
+            _mask {int} -- Ignored (for compatibility with inotify.Watch)
+            timeout {float} -- Maximum number of seconds to wait
+
+        Returns:
+            {bool} -- True if the page has been sent, otherwise False
+        """
+        return self.served.wait(timeout)
+
+    def close(self):
+        """Stop serving the page."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
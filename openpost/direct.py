@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Sends form data straight to the destination url, without a browser.
+
+The form data is encoded as application/x-www-form-urlencoded, as a browser would submit the
+form in the output html file, and posted through a pool of persistent http.client connections
+kept for each host, so that a run of submissions to the same host reuses a single connection.
+
+A form submission is not safe to repeat, so a request is only retried automatically when a
+connection taken from the pool turns out to have been closed by the server while it was idle,
+which is seen before any of the response has been received.  Retrying after other errors (such as
+a timeout waiting for the response, when the server may already have acted on the request) or
+after a 502, 503 or 504 response must be asked for.
+"""
+
+import collections
+import http.client
+import threading
+import time
+import urllib.parse
+
+from openpost.metrics import REGISTRY as METRICS
+
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+RETRY_STATUSES = frozenset((502, 503, 504))    # Suggested retry_statuses for requests which are safe to repeat
+STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)   # Retried on reused connections only
+
+Response = collections.namedtuple('Response', ['status', 'reason', 'headers', 'body', 'elapsed', 'attempts'])
+Response.__doc__ = """The result of a direct submission: the status code, reason phrase, headers (an
+http.client.HTTPMessage) and body (bytes) of the response, the time taken in seconds (including
+any retries) and the number of attempts made."""
+
+
+def encode_form(pairs):
+    """Encode form data as a browser would submit it.
+
+    Arguments:
+        pairs {iterable} -- The (key, value) pairs of the form data
+
+    Returns:
+        {bytes} -- The application/x-www-form-urlencoded request body
+    """
+    return urllib.parse.urlencode(list(pairs)).encode('ascii')
+
+
+def _split_url(url):
+    """Split a url into the connection key and the path to request.
+
+    Arguments:
+        url {str} -- The destination url
+
+    Raises:
+        ValueError: Not an http or https url
+
+    Returns:
+        {tuple} -- ((scheme, host, port), path)
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('Invalid url for direct submission.')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    return (parts.scheme, parts.hostname, port), path
+
+
+class ConnectionPool():
+    """Keeps persistent connections for each host, limiting the number of requests in progress
+    to each host at a time.  The pool is safe to share between threads.
+    """
+
+    def __init__(self, max_connections=4, timeout=10, retries=2, backoff=0.1, retry_statuses=()):
+        """Set up the pool.
+
+        Keyword Arguments:
+            max_connections {int} -- Maximum number of requests in progress (and connections kept) for each host (default: 4)
+            timeout {float} -- Seconds to wait when connecting or waiting for a response (default: 10)
+            retries {int} -- Number of times to retry a request which failed because an idle connection taken from
+                             the pool had been closed by the server, or got one of the retry_statuses (default: 2)
+            backoff {float} -- Seconds to wait before the first retry for a status, doubled for each further
+                               retry (default: 0.1)
+            retry_statuses {iterable} -- Response status codes after which a request is retried, such as
+                                         RETRY_STATUSES, for requests which are safe to repeat (default: ())
+        """
+        self.max_connections = max(1, max_connections)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_statuses = frozenset(retry_statuses)
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._limits = {}
+
+    def _limit(self, key):
+        with self._lock:
+            if key not in self._limits:
+                self._limits[key] = threading.BoundedSemaphore(self.max_connections)
+            return self._limits[key]
+
+    def _connection(self, key):
+        """Take an idle connection to a host, or make a new one.
+
+        Arguments:
+            key {tuple} -- (scheme, host, port) of the connection
+
+        Returns:
+            {tuple} -- (connection, True if it was taken from the idle connections)
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        METRICS.inc('connections_opened')
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            self._idle.setdefault(key, []).append(connection)
+
+    def request(self, method, url, body=None, headers=None):
+        """Make a request, reusing an idle connection to the host if there is one.  The request is
+        retried on a new connection if the idle connection had been closed or reset by the server, and
+        (after a backoff) if the response status is one of the retry_statuses.  No other errors
+        are retried, as the server may already have acted on the request.
+
+        Arguments:
+            method {str} -- The request method, such as 'POST'
+            url {str} -- The destination url
+
+        Keyword Arguments:
+            body {bytes} -- The request body (default: None)
+            headers {dict} -- Request headers (default: None)
+
+        Raises:
+            ValueError: Not an http or https url
+            OSError: Unable to connect to the host, or the connection failed
+            http.client.HTTPException: Invalid response
+
+        Returns:
+            {Response} -- The response
+        """
+        key, path = _split_url(url)
+        start = time.perf_counter()
+        with self._limit(key):
+            status_retries = 0
+            for attempt in range(1, self.retries + 2):
+                if attempt > 1:
+                    METRICS.inc('submit_retries')
+                connection, reused = self._connection(key)
+                try:
+                    connection.request(method, path, body, headers or {})
+                    response = connection.getresponse()
+                    content = response.read()
+                except STALE_ERRORS:
+                    connection.close()
+                    if not reused or attempt > self.retries:
+                        METRICS.inc('submit_failures')
+                        raise
+                    continue
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    METRICS.inc('submit_failures')
+                    raise
+                if response.will_close:
+                    connection.close()
+                else:
+                    self._release(key, connection)
+                if response.status not in self.retry_statuses or attempt > self.retries:
+                    break
+                time.sleep(self.backoff * 2 ** status_retries)
+                status_retries += 1
+        elapsed = time.perf_counter() - start
+        METRICS.observe('submit_seconds', elapsed)
+        return Response(response.status, response.reason, response.headers, content, elapsed, attempt)
+
+    def post_form(self, url, pairs, headers=None):
+        """Post form data to a url.
+
+        Arguments:
+            url {str} -- The destination url
+            pairs {iterable} -- The (key, value) pairs of the form data
+
+        Keyword Arguments:
+            headers {dict} -- Additional request headers (default: None)
+
+        Returns:
+            {Response} -- The response
+        """
+        request_headers = {'Content-Type': FORM_CONTENT_TYPE}
+        request_headers.update(headers or {})
+        return self.request('POST', url, encode_form(pairs), request_headers)
+
+    def close(self):
+        """Close all of the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+# pylint: disable=R0902
+
+"""Dispatches pages to the browser from a bounded queue, limiting the launch rate.
+
+Sending from many threads at once can start hundreds of browser launches a second, which the
+browser answers by dropping tabs or stalling, while the pages are removed before they have been
+loaded.  A dispatcher puts the pages into a bounded queue, which is worked by a fixed number of
+launch threads spaced out to a maximum number of launches per second.  Senders block while the
+queue is full, so they are slowed to the pace of the browser.  The time-to-live of each page
+starts once the page has been launched, rather than when it was queued.
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+import webbrowser
+
+from openpost.metrics import REGISTRY as METRICS
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Dispatcher():
+    """Launches queued pages in the browser, with limits on the number of launches in progress
+    and the number of launches per second.  Files are removed by a single cleanup thread once
+    their time-to-live (counted from the launch) has passed.
+    """
+
+    def __init__(self, max_concurrent=4, rate=10.0, queue_size=64, timeout=None, browser=None):
+        """Start the launch and cleanup threads.
+
+        Keyword Arguments:
+            max_concurrent {int} -- Maximum number of browser launches in progress at once (default: 4)
+            rate {float} -- Maximum number of launches started per second, or 0 for no limit (default: 10.0)
+            queue_size {int} -- Maximum number of pages waiting to be launched (default: 64)
+            timeout {float} -- Seconds a sender waits for room in a full queue before the page is
+                               dropped, or None to wait as long as needed (default: None)
+            browser {str} -- Name of the browser to use, as passed to webbrowser.get() (default: None)
+        """
+        self.browser = browser
+        self.controller = None
+        self.rate = rate
+        self.timeout = timeout
+        self.closed = False
+        self._queue = queue.Queue(max(1, queue_size))
+        self._lock = threading.Lock()
+        self._cleanup_ready = threading.Condition(self._lock)
+        self._puts_done = threading.Condition(self._lock)
+        self._putting = 0       # Number of senders between the closed check and the end of their put
+        self._next_launch = time.monotonic()
+        self._order = itertools.count()
+        self._pending = []      # Heap of (deadline, order, release) for files waiting to be removed
+        self._stopping = False
+        self._workers = [threading.Thread(target=self._launch_pages, daemon=True) for _count in range(max(1, max_concurrent))]
+        self._reaper = threading.Thread(target=self._reap_pages, daemon=True)
+        for thread in self._workers + [self._reaper]:
+            thread.start()
+
+    def launch(self, filename, new_tab=True, time_to_live=0, release=None):
+        """Queue a file to be opened in the browser, waiting while the queue is full.
+
+        Arguments:
+            filename {str} -- Path and name of the file
+
+        Keyword Arguments:
+            new_tab {bool} -- Open the file in a new browser tab (default: True)
+            time_to_live {float} -- Seconds to keep the file once it has been launched (default: 0)
+            release {callable} -- Function to call (with no arguments) to remove the file, or None
+                                  if the file is to be kept (default: None)
+
+        Raises:
+            ValueError: Dispatcher is closed (in which case the file is released at once)
+
+        Returns:
+            {bool} -- True if the file was queued, or False if the queue stayed full for the timeout
+                      (in which case the file is released at once)
+        """
+        with self._lock:
+            closed = self.closed
+            if not closed:
+                self._putting += 1
+        if closed:
+            if release is not None:
+                release()
+            raise ValueError('Dispatcher is closed')
+        try:
+            self._queue.put((filename, new_tab, time_to_live, release), timeout=self.timeout)
+        except queue.Full:
+            if release is not None:
+                release()
+            return False
+        finally:
+            with self._puts_done:
+                self._putting -= 1
+                self._puts_done.notify_all()
+        METRICS.add('launches_queued', 1)
+        return True
+
+    def send(self, poster):
+        """Send an OpenPost object through this dispatcher, waiting while the queue is full.
+
+        Arguments:
+            poster {OpenPost} -- The object to send
+
+        Raises:
+            ValueError: Dispatcher is closed
+
+        Returns:
+            {bool} -- True if the page was queued, otherwise False
+        """
+        if self.closed:
+            raise ValueError('Dispatcher is closed')
+        return poster.send_post(dispatcher=self)
+
+    async def send_async(self, poster):
+        """Send an OpenPost object through this dispatcher from a coroutine.  The event loop is
+        not blocked while the queue is full; the coroutine waits for room instead.  Thread-local
+        overrides made with OpenPost.overrides() do not apply, as the page is written in a thread
+        of the loop's default executor.
+
+        Arguments:
+            poster {OpenPost} -- The object to send
+
+        Returns:
+            {bool} -- True if the page was queued, otherwise False
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(poster.send_post, dispatcher=self))
+
+    def _wait_for_slot(self):
+        """Wait until the rate limit allows another launch to start."""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_launch)
+            self._next_launch = start + 1 / self.rate
+        time.sleep(start - now)
+
+    def _launch_pages(self):
+        """Launch thread: open the queued pages until a stop marker is received."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                filename, new_tab, time_to_live, release = item
+                self._wait_for_slot()
+                METRICS.add('launches_queued', -1)
+                try:
+                    controller = self._get_controller()
+                    if controller is None:
+                        METRICS.inc('launch_failures')
+                        LOGGER.error('Unable to launch %s: no browser found', filename)
+                    else:
+                        if not controller.open(filename, 2 if new_tab else 0):
+                            METRICS.inc('launch_failures')
+                        METRICS.inc('browser_launches')
+                except Exception:   # pylint: disable=broad-except
+                    METRICS.inc('launch_failures')
+                    LOGGER.exception('Unable to launch %s', filename)
+                finally:
+                    if release is not None:
+                        with self._cleanup_ready:
+                            heapq.heappush(self._pending, (time.monotonic() + time_to_live, next(self._order), release))
+                            self._cleanup_ready.notify()
+            finally:
+                self._queue.task_done()
+
+    def _get_controller(self):
+        """Get the browser controller, looking it up the first time a page is launched.
+
+        Returns:
+            {webbrowser.BaseBrowser} -- The browser controller, or None if no browser can be found
+        """
+        with self._lock:
+            if self.controller is None:
+                try:
+                    self.controller = webbrowser.get(self.browser)
+                except webbrowser.Error:
+                    return None
+            return self.controller
+
+    def _reap_pages(self):
+        """Cleanup thread: remove the files whose time-to-live has passed, until stopped."""
+        while True:
+            with self._cleanup_ready:
+                while True:
+                    now = time.monotonic()
+                    if self._pending and (self._stopping or self._pending[0][0] <= now):
+                        release = heapq.heappop(self._pending)[2]
+                        break
+                    if self._stopping:
+                        return
+                    self._cleanup_ready.wait(self._pending[0][0] - now if self._pending else None)
+            try:
+                release()
+            except Exception:   # pylint: disable=broad-except
+                METRICS.inc('cleanup_failures')
+                LOGGER.exception('Unable to remove a launched page')
+
+    def join(self):
+        """Wait until every queued page has been launched."""
+        self._queue.join()
+
+    @property
+    def queued(self):
+        """{int} -- Number of pages waiting to be launched"""
+        return self._queue.qsize()
+
+    @property
+    def pending(self):
+        """{int} -- Number of launched files waiting to be removed"""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self, wait=True):
+        """Close the dispatcher, launching the pages still queued and then removing all of the
+        files waiting to be removed.
+
+        Keyword Arguments:
+            wait {bool} -- First wait until the time-to-live of every launched file has passed (default: True)
+        """
+        with self._puts_done:
+            if self.closed:
+                return
+            self.closed = True
+            #   Senders already past the closed check finish queuing before the stop markers
+            while self._putting:
+                self._puts_done.wait()
+        for _thread in self._workers:
+            self._queue.put(None)
+        for thread in self._workers:
+            thread.join()
+        if wait:
+            with self._lock:
+                deadline = max((entry[0] for entry in self._pending), default=0)
+            time.sleep(max(0, deadline - time.monotonic()))
+        with self._cleanup_ready:
+            self._stopping = True
+            self._cleanup_ready.notify()
+        self._reaper.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(wait=exc_type is None)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Renders pages as lists of pre-encoded byte segments, written with a single os.writev() call.
+
+The parts of the field template around each value are formatted and encoded once per key and
+kept in a least-recently-used cache, so rendering a page only encodes the field values.  The
+segments are written as they are, without joining them into a single document first.
+"""
+
+import collections
+import os
+
+from openpost.nested import NESTED_TYPES, flatten
+
+FIELD_CACHE_LIMIT = 131072  # Number of encoded field templates cached, enough for every field of a 100k-field form
+_FIELDS = collections.OrderedDict()    # Least recently used first
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+
+def field_segments(template, key):
+    """Get the encoded parts of a field before and after its value.
+
+    Arguments:
+        template {str} -- The field template, with '{0}' for the key and '{1}' for the value
+        key {str} -- Key used in the form
+
+    Returns:
+        {tuple} -- (before, after) the value, encoded as UTF-8
+    """
+    try:
+        segments = _FIELDS[template, key]
+    except KeyError:
+        before, after = template.split('{1}')
+        segments = _FIELDS[template, key] = (before.format(key).encode('utf-8'), after.format(key).encode('utf-8'))
+        if len(_FIELDS) > FIELD_CACHE_LIMIT:
+            try:
+                _FIELDS.popitem(last=False)
+            except KeyError:    # Emptied by another thread
+                pass
+        return segments
+    try:
+        _FIELDS.move_to_end((template, key))
+    except KeyError:            # Evicted by another thread
+        pass
+    return segments
+
+
+def encode_fields(template, pairs, nested_template=None):
+    """Render the fields of a form as encoded segments.  Nested and multi-valued values are
+    flattened into their fields as they are rendered (see nested.flatten()).
+
+    Arguments:
+        template {str} -- The field template
+        pairs {iterable} -- The (key, value) pairs of the form data
+
+    Keyword Arguments:
+        nested_template {str} -- The field template for the fields of nested and multi-valued values,
+                                 or None to use template (default: None)
+
+    Returns:
+        {list} -- The segments for the fields, three for each field
+    """
+    segments = []
+    for key, value in pairs:
+        if value.__class__ is not str and isinstance(value, NESTED_TYPES):     # Strings skip the slower Mapping ABC check
+            for path, leaf in flatten(key, value):
+                before, after = field_segments(nested_template or template, path)
+                segments += (before, str(leaf).strip().encode('utf-8'), after)
+            continue
+        before, after = field_segments(template, key)
+        segments += (before, str(value).strip().encode('utf-8'), after)
+    return segments
+
+
+def write_segments(fd, segments):
+    """Write a list of segments to a file descriptor, using os.writev() where it is available.
+    Partial writes are continued from where they stopped.
+
+    Arguments:
+        fd {int} -- The file descriptor
+        segments {list} -- The bytes segments to write
+
+    Returns:
+        {int} -- The number of bytes written
+    """
+    if not hasattr(os, 'writev'):
+        data = memoryview(b''.join(segments))
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+        return written
+    segments = list(segments)
+    total = 0
+    index = 0
+    while index < len(segments):
+        batch = segments[index:index + IOV_MAX]
+        written = os.writev(fd, batch)
+        total += written
+        for segment in batch:
+            if written < len(segment):
+                segments[index] = memoryview(segment)[written:]
+                break
+            written -= len(segment)
+            index += 1
+    return total
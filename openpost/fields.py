@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Form data supplied as a lazy stream of (key, value) pairs, validated as it is consumed."""
+
+
+def validate_field(item):
+    """Validate a single item of form data.
+
+    Arguments:
+        item {tuple} -- The (key, value) pair for the field
+
+    Raises:
+        ValueError: Item not a (key, value) pair
+
+    Returns:
+        {tuple} -- The (key, value) pair
+    """
+    if not isinstance(item, (tuple, list)) or len(item) != 2:
+        raise ValueError('Form_data item not a (key, value) pair')
+    return item[0], item[1]
+
+
+class FieldStream():
+    """Form data read from any iterable of (key, value) pairs, such as a generator, a database
+    cursor or a mapping's items() view.  The pairs are only read (and validated, one at a time)
+    while the html is being rendered, so the stream can only be consumed once.
+    """
+
+    def __init__(self, items):
+        """Wrap an iterable of form data.
+
+        Arguments:
+            items {iterable} -- The (key, value) pairs to include in the POST request
+        """
+        self._items = iter(items)
+        self.consumed = False
+
+    def __iter__(self):
+        if self.consumed:
+            raise ValueError('Form_data stream already consumed')
+        self.consumed = True
+        return (validate_field(item) for item in self._items)
+
+    def lines(self, render):
+        """Render the html for each field as it is read from the stream.
+
+        Arguments:
+            render {callable} -- Function taking (key, value) and returning the html for a field
+
+        Returns:
+            {generator} -- The html for each field
+        """
+        return (render(key, value) for key, value in self)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Watches files for access using the Linux inotify interface (through ctypes)."""
+
+import ctypes
+import os
+import select
+import struct
+import sys
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 4096
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if hasattr(libc, 'inotify_init1') and hasattr(libc, 'inotify_add_watch'):
+            return libc
+    except OSError:
+        pass
+    return None
+
+
+_LIBC = _load_libc()
+
+
+def available():
+    """Check whether inotify is available on this system.
+
+    Returns:
+        {bool} -- True if files can be watched
+    """
+    return _LIBC is not None
+
+
+class Watch():
+    """Watches a single file for a set of inotify events.  The watch is in place as soon as the
+    object has been created, so events that happen before wait() is called are not missed.
+    """
+
+    def __init__(self, path, mask=IN_OPEN | IN_CLOSE_NOWRITE):
+        """Start watching a file.
+
+        Arguments:
+            path {str} -- Path and name of the file to watch
+
+        Keyword Arguments:
+            mask {int} -- The inotify events to watch for (default: IN_OPEN | IN_CLOSE_NOWRITE)
+
+        Raises:
+            OSError: inotify is not available, or the file cannot be watched
+        """
+        if _LIBC is None:
+            raise OSError('inotify is not available')
+        self.fd = _LIBC.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if _LIBC.inotify_add_watch(self.fd, os.fsencode(path), mask | IN_DELETE_SELF) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch failed', path)
+
+    def events(self, timeout):
+        """Wait for the next batch of events.
+
+        Arguments:
+            timeout {float} -- Maximum number of seconds to wait
+
+        Returns:
+            {list} -- The event masks received, or [] if the timeout passed first
+        """
+        ready, _write, _error = select.select([self.fd], [], [], max(0, timeout))
+        if not ready:
+            return []
+        buffer = os.read(self.fd, READ_SIZE)
+        masks = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            _wd, mask, _cookie, length = EVENT_HEADER.unpack_from(buffer, offset)
+            masks.append(mask)
+            offset += EVENT_HEADER.size + length
+        return masks
+
+    def wait_for(self, mask, timeout):
+        """Wait until one of the specified events happens, or the file is deleted.
+
+        Arguments:
+            mask {int} -- The inotify events to wait for
+            timeout {float} -- Maximum number of seconds to wait
+
+        Returns:
+            {bool} -- True if one of the events happened, otherwise False
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            for event in self.events(remaining):
+                if event & mask:
+                    return True
+                if event & (IN_DELETE_SELF | IN_IGNORED):
+                    return False
+
+    def close(self):
+        """Stop watching the file."""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
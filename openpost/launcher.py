@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Opens many pages with a single browser command.
+
+Each call to webbrowser.open() starts a new browser process.  Here pages are collected, either
+for a short window or from a single call, and opened together by starting the browser once with
+all of their paths as arguments (such as 'firefox -new-tab page1 -new-tab page2'), for the
+Firefox and Chrome controllers, whose commands accept several urls.  Other controllers open each
+page in turn.
+"""
+
+import subprocess
+import sys
+import threading
+import webbrowser
+
+from openpost.metrics import REGISTRY as METRICS
+
+REMOTE_TIMEOUT = 5      # Seconds to wait for a remote browser command, as for webbrowser
+
+
+#   Browser controllers whose remote command accepts several urls at once.  Other controllers
+#   (such as xdg-open, the default on most Linux desktops) take a single url.
+BATCH_CONTROLLERS = (webbrowser.Mozilla, webbrowser.Chrome)
+
+
+def batch_command(controller, urls, new_tab=True):
+    """Make a single command line opening all of the urls with a browser controller.
+
+    Arguments:
+        controller {webbrowser.BaseBrowser} -- The browser controller
+        urls {list} -- The urls (or paths) to open
+
+    Keyword Arguments:
+        new_tab {bool} -- Open the pages in new tabs (default: True)
+
+    Returns:
+        {list} -- The command line, or None if the controller cannot open several urls with one command
+    """
+    if not isinstance(controller, BATCH_CONTROLLERS):
+        return None
+    if new_tab:
+        action = controller.remote_action_newtab if controller.remote_action_newtab is not None else controller.remote_action_newwin
+    else:
+        action = controller.remote_action
+    args = []
+    for url in urls:
+        args.extend(arg.replace('%s', url).replace('%action', action or '') for arg in controller.remote_args)
+    return [controller.name] + [arg for arg in args if arg]
+
+
+def run_command(command):
+    """Start a browser command, waiting for it as webbrowser does for a remote command.  A
+    command still running after REMOTE_TIMEOUT seconds is taken to have started the browser.
+
+    Arguments:
+        command {list} -- The command line
+
+    Returns:
+        {bool} -- True if the browser was launched
+    """
+    options = {'start_new_session': True} if not sys.platform.startswith('win') else {}
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, close_fds=True, **options)  # pylint: disable=consider-using-with
+    except OSError:
+        return False
+    try:
+        return process.wait(REMOTE_TIMEOUT) == 0
+    except subprocess.TimeoutExpired:
+        return True
+
+
+class BatchLauncher():
+    """Opens pages in a browser, starting the browser once for each group of pages."""
+
+    def __init__(self, browser=None, window=0.05, max_pages=20):
+        """Set up the launcher.  The browser controller is looked up when the first page is
+        launched, so a launcher can be made on a host with no browser.
+
+        Keyword Arguments:
+            browser {str} -- Name of the browser to use, as passed to webbrowser.get() (default: None)
+            window {float} -- Seconds to collect pages passed to open() before launching them (default: 0.05)
+            max_pages {int} -- Maximum number of pages opened by each browser command (default: 20)
+        """
+        self.browser = browser
+        self.controller = None
+        self.window = window
+        self.max_pages = max(1, max_pages)
+        self._lock = threading.Lock()
+        self._queue = []
+        self._timer = None
+
+    def launch(self, paths, new_tab=True):
+        """Open a number of pages now, starting the browser once for every max_pages pages.
+
+        Arguments:
+            paths {iterable} -- The paths (or urls) of the pages
+
+        Keyword Arguments:
+            new_tab {bool} -- Open the pages in new tabs (default: True)
+
+        Returns:
+            {bool} -- True if the browser was launched for every page
+        """
+        paths = list(paths)
+        controller = self._get_controller()
+        if controller is None:
+            METRICS.inc('launch_failures', len(paths))
+            return not paths
+        launched = True
+        for start in range(0, len(paths), self.max_pages):
+            group = paths[start:start + self.max_pages]
+            command = batch_command(controller, group, new_tab)
+            if command is None:
+                results = [controller.open(path, 2 if new_tab else 0) for path in group]
+            else:
+                results = [run_command(command)] * len(group)
+            METRICS.inc('browser_launches', 1 if command is not None else len(group))
+            METRICS.inc('launch_failures', results.count(False))
+            launched = launched and all(results)
+        return launched
+
+    def _get_controller(self):
+        """Get the browser controller, looking it up the first time it is needed.
+
+        Returns:
+            {webbrowser.BaseBrowser} -- The browser controller, or None if no browser can be found
+        """
+        if self.controller is None:
+            try:
+                self.controller = webbrowser.get(self.browser)
+            except webbrowser.Error:
+                return None
+        return self.controller
+
+    def open(self, path, new_tab=True):
+        """Queue a page to be opened along with any others queued within the window.  The pages
+        are opened once the window has passed, or as soon as max_pages pages are queued.
+
+        Arguments:
+            path {str} -- The path (or url) of the page
+
+        Keyword Arguments:
+            new_tab {bool} -- Open the page in a new tab (default: True)
+
+        Returns:
+            {bool} -- True, as the page is opened later (failures are counted in the launch_failures metric)
+        """
+        with self._lock:
+            self._queue.append((path, new_tab))
+            full = len(self._queue) >= self.max_pages
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Open all of the queued pages now."""
+        with self._lock:
+            queue, self._queue = self._queue, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        for new_tab in (True, False):
+            paths = [path for path, tab in queue if tab == new_tab]
+            if paths:
+                self.launch(paths, new_tab)
+
+    def close(self):
+        """Open any pages still queued."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
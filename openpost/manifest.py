@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Keeps a manifest of written html files and sweeps expired (and optionally orphaned) files from a directory.
+
+Each output directory has a manifest file listing the html files written to it along with
+their expiry time, one entry per line in the form "EXPIRY<tab>NAME".  An expiry of "-" marks
+a file that is to be kept.  When a name appears more than once, the last entry wins.  The
+same format is used by the command line utility, so either can sweep the other's files.
+
+Files may be spread over sharded subdirectories, named with hex digits taken from a hash of the
+file name (see shard_path()).  These are listed in the manifest of the top directory using
+their relative path (with '/' separators), and are included when sweeping.
+
+Only files listed in the manifest with an expiry time are removed by default.  Unlisted files
+(such as pages kept before the manifest was used, or written with the manifest turned off) are
+only removed when orphan removal is asked for.
+"""
+
+import hashlib
+import itertools
+import os
+import re
+import time
+
+try:
+    import fcntl
+except ImportError:     # Not available on Windows, where the manifest is not locked.
+    fcntl = None
+
+MANIFEST_NAME = '.openpost-manifest'
+ORPHAN_GRACE = 60       # Longest allowed time-to-live, in seconds
+SIGNATURE = b'<title>OpenPost Redirector</title>'
+SIGNATURE_BYTES = 256
+HEX_DIGITS = frozenset('0123456789abcdef')
+MAX_SHARD_WIDTH = 8
+COMPACT_LINES = 1000    # Minimum number of lines appended to a manifest between compactions
+EXPIRY_PATTERN = re.compile(r'^(\d+(?:\.\d*)?)\t', re.MULTILINE)
+
+#   Number of lines which may still be appended to each manifest (by path) by this process before it
+#   is compacted, so that a long-running process does not grow a manifest without limit between sweeps.
+_APPENDS_LEFT = {}
+
+
+class _LockedManifest():
+    """Opens the manifest file for a directory, holding a lock while in use.  The lock is
+    exclusive, unless a shared lock is asked for to only read the manifest."""
+
+    def __init__(self, directory, shared=False):
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.shared = shared
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'a+', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self.handle
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.handle.close()     # Closing the file also releases the lock
+
+
+def _read_entries(handle):
+    """Read the entries from an open manifest file.
+
+    Arguments:
+        handle {file} -- The open manifest file
+
+    Returns:
+        {dict} -- Mapping of file name to expiry time (None if the file is to be kept)
+    """
+    handle.seek(0)
+    return _parse_entries(handle)
+
+
+def _parse_entries(lines):
+    """Parse the entries from the lines of a manifest.
+
+    Arguments:
+        lines {iterable} -- The lines of the manifest
+
+    Returns:
+        {dict} -- Mapping of file name to expiry time (None if the file is to be kept)
+    """
+    entries = {}
+    for line in lines:
+        expires, _sep, name = line.rstrip('\n').partition('\t')
+        if not name:
+            continue
+        try:
+            entries[name] = None if expires == '-' else float(expires)
+        except ValueError:
+            continue
+    return entries
+
+
+def _format_entry(name, expires):
+    return '{0}\t{1}\n'.format('-' if expires is None else '{0:.3f}'.format(expires), name)
+
+
+def _expired(entries, now, limit=None):
+    """List the names of the expired files in the manifest entries, stopping after limit names.
+
+    Arguments:
+        entries {dict} -- The manifest entries
+        now {float} -- The current time
+
+    Keyword Arguments:
+        limit {int} -- Maximum number of names to list, or None for all (default: None)
+
+    Returns:
+        {list} -- The names of the expired files
+    """
+    return list(itertools.islice((name for name, expires in entries.items() if expires is not None and expires <= now), limit))
+
+
+def _may_have_expired(text, now):
+    """Check quickly whether the text of a manifest has any entries with an expiry time that has
+    passed, without parsing the entries.  Repeated entries for a name are not checked, so a file
+    may since have been listed again as pending or kept."""
+    return any(float(expires) <= now for expires in EXPIRY_PATTERN.findall(text))
+
+
+def _rewrite(handle, entries):
+    """Replace the content of an open manifest file with the entries."""
+    handle.seek(0)
+    handle.truncate()
+    handle.write(''.join(_format_entry(name, expires) for name, expires in entries.items()))
+
+
+def _append(directory, lines):
+    """Append entries to the manifest of a directory.  After every COMPACT_LINES lines appended
+    by this process (or as many lines as the manifest held after its last compaction, if more),
+    the manifest is rewritten without the repeated entries for a name and the entries for expired
+    files which no longer exist (such as files removed after being sent).
+
+    Arguments:
+        directory {str} -- The directory holding the manifest
+        lines {list} -- The formatted entries to append
+    """
+    with _LockedManifest(directory) as handle:
+        handle.write(''.join(lines))
+        path = os.path.abspath(handle.name)
+        left = _APPENDS_LEFT.get(path, COMPACT_LINES) - len(lines)
+        if left > 0:
+            _APPENDS_LEFT[path] = left
+            return
+        now = time.time()
+        entries = {name: expires for name, expires in _read_entries(handle).items()
+                   if expires is None or expires > now or os.path.exists(os.path.join(directory, name))}
+        _rewrite(handle, entries)
+        _APPENDS_LEFT[path] = max(COMPACT_LINES, len(entries))
+
+
+def shard_path(name, depth, width=2):
+    """Make the sharded subdirectory path for a file name.  Each of the depth levels is named
+    with width hex digits taken from a hash of the name, giving a fan-out of 16 ** width
+    subdirectories per level.
+
+    Arguments:
+        name {str} -- The file name (without any directory)
+        depth {int} -- Number of levels of subdirectories (0 for none)
+
+    Keyword Arguments:
+        width {int} -- Number of hex digits in each subdirectory name (1-8) (default: 2)
+
+    Raises:
+        ValueError: Shard depth or width out of range
+
+    Returns:
+        {str} -- The relative path of the subdirectory, or '' if depth is 0
+    """
+    if not depth:
+        return ''
+    if not 0 < width <= MAX_SHARD_WIDTH or not 0 < depth * width <= 40:
+        raise ValueError('Shard depth or width out of range')
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+    return os.path.join(*[digest[level * width:(level + 1) * width] for level in range(depth)])
+
+
+def shard_filename(directory, name, depth, width=2):
+    """Make the path for a file, placing it in its sharded subdirectory of the directory (which
+    is created if needed) if sharding is in use.
+
+    Arguments:
+        directory {str} -- The top directory
+        name {str} -- The file name (without any directory)
+        depth {int} -- Number of levels of subdirectories (0 for none)
+
+    Keyword Arguments:
+        width {int} -- Number of hex digits in each subdirectory name (1-8) (default: 2)
+
+    Returns:
+        {str} -- Path and name of the file
+    """
+    subdirectory = shard_path(name, depth, width)
+    if not subdirectory:
+        return os.path.join(directory, name) if directory != '.' else name
+    os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+    return os.path.join(directory, subdirectory, name)
+
+
+def record_file(filename, expires=None, directory=None):
+    """Add an html file to the manifest of a directory.
+
+    Arguments:
+        filename {str} -- Path and name of the html file
+
+    Keyword Arguments:
+        expires {float} -- Time (in seconds since the epoch) after which the file may be removed,
+                           or None if the file is to be kept (default: None)
+        directory {str} -- Directory holding the manifest, if the file is in a sharded subdirectory
+                           of it, or None for the directory containing the file (default: None)
+    """
+    if directory is None:
+        directory, name = os.path.split(filename)
+    else:
+        name = os.path.relpath(filename, directory).replace(os.sep, '/')
+    _append(directory or '.', [_format_entry(name, expires)])
+
+
+def record_files(filenames, expires=None, directory='.'):
+    """Add a number of html files to the manifest of a directory in a single update.
+
+    Arguments:
+        filenames {iterable} -- Path and name of each html file, within the directory or a sharded subdirectory of it
+
+    Keyword Arguments:
+        expires {float} -- Time (in seconds since the epoch) after which the files may be removed,
+                           or None if the files are to be kept (default: None)
+        directory {str} -- Directory holding the manifest (default: '.')
+    """
+    lines = [_format_entry(os.path.relpath(filename, directory).replace(os.sep, '/'), expires) for filename in filenames]
+    if lines:
+        _append(directory, lines)
+
+
+def _scan(directory, depth=0, width=2, prefix=''):
+    """Iterate over the entries in a directory, including those in the sharded subdirectories
+    of the given layout.  Other subdirectories are not entered.
+
+    Arguments:
+        directory {str} -- The directory to scan
+
+    Keyword Arguments:
+        depth {int} -- Number of levels of sharded subdirectories (default: 0)
+        width {int} -- Number of hex digits in each sharded subdirectory name (default: 2)
+        prefix {str} -- Relative path of the directory from the top directory (default: '')
+
+    Yields:
+        {tuple} -- (relative name, os.DirEntry) for each entry
+    """
+    with os.scandir(directory) as dir_entries:
+        for entry in dir_entries:
+            yield prefix + entry.name, entry
+            if depth and len(entry.name) == width and HEX_DIGITS.issuperset(entry.name) and entry.is_dir(follow_symlinks=False):
+                yield from _scan(entry.path, depth - 1, width, prefix + entry.name + '/')
+
+
+def list_files(directory='.'):
+    """List the html files recorded in the manifest of a directory which still exist.
+
+    Keyword Arguments:
+        directory {str} -- The directory holding the manifest (default: '.')
+
+    Returns:
+        {dict} -- Mapping of the relative path and name of each file to its expiry time (None if
+                  the file is to be kept)
+    """
+    with _LockedManifest(directory) as handle:
+        entries = _read_entries(handle)
+    return {name: expires for name, expires in entries.items() if os.path.exists(os.path.join(directory, name))}
+
+
+def _is_openpost_file(path):
+    """Check whether a file looks like an html file written by OpenPost."""
+    try:
+        with open(path, 'rb') as input_file:
+            return SIGNATURE in input_file.read(SIGNATURE_BYTES)
+    except OSError:
+        return False
+
+
+def _remove_expired(directory, entries, now, limit):
+    """Remove the expired files listed in the manifest, dropping their entries (and those of
+    expired files which no longer exist).  A file modified since it expired has been rewritten
+    under the same name by a writer not using the manifest, so it is left alone and its entry
+    is dropped.  Must be called while holding the manifest lock.
+
+    Arguments:
+        directory {str} -- The directory holding the manifest
+        entries {dict} -- The manifest entries, which are updated in place
+        now {float} -- The current time
+        limit {int} -- Maximum number of files to examine, or None for all
+
+    Returns:
+        {int} -- The number of files removed
+    """
+    removed = 0
+    for name in _expired(entries, now, limit):
+        path = os.path.join(directory, name)
+        try:
+            if os.stat(path).st_mtime <= entries[name]:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError:
+            continue
+        del entries[name]
+    return removed
+
+
+def _remove_orphans(directory, entries, now, limit, grace, shard):
+    """Remove the OpenPost html files not listed in the manifest which are older than the grace
+    period.  The directory is scanned without holding the lock, and each file found is checked
+    again under the lock before it is removed.
+
+    Arguments:
+        directory {str} -- The directory to sweep
+        entries {dict} -- The manifest entries read before scanning
+        now {float} -- The current time
+        limit {int} -- Maximum number of directory entries to examine, or None for all
+        grace {float} -- Age in seconds after which an unlisted OpenPost file is removed
+        shard {tuple} -- (depth, width) of the sharded subdirectories to scan
+
+    Returns:
+        {int} -- The number of files removed
+    """
+    found = [(name, entry.path) for name, entry in itertools.islice(_scan(directory, *shard), limit)
+             if name.endswith('.html') and name not in entries and entry.is_file(follow_symlinks=False)]
+    if not found:
+        return 0
+    removed = 0
+    with _LockedManifest(directory) as handle:
+        entries = _read_entries(handle)
+        for name, path in found:
+            try:
+                if name in entries or now - os.stat(path).st_mtime < grace or not _is_openpost_file(path):
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+    return removed
+
+
+def sweep_files(directory='.', limit=None, grace=ORPHAN_GRACE, orphans=False, shard_depth=0, shard_width=2):
+    """Remove the expired html files listed in a directory's manifest (such as files left behind
+    by a process that was killed before its cleanup ran), and compact the manifest to drop their
+    entries.  The manifest is first read under a shared lock, and is only locked exclusively (and
+    rewritten) when it lists expired files, so sweeps of a directory with nothing to remove do not
+    hold each other up.  Files are only removed while holding the exclusive lock, so a file being
+    rewritten under the same name by another process is left alone.  Kept files and files not
+    listed in the manifest are left alone, unless orphans is set.
+
+    Keyword Arguments:
+        directory {str} -- The directory to sweep (default: '.')
+        limit {int} -- Maximum number of listed files, and of directory entries, to examine, or None
+                       for all (default: None)
+        grace {float} -- Age in seconds after which an orphaned file is removed (default: 60)
+        orphans {bool} -- Also remove OpenPost html files not listed in the manifest that are older than the
+                          grace period, including those in the sharded subdirectories (default: False)
+        shard_depth {int} -- Number of levels of sharded subdirectories searched for orphans (default: 0)
+        shard_width {int} -- Number of hex digits in each sharded subdirectory name (default: 2)
+
+    Returns:
+        {int} -- The number of files removed
+    """
+    now = time.time()
+    removed = 0
+    with _LockedManifest(directory, shared=True) as handle:
+        handle.seek(0)
+        text = handle.read()
+    if _may_have_expired(text, now):
+        with _LockedManifest(directory) as handle:
+            entries = _read_entries(handle)
+            count = len(entries)
+            removed = _remove_expired(directory, entries, now, limit)
+            if len(entries) < count:
+                _rewrite(handle, entries)
+    else:
+        entries = _parse_entries(text.split('\n')) if orphans else {}
+    if orphans:
+        removed += _remove_orphans(directory, entries, now, limit, grace, (shard_depth, shard_width))
+    return removed
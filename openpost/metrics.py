@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""A lightweight, thread-safe registry of counters, gauges and fixed-bucket histograms.
+
+Recording a value only takes a lock and a few arithmetic operations, so the metrics can be
+left enabled without slowing down sending.  The registry can be exported as a dictionary or
+as JSON at any time.
+"""
+
+import bisect
+import json
+import threading
+
+#   Upper bounds (in seconds) of the buckets used for timing histograms.
+TIME_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+
+class Counter():
+    """A count which only goes up, such as the number of pages written."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        """Add to the count.
+
+        Keyword Arguments:
+            amount {int} -- Amount to add (default: 1)
+        """
+        with self._lock:
+            self.value += amount
+
+    def export(self):
+        """{int} -- The current value"""
+        return self.value
+
+
+class Gauge(Counter):
+    """A value which can go up and down, such as the number of files waiting to be removed."""
+
+    def dec(self, amount=1):
+        """Subtract from the value.
+
+        Keyword Arguments:
+            amount {int} -- Amount to subtract (default: 1)
+        """
+        self.inc(-amount)
+
+
+class Histogram():
+    """Counts of observed values falling into fixed buckets, along with their total."""
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        """Create an empty histogram.
+
+        Keyword Arguments:
+            buckets {tuple} -- Sorted upper bounds of the buckets (default: TIME_BUCKETS)
+        """
+        self._lock = threading.Lock()
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)     # The last bucket has no upper bound
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        """Add a value to the histogram.
+
+        Arguments:
+            value {float} -- The value observed
+        """
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def export(self):
+        """{dict} -- The count and sum of the values observed, and the count in each bucket by upper bound"""
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.total
+        buckets = {str(bound): number for bound, number in zip(self.bounds, counts)}
+        buckets['+Inf'] = counts[-1]
+        return {'count': count, 'sum': total, 'buckets': buckets}
+
+
+class Registry():
+    """A named set of metrics.  Metrics are created on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self.enabled = True
+
+    def _get(self, name, kind, *args):
+        try:
+            metric = self._metrics[name]
+        except KeyError:
+            with self._lock:
+                metric = self._metrics.setdefault(name, kind(*args))
+        if not isinstance(metric, kind):
+            raise ValueError('Metric {0} is not a {1}'.format(name, kind.__name__))
+        return metric
+
+    def counter(self, name):
+        """Get (or create) a counter.
+
+        Arguments:
+            name {str} -- Name of the counter
+
+        Returns:
+            {Counter} -- The counter
+        """
+        return self._get(name, Counter)
+
+    def gauge(self, name):
+        """Get (or create) a gauge.
+
+        Arguments:
+            name {str} -- Name of the gauge
+
+        Returns:
+            {Gauge} -- The gauge
+        """
+        return self._get(name, Gauge)
+
+    def histogram(self, name, buckets=TIME_BUCKETS):
+        """Get (or create) a histogram.
+
+        Arguments:
+            name {str} -- Name of the histogram
+
+        Keyword Arguments:
+            buckets {tuple} -- Sorted upper bounds of the buckets, used if the histogram is created (default: TIME_BUCKETS)
+
+        Returns:
+            {Histogram} -- The histogram
+        """
+        return self._get(name, Histogram, buckets)
+
+    def inc(self, name, amount=1):
+        """Add to a counter, if metrics are enabled."""
+        if self.enabled:
+            self.counter(name).inc(amount)
+
+    def add(self, name, amount):
+        """Add to (or, with a negative amount, subtract from) a gauge, if metrics are enabled."""
+        if self.enabled:
+            self.gauge(name).inc(amount)
+
+    def observe(self, name, value):
+        """Add a value to a histogram, if metrics are enabled."""
+        if self.enabled:
+            self.histogram(name).observe(value)
+
+    def as_dict(self):
+        """Export the current values of the metrics.
+
+        Returns:
+            {dict} -- Mapping of 'counters', 'gauges' and 'histograms' to the values of each metric by name
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        result = {'counters': {}, 'gauges': {}, 'histograms': {}}
+        for name, metric in metrics:
+            if isinstance(metric, Histogram):
+                group = 'histograms'
+            else:
+                group = 'gauges' if isinstance(metric, Gauge) else 'counters'
+            result[group][name] = metric.export()
+        return result
+
+    def as_json(self, indent=None):
+        """Export the current values of the metrics as JSON.
+
+        Keyword Arguments:
+            indent {int} -- Indentation passed to json.dumps (default: None)
+
+        Returns:
+            {str} -- The metrics, as exported by as_dict()
+        """
+        return json.dumps(self.as_dict(), indent=indent, sort_keys=True)
+
+    def reset(self):
+        """Remove all of the metrics."""
+        with self._lock:
+            self._metrics = {}
+
+
+REGISTRY = Registry()
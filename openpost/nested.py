@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Flattens nested and multi-valued form data into the (key, value) fields of a form.
+
+A value which is a mapping becomes one field for each of its entries, keyed by the path to the
+entry in the bracket form read by most web frameworks ('user[address][city]').  A value which
+is a list or tuple becomes a multi-valued field, repeating the key for each item ('tag=a&tag=b'),
+except that items which are themselves mappings or lists are keyed by their index
+('items[0][name]').  Entries with a value of None are left out.
+
+The flattener walks the data with an explicit stack rather than recursion, so documents of any
+depth can be flattened, and yields each field as it is reached, so the fields stream straight
+into the renderer without a flattened copy of the document being made.  The key path of each
+mapping or list is made once and shared by all of its entries.
+"""
+
+from collections.abc import Mapping
+
+NESTED_TYPES = (Mapping, list, tuple)
+
+
+def form_value(value):
+    """Convert a form value for storing in the form data, keeping nested and multi-valued values
+    as they are and converting any other value to a string.
+
+    Arguments:
+        value {object} -- The form value
+
+    Returns:
+        {object} -- The value to store
+    """
+    return value if isinstance(value, NESTED_TYPES) else str(value)
+
+
+def _entries(path, value):
+    """Iterate over the (key path, value) entries of a mapping, list or tuple."""
+    if isinstance(value, Mapping):
+        return (('{0}[{1}]'.format(path, name), child) for name, child in value.items())
+    return (('{0}[{1}]'.format(path, index) if isinstance(child, NESTED_TYPES) else path, child) for index, child in enumerate(value))
+
+
+def flatten(key, value):
+    """Flatten a single form value into its fields.
+
+    Arguments:
+        key {str} -- Key used in the form
+        value {object} -- The value for the key, which may be nested or multi-valued
+
+    Yields:
+        {tuple} -- (key path, value) for each field
+    """
+    if not isinstance(value, NESTED_TYPES):
+        if value is not None:
+            yield key, value
+        return
+    stack = [_entries(str(key), value)]
+    while stack:
+        for path, child in stack[-1]:
+            if isinstance(child, NESTED_TYPES):
+                stack.append(_entries(path, child))
+                break
+            if child is not None:
+                yield path, child
+        else:
+            stack.pop()
+
+
+def flatten_items(pairs):
+    """Flatten form data into its fields.  Single values are passed through unchanged.
+
+    Arguments:
+        pairs {iterable} -- The (key, value) pairs of the form data
+
+    Yields:
+        {tuple} -- (key path, value) for each field
+    """
+    for key, value in pairs:
+        if value.__class__ is not str and isinstance(value, NESTED_TYPES):
+            yield from flatten(key, value)
+        else:
+            yield key, value
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Copy-on-write form data: per-variant changes layered over a shared, immutable base."""
+
+from collections import ChainMap
+from collections.abc import Mapping
+
+
+class FrozenForm(Mapping):
+    """An immutable snapshot of form data, which caches the rendered html for each field so that
+    it can be reused by every variant derived from it.
+    """
+
+    def __init__(self, form_data):
+        """Take a snapshot of form data.
+
+        Arguments:
+            form_data {dict} -- The key:value data to include in the POST request
+        """
+        self._data = dict(form_data)
+        self._lines = {}
+        self._encoded = {}
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def line(self, key, render, encode=False):
+        """Get the rendered html for a field, rendering it on first use.
+
+        Arguments:
+            key {str} -- Key of the field
+            render {callable} -- Function taking (key, value) and returning the html for the field
+
+        Keyword Arguments:
+            encode {bool} -- Get the html encoded as UTF-8, which is also cached (default: False)
+
+        Returns:
+            {str|bytes} -- The html for the field
+        """
+        if encode:
+            try:
+                return self._encoded[key]
+            except KeyError:
+                data = self._encoded[key] = self.line(key, render).encode('utf-8')
+                return data
+        try:
+            return self._lines[key]
+        except KeyError:
+            text = self._lines[key] = render(key, self._data[key])
+            return text
+
+    def lines(self, render, encode=False):
+        """Render the html for each field, reusing the cached html where available.
+
+        Arguments:
+            render {callable} -- Function taking (key, value) and returning the html for a field
+
+        Keyword Arguments:
+            encode {bool} -- Get the html encoded as UTF-8 (default: False)
+
+        Returns:
+            {list} -- The html for each field
+        """
+        return [self.line(key, render, encode) for key in self._data]
+
+
+class FormOverlay(ChainMap):
+    """Form data made from a small dictionary of changes layered over a shared FrozenForm.  Keys
+    removed from the variant are tracked separately, so the base is never modified.  Iteration
+    follows the order of the base, followed by any keys added in the variant.
+    """
+
+    def __init__(self, changes, base, removed=()):
+        """Layer changes over a base.
+
+        Arguments:
+            changes {dict} -- The keys added or changed in this variant
+            base {FrozenForm} -- The shared base form data
+
+        Keyword Arguments:
+            removed {iterable} -- Keys of the base which are not included in this variant (default: ())
+        """
+        super().__init__(changes, base)
+        self.removed = set(removed)     # Copied in one step, so a copy is consistent while the original is changed
+        self.removed.difference_update([key for key in self.removed if key not in base or key in changes])
+
+    @property
+    def changes(self):
+        """{dict} -- The keys added or changed in this variant"""
+        return self.maps[0]
+
+    @property
+    def base(self):
+        """{FrozenForm} -- The shared base form data"""
+        return self.maps[1]
+
+    def __getitem__(self, key):
+        if key in self.removed:
+            raise KeyError(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        return key in self.changes or (key in self.base and key not in self.removed)
+
+    def __iter__(self):
+        for key in self.base:
+            if key in self.changes or key not in self.removed:
+                yield key
+        for key in self.changes:
+            if key not in self.base:
+                yield key
+
+    def __len__(self):
+        return len(self.base) - len(self.removed) + sum(1 for key in self.changes if key not in self.base)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __setitem__(self, key, value):
+        self.removed.discard(key)
+        self.changes[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.changes.pop(key, None)
+        if key in self.base:
+            self.removed.add(key)
+
+    def pop(self, key, *args):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if args:
+            return args[0]
+        raise KeyError(key)
+
+    def popitem(self):
+        for key in self:
+            return key, self.pop(key)
+        raise KeyError('popitem(): form data is empty')
+
+    def clear(self):
+        self.changes.clear()
+        self.removed = set(self.base)
+
+    def copy(self):
+        return FormOverlay(dict(self.changes), self.base, self.removed)
+
+    __copy__ = copy
+
+    def derive(self, overrides):
+        """Make a new overlay with further changes over the same base.
+
+        Arguments:
+            overrides {dict} -- Keys to add or change, with a value of None to remove a key
+
+        Returns:
+            {FormOverlay} -- The new overlay
+        """
+        overlay = self.copy()
+        for key, value in overrides.items():
+            if value is None:
+                overlay.pop(key, None)
+            else:
+                overlay[key] = value
+        return overlay
+
+    def lines(self, render, encode=False):
+        """Render the html for each field, reusing the cached html from the base for the fields
+        which have not been changed.
+
+        Arguments:
+            render {callable} -- Function taking (key, value) and returning the html for a field
+
+        Keyword Arguments:
+            encode {bool} -- Get the html encoded as UTF-8 (default: False)
+
+        Returns:
+            {list} -- The html for each field
+        """
+        changes = self.changes
+        base = self.base
+        if encode:
+            return [render(key, changes[key]).encode('utf-8') if key in changes else base.line(key, render, True) for key in self]
+        return [render(key, changes[key]) if key in changes else base.line(key, render) for key in self]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+
+"""Lazy iteration over the cartesian product of form field values.
+
+Combinations are numbered in the same order as itertools.product, and any range of them can be
+generated directly from its starting index, so a sweep can be split into chunks (for example,
+to hand to a worker pool) without generating or storing the combinations before each chunk.
+"""
+
+
+def _value_lists(values):
+    """Validate the values to sweep.
+
+    Arguments:
+        values {dict} -- Mapping of key to a list of values for the key
+
+    Raises:
+        ValueError: Values not a dictionary of non-empty lists
+
+    Returns:
+        {tuple} -- (list of keys, list of value lists)
+    """
+    if not isinstance(values, dict):
+        raise ValueError('Values not a dictionary')
+    keys = list(values.keys())
+    lists = [list(values[key]) if not isinstance(values[key], str) else [values[key]] for key in keys]
+    if not all(lists):
+        raise ValueError('Empty list of values')
+    return keys, lists
+
+
+def product_size(values):
+    """Count the combinations of values.
+
+    Arguments:
+        values {dict} -- Mapping of key to a list of values for the key
+
+    Returns:
+        {int} -- Number of combinations
+    """
+    count = 1
+    for items in _value_lists(values)[1]:
+        count *= len(items)
+    return count
+
+
+def iter_product(values, start=0, stop=None):
+    """Generate the combinations of values, one at a time.
+
+    Arguments:
+        values {dict} -- Mapping of key to a list of values for the key
+
+    Keyword Arguments:
+        start {int} -- Index of the first combination to generate (default: 0)
+        stop {int} -- Index after the last combination to generate, or None for all (default: None)
+
+    Yields:
+        {dict} -- Mapping of key to value for each combination
+    """
+    keys, lists = _value_lists(values)
+    total = product_size(values)
+    stop = total if stop is None else min(stop, total)
+    if start >= stop:
+        return
+    #   Decode the starting index into one position per key (the last key varies fastest).
+    positions = [0] * len(lists)
+    remainder = start
+    for place in range(len(lists) - 1, -1, -1):
+        remainder, positions[place] = divmod(remainder, len(lists[place]))
+    current = {key: items[position] for key, items, position in zip(keys, lists, positions)}
+    for _index in range(start, stop):
+        yield dict(current)
+        for place in range(len(lists) - 1, -1, -1):
+            positions[place] += 1
+            if positions[place] < len(lists[place]):
+                current[keys[place]] = lists[place][positions[place]]
+                break
+            positions[place] = 0
+            current[keys[place]] = lists[place][0]
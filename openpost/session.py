@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#################################################################################
+#                                                                               #
+#   OpenPost - Opens a POST request from the command line in a browser window   #
+#   Copyright (C) 2020 Bob Swift                                                #
+#                                                                               #
+#   Permission is hereby granted, free of charge, to any person obtaining a     #
+#   copy of this software and associated documentation files (the "Software"),  #
+#   to deal in the Software without restriction, including without limitation   #
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,    #
+#   and/or sell copies of the Software, and to permit persons to whom the       #
+#   Software is furnished to do so, subject to the following conditions:        #
+#                                                                               #
+#   The above copyright notice and this permission notice shall be included     #
+#   in all copies or substantial portions of the Software.                      #
+#                                                                               #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS     #
+#   OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF                  #
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.      #
+#   IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY        #
+#   CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,        #
+#   TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE           #
+#   SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.                      #
+#                                                                               #
+#################################################################################
+# pylint: disable=R0902
+
+"""Sessions sharing an output directory, a browser controller and a cleanup queue between sends."""
+
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from openpost.launcher import BatchLauncher
+
+
+class Session():
+    """A set of sends sharing resources.  The session owns a temporary output directory (unless
+    one is provided), a batched browser launcher, and a queue of files waiting to be removed.
+    Sends within the session return as soon as the page has been queued for the browser, and
+    the pages queued within a short window are opened with a single browser command.  Files
+    are removed once their time-to-live has passed when a later send is made, and all of the
+    remaining files are removed when the session is closed.
+    """
+
+    def __init__(self, factory, directory=None, browser=None, launch_window=0.05, max_pages=20, **defaults):
+        """Start a session.
+
+        Arguments:
+            factory {callable} -- Function taking keyword arguments and returning a new OpenPost object
+
+        Keyword Arguments:
+            directory {str} -- Output directory for the html files, or None to use a temporary directory
+                               owned by (and removed with) the session (default: None)
+            browser {str} -- Name of the browser to use, as passed to webbrowser.get() (default: None)
+            launch_window {float} -- Seconds to collect pages before opening them together (default: 0.05)
+            max_pages {int} -- Maximum number of pages opened by each browser command (default: 20)
+            defaults -- Keyword arguments used for every OpenPost object made by post()
+        """
+        self._factory = factory
+        self.owned = directory is None
+        self.directory = tempfile.mkdtemp(prefix='openpost-') if self.owned else directory
+        self.launcher = BatchLauncher(browser, launch_window, max_pages)
+        self.defaults = defaults
+        self.closed = False
+        self._names = itertools.count(1)
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = []      # Heap of (deadline, order, release) for files waiting to be removed
+
+    def post(self, **kwargs):
+        """Make an OpenPost object which sends within this session.  Unless a file name is given,
+        the output html file is given a unique name in the session's directory.
+
+        Keyword Arguments:
+            kwargs -- Keyword arguments for the OpenPost object, overriding the session defaults
+
+        Raises:
+            ValueError: Session is closed
+
+        Returns:
+            {OpenPost} -- The new object
+        """
+        if self.closed:
+            raise ValueError('Session is closed')
+        options = dict(self.defaults, **kwargs)
+        if options.get('file_name') is None:
+            options['file_name'] = os.path.join(self.directory, 'OpenPost-{0}.html'.format(next(self._names)))
+        poster = self._factory(**options)
+        poster.active_session = self
+        return poster
+
+    def send(self, **kwargs):
+        """Make an OpenPost object in this session (see post()) and send it.
+
+        Keyword Arguments:
+            kwargs -- Keyword arguments for the OpenPost object, overriding the session defaults
+
+        Returns:
+            {bool} -- True if the file was successfully opened, otherwise false
+        """
+        return self.post(**kwargs).send_post()
+
+    def open(self, filename, new_tab=True):
+        """Queue a file to be opened by the session's browser launcher.
+
+        Arguments:
+            filename {str} -- Path and name of the file
+
+        Keyword Arguments:
+            new_tab {bool} -- Open the file in a new browser tab (default: True)
+
+        Raises:
+            ValueError: Session is closed
+
+        Returns:
+            {bool} -- True if the file was queued
+        """
+        if self.closed:
+            raise ValueError('Session is closed')
+        return self.launcher.open(filename, new_tab)
+
+    def launch(self, filename, new_tab=True, time_to_live=0, release=None):
+        """Queue a file to be opened by the session's browser launcher, and then to be removed
+        once its time-to-live has passed.
+
+        Arguments:
+            filename {str} -- Path and name of the file
+
+        Keyword Arguments:
+            new_tab {bool} -- Open the file in a new browser tab (default: True)
+            time_to_live {float} -- Seconds to keep the file (default: 0)
+            release {callable} -- Function to call (with no arguments) to remove the file, or None
+                                  if the file is to be kept (default: None)
+
+        Returns:
+            {bool} -- True if the file was queued
+        """
+        opened = self.open(filename, new_tab)
+        if release is not None:
+            self.defer_cleanup(time_to_live, release)
+        return opened
+
+    def defer_cleanup(self, time_to_live, release):
+        """Queue a file to be removed once its time-to-live has passed, then remove any queued
+        files whose time-to-live has already passed.
+
+        Arguments:
+            time_to_live {float} -- Seconds to keep the file
+            release {callable} -- Function to call (with no arguments) to remove the file
+        """
+        with self._lock:
+            heapq.heappush(self._pending, (time.monotonic() + time_to_live, next(self._order), release))
+        self.reap()
+
+    def reap(self, force=False):
+        """Remove the queued files whose time-to-live has passed.
+
+        Keyword Arguments:
+            force {bool} -- Remove all of the queued files, whether or not their time-to-live has passed (default: False)
+
+        Returns:
+            {int} -- Number of files removed
+        """
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._pending and (force or self._pending[0][0] <= now):
+                due.append(heapq.heappop(self._pending)[2])
+        for release in due:
+            release()
+        return len(due)
+
+    @property
+    def pending(self):
+        """{int} -- Number of files waiting to be removed"""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self, wait=True):
+        """Close the session, removing all of the queued files (and the session's temporary
+        directory, if it owns one).
+
+        Keyword Arguments:
+            wait {bool} -- First wait until the time-to-live of every queued file has passed (default: True)
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.launcher.close()
+        if wait:
+            with self._lock:
+                deadline = max((entry[0] for entry in self._pending), default=0)
+            time.sleep(max(0, deadline - time.monotonic()))
+        self.reap(force=True)
+        if self.owned:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(wait=exc_type is None)
@@ -62,5 +62,5 @@ if __name__ == "__main__":
         # package_data={},
         # scripts=[],
         # install_requires=[],
-        # extras_require={},
+        extras_require={'pandas': ['pandas']},
     )
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost page archive
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import openpost
+from openpost.archive import Archive
+
+
+class MyTests(unittest.TestCase):
+
+    def test_archive(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            archive = Archive(temp_dir, segment_size=2000, max_size=6000)
+            pages = {'page-{0}.html'.format(count): os.urandom(300).hex() for count in range(40)}
+            self.assertEqual(archive.add_pages(pages.items()), 40)
+            archive.add('page-39.html', 'changed')
+            segments = sorted(name for name in os.listdir(temp_dir) if name.endswith('.gz'))
+            self.assertGreater(len(segments), 1)
+            self.assertNotIn('segment-000001.gz', segments)
+            self.assertLessEqual(archive.size(), 6000 + 2000)
+            names = list(archive.names())
+            self.assertEqual(names[-1], 'page-39.html')
+            self.assertLess(len(names), 40)
+            self.assertEqual(archive.get(names[0]), pages[names[0]].encode('utf-8'))
+            self.assertEqual(archive.get('page-39.html'), b'changed')
+            with self.assertRaises(KeyError):
+                archive.get('page-0.html')
+            self.assertEqual(Archive(temp_dir).get('page-38.html'), pages['page-38.html'].encode('utf-8'))
+
+    def test_send_archived(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            archive = Archive(os.path.join(temp_dir, 'archive'))
+            poster = openpost.OpenPost(url='localhost', file_name=os.path.join(temp_dir, 'page.html'), form_data={'one': '1'},
+                                       keep_file=True, time_to_live=0, archive=archive)
+            with mock.patch('webbrowser.open_new_tab'):
+                self.assertTrue(poster.send_post())
+            self.assertFalse(os.path.exists(poster.output_file))
+            first = poster.archive_name
+            self.assertRegex(first, r'^page-\d{{8}}T\d{{6}}-{0}-\d+\.html$'.format(os.getpid()))
+            self.assertEqual(archive.get(first).decode('utf-8'), poster.make_html())
+            poster.add_key('one', 'changed')
+            with mock.patch('webbrowser.open_new_tab'):
+                self.assertTrue(poster.send_post())
+            self.assertNotEqual(poster.archive_name, first)
+            self.assertEqual(archive.get(poster.archive_name).decode('utf-8'), poster.make_html())
+            self.assertIn(b'>1<', archive.get(first))
+            self.assertEqual(poster.write_batch([{'n': '1'}, {}, {'n': '3'}], workers=0), 2)
+            self.assertEqual(list(archive.names()), [first, poster.archive_name, 'page-0.html', 'page-2.html'])
+            self.assertIn(b"name='n' id='n' form='postform' style='display: none;'>3<", archive.get('page-2.html'))
+            self.assertEqual(sorted(name for name in os.listdir(temp_dir) if name.endswith('.html')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
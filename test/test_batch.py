@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for OpenPost batch rendering in worker processes
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import openpost
+import openpost.batch as test_module
+
+FORMS = [{'id': str(count), 'value': ' x{0} '.format(count) * count} for count in range(25)]
+
+
+class MyTests(unittest.TestCase):
+
+    def test_compact_form(self):
+        self.assertEqual(test_module.compact_form({'one': 1}), (('one', '1', False),))
+        self.assertEqual(test_module.compact_form([('one', 'a'), ('two', 2)]), (('one', 'a', False), ('two', '2', False)))
+
+    def test_render_batch(self):
+        poster = openpost.OpenPost('localhost', headers='<meta name="test">', body='<p>Wait</p>')
+        expected = [openpost.OpenPost('localhost', headers='<meta name="test">', body='<p>Wait</p>', form_data=form).make_html().encode('utf-8')
+                    for form in FORMS]
+        self.assertEqual(list(poster.render_batch(FORMS, workers=0, chunk_size=4)), expected)
+        self.assertEqual(list(poster.render_batch(iter(FORMS), workers=2, chunk_size=4)), expected)
+        self.assertEqual(list(poster.render_batch([{}], workers=0)), [b''])
+
+    def test_inline_batch(self):
+        poster = openpost.OpenPost('localhost')
+        expected = list(poster.render_batch(FORMS, workers=0, chunk_size=4))
+        with mock.patch('concurrent.futures.ProcessPoolExecutor', side_effect=AssertionError) as executor:
+            self.assertEqual(list(poster.render_batch(FORMS, workers=1, chunk_size=4)), expected)
+            self.assertEqual(list(poster.render_batch(FORMS, workers=4, chunk_size=10)), expected)
+        executor.assert_not_called()
+
+    def test_write_batch(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'page'), shard_depth=1, shard_width=1)
+            forms = FORMS[:5] + [{}] + FORMS[5:10]
+            self.assertEqual(poster.write_batch(forms, workers=2, chunk_size=3), 10)
+            listed = openpost.list_files(temp_dir)
+            self.assertEqual(len(listed), 10)
+            self.assertTrue(all(expires is None for expires in listed.values()))
+            name = openpost.shard_path('page-7.html', 1, 1) + '/page-7.html'
+            with open(os.path.join(temp_dir, name), 'r', encoding='utf-8') as input_file:
+                self.assertEqual(input_file.read(), openpost.OpenPost('localhost', form_data=forms[7]).make_html())
+            self.assertNotIn(openpost.shard_path('page-5.html', 1, 1) + '/page-5.html', listed)
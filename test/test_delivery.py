@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost adaptive delivery
+"""
+
+import base64
+import os
+import tempfile
+import time
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+import openpost
+from openpost import delivery
+from openpost.metrics import REGISTRY
+
+OPENER = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def make_poster(directory, form_data, **kwargs):
+    return openpost.OpenPost('localhost', os.path.join(directory, 'page'), form_data=form_data, manifest=False, time_to_live=0, **kwargs)
+
+
+def fetch(url):
+    with OPENER.open(url, timeout=5) as response:
+        return response.read().decode('utf-8')
+
+
+class MyTests(unittest.TestCase):
+
+    def test_choose_delivery(self):
+        limits = openpost.DeliveryLimits(tmpfs=1000)
+        self.assertEqual(delivery.choose_delivery(1001, limits), 'server')
+        self.assertEqual(delivery.choose_delivery(None, limits), 'server')
+        with mock.patch('openpost.delivery.tmpfs_directory', return_value=None):
+            self.assertEqual(delivery.choose_delivery(0, limits), 'file')
+        with mock.patch('openpost.delivery.tmpfs_directory', return_value='/dev/shm'):
+            self.assertEqual(delivery.choose_delivery(0, limits), 'tmpfs')
+            self.assertEqual(delivery.choose_delivery(1000, limits), 'tmpfs')
+        poster = openpost.OpenPost('localhost', form_data={'one': '1', 'two': 'x' * 500})
+        estimate = delivery.estimate_size(poster._page_frame(), poster.form_data.items(), poster.FIELD_TEMPLATE)
+        self.assertEqual(estimate, len(poster.make_html()))
+
+    def test_data_url(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = make_poster(temp_dir, {'one': '1', 'two': 'two words'}, delivery='data')
+            before = REGISTRY.counter('deliveries_data').value
+            with mock.patch('webbrowser.open_new_tab', return_value=True) as browser:
+                self.assertTrue(poster.send_post())
+            url = browser.call_args[0][0]
+            self.assertTrue(url.startswith(delivery.DATA_URL_PREFIX))
+            self.assertEqual(base64.b64decode(url[len(delivery.DATA_URL_PREFIX):]).decode('utf-8'), poster.make_html())
+            self.assertEqual(REGISTRY.counter('deliveries_data').value, before + 1)
+            self.assertEqual(os.listdir(temp_dir), [])
+            poster.keep_file = True
+            with mock.patch('webbrowser.open_new_tab', return_value=True) as browser:
+                self.assertTrue(poster.send_post())
+            self.assertEqual(browser.call_args[0][0], os.path.join(temp_dir, 'page.html'))
+            poster.delivery = 'other'
+            with self.assertRaises(ValueError):
+                poster.send_post()
+
+    def test_tmpfs(self):
+        if delivery.tmpfs_directory() is None:
+            self.skipTest('No tmpfs directory')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = make_poster(temp_dir, {'one': 'x' * 200}, delivery='auto')
+            poster.file_name = 'page.html'
+
+            def read_page(filename):
+                directory = os.path.dirname(filename)
+                self.assertEqual(os.path.dirname(directory), delivery.TMPFS_DIRECTORY)
+                self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+                self.assertEqual(os.stat(directory).st_uid, os.getuid())
+                with open(filename, 'r', encoding='utf-8') as input_file:
+                    self.assertEqual(input_file.read(), poster.make_html())
+                return True
+
+            with mock.patch('webbrowser.open_new_tab', side_effect=read_page):
+                self.assertTrue(poster.send_post())
+            self.assertFalse(os.path.exists(poster.output_file))
+            self.assertEqual(delivery.tmpfs_directory(), os.path.dirname(poster.output_file))
+
+    def test_server(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = make_poster(temp_dir, {'one': '1', 'two': 'x' * 200}, delivery='auto',
+                                 delivery_limits=openpost.DeliveryLimits(tmpfs=0))
+            pages = []
+
+            def read_page(url):
+                self.assertTrue(url.startswith('http://127.0.0.1:'))
+                pages.append(fetch(url))
+                pages.append(fetch(url))
+                with self.assertRaises(urllib.error.HTTPError):
+                    fetch(url + 'x')
+                return True
+
+            with mock.patch('webbrowser.open_new_tab', side_effect=read_page):
+                self.assertTrue(poster.send_post())
+            self.assertEqual(pages, [poster.make_html()] * 2)
+            with self.assertRaises(urllib.error.URLError):
+                fetch(poster.output_file)
+            self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_server_stream(self):
+        expected = openpost.OpenPost('localhost', form_data={'one': '1', 'two': '2'}).make_html()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = make_poster(temp_dir, iter([('one', '1'), ('two', '2')]), delivery='auto', cleanup='access')
+            poster.time_to_live = 30
+            pages = []
+
+            def read_page(url):
+                pages.append(fetch(url))
+                with self.assertRaises(urllib.error.HTTPError) as context:
+                    fetch(url)
+                self.assertEqual(context.exception.code, 410)
+                return True
+
+            start = time.monotonic()
+            with mock.patch('webbrowser.open_new_tab', side_effect=read_page):
+                self.assertTrue(poster.send_post())
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertEqual(pages, [expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
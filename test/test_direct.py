@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for OpenPost direct submission
+"""
+
+import http.server
+import threading
+import time
+import unittest
+import urllib.parse
+from unittest import mock
+
+import openpost
+from openpost.direct import RETRY_STATUSES, ConnectionPool, encode_form
+
+
+class RecordingHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):      # pylint: disable=invalid-name
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            server.connections.add(self.client_address)
+            status = server.statuses.pop(0) if server.statuses else 200
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        server.requests.append((self.path, self.headers['Content-Type'], urllib.parse.parse_qsl(body.decode('ascii'))))
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+        #   Drop the connection without telling the client, as a server closing an idle connection would.
+        self.close_connection = server.drop
+
+    def log_message(self, *args):     # pylint: disable=arguments-differ
+        pass
+
+
+class MyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.connections = set()
+        self.server.statuses = []
+        self.server.active = self.server.peak = 0
+        self.server.delay = 0
+        self.server.drop = False
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{0}/submit?x=1'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_encode_form(self):
+        self.assertEqual(encode_form([('a', '1 2'), ('b&c', 'é')]), b'a=1+2&b%26c=%C3%A9')
+
+    def test_submit(self):
+        with ConnectionPool() as pool:
+            poster = openpost.OpenPost(url=self.url, form_data={'one': ' 1 ', 'two': 'a&b'})
+            for _count in range(3):
+                response = poster.submit(pool=pool)
+                self.assertEqual((response.status, response.body, response.attempts), (200, b'ok', 1))
+                self.assertGreater(response.elapsed, 0)
+        self.assertEqual(self.server.requests[0], ('/submit?x=1', 'application/x-www-form-urlencoded', [('one', '1'), ('two', 'a&b')]))
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertIsNone(openpost.OpenPost(url=self.url).submit(pool=pool))
+        with self.assertRaises(ValueError):
+            ConnectionPool().post_form('ftp://localhost/', [('a', '1')])
+
+    def test_retry(self):
+        self.server.statuses = [503]
+        with ConnectionPool(backoff=0) as pool:
+            response = pool.post_form(self.url, [('a', '1')])
+            self.assertEqual((response.status, response.attempts), (503, 1))
+        self.server.statuses = [503, 503, 503]
+        with ConnectionPool(retries=1, backoff=0, retry_statuses=RETRY_STATUSES) as pool:
+            response = pool.post_form(self.url, [('a', '1')])
+            self.assertEqual((response.status, response.attempts), (503, 2))
+            response = pool.post_form(self.url, [('a', '1')])
+            self.assertEqual((response.status, response.attempts), (200, 2))
+
+    def test_retry_stale(self):
+        self.server.drop = True
+        with ConnectionPool(backoff=0) as pool:
+            self.assertEqual(pool.post_form(self.url, [('a', '1')]).attempts, 1)
+            time.sleep(0.1)
+            response = pool.post_form(self.url, [('a', '2')])
+            self.assertEqual((response.status, response.attempts), (200, 2))
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_retry_reset(self):
+        reset = mock.Mock()
+        reset.request.side_effect = ConnectionResetError('reset by peer')
+        with ConnectionPool(backoff=0) as pool:
+            connect = pool._connection     # pylint: disable=protected-access
+            with mock.patch.object(pool, '_connection', side_effect=lambda key: (reset, True) if not reset.close.called else connect(key)):
+                response = pool.post_form(self.url, [('a', '1')])
+            self.assertEqual((response.status, response.attempts), (200, 2))
+            reset.close.reset_mock()
+            with mock.patch.object(pool, '_connection', return_value=(reset, False)):
+                with self.assertRaises(ConnectionResetError):
+                    pool.post_form(self.url, [('a', '2')])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_no_retry_timeout(self):
+        self.server.delay = 0.5
+        with ConnectionPool(timeout=0.1, backoff=0) as pool:
+            with self.assertRaises(OSError):
+                pool.post_form(self.url, [('a', '1')])
+        time.sleep(0.6)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_concurrency_limit(self):
+        self.server.delay = 0.1
+        with ConnectionPool(max_connections=2) as pool:
+            threads = [threading.Thread(target=pool.post_form, args=(self.url, [('n', str(count))])) for count in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertEqual(self.server.peak, 2)
+        self.assertLessEqual(len(self.server.connections), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
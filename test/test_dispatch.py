@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost dispatcher
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+import webbrowser
+from unittest import mock
+
+import openpost
+
+
+class FakeBrowser():
+    """Stand-in for a browser controller, recording launch times and the most launches in progress."""
+
+    def __init__(self, delay=0, gate=None):
+        self.delay = delay
+        self.gate = gate
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.launches = []
+
+    def open(self, url, new=0):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.launches.append((time.monotonic(), url, new))
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return True
+
+
+def make_poster(directory, number, **kwargs):
+    return openpost.OpenPost(url='localhost', form_data={'number': str(number)}, manifest=False,
+                             file_name=os.path.join(directory, 'page-{0}.html'.format(number)), **kwargs)
+
+
+class MyTests(unittest.TestCase):
+
+    def test_limits(self):
+        browser = FakeBrowser(delay=0.05)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch('webbrowser.get', return_value=browser):
+                with openpost.Dispatcher(max_concurrent=2, rate=40) as dispatcher:
+                    threads = [threading.Thread(target=dispatcher.send, args=(make_poster(temp_dir, number, time_to_live=0),))
+                               for number in range(10)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                    dispatcher.join()
+            self.assertEqual(len(browser.launches), 10)
+            self.assertLessEqual(browser.peak, 2)
+            times = sorted(launch[0] for launch in browser.launches)
+            self.assertGreaterEqual(times[-1] - times[0], 9 / 40 - 0.01)
+            self.assertTrue(all(launch[2] == 2 for launch in browser.launches))
+            self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_backpressure(self):
+        gate = threading.Event()
+        browser = FakeBrowser(gate=gate)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch('webbrowser.get', return_value=browser):
+                with openpost.Dispatcher(max_concurrent=1, rate=0, queue_size=1) as dispatcher:
+                    self.assertTrue(dispatcher.send(make_poster(temp_dir, 1, time_to_live=0.3)))
+                    while not browser.launches:
+                        time.sleep(0.01)
+                    self.assertTrue(dispatcher.send(make_poster(temp_dir, 2, time_to_live=0.3)))
+                    self.assertEqual(dispatcher.queued, 1)
+                    blocked = threading.Thread(target=dispatcher.send, args=(make_poster(temp_dir, 3, time_to_live=0.3),))
+                    blocked.start()
+                    blocked.join(0.2)
+                    self.assertTrue(blocked.is_alive())
+                    #   Time-to-live starts at launch, so the queued pages outlive it while waiting.
+                    time.sleep(0.3)
+                    self.assertEqual(len(os.listdir(temp_dir)), 3)
+                    self.assertEqual(dispatcher.pending, 0)
+                    gate.set()
+                    blocked.join()
+                    dispatcher.join()
+                    self.assertEqual(len(browser.launches), 3)
+                    self.assertEqual(len(os.listdir(temp_dir)), 3)
+                    time.sleep(0.5)
+                    self.assertEqual(os.listdir(temp_dir), [])
+        with self.assertRaises(ValueError):
+            dispatcher.send(make_poster(temp_dir, 4))
+
+    def test_timeout(self):
+        gate = threading.Event()
+        browser = FakeBrowser(gate=gate)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch('webbrowser.get', return_value=browser):
+                with openpost.Dispatcher(max_concurrent=1, rate=0, queue_size=1, timeout=0.1) as dispatcher:
+                    first = make_poster(temp_dir, 1, keep_file=True)
+                    self.assertTrue(first.send_post(dispatcher=dispatcher))
+                    while not browser.launches:
+                        time.sleep(0.01)
+                    self.assertTrue(dispatcher.send(make_poster(temp_dir, 2)))
+                    dropped = make_poster(temp_dir, 3)
+                    self.assertFalse(dispatcher.send(dropped))
+                    self.assertFalse(os.path.exists(dropped.output_file))
+                    gate.set()
+                    dispatcher.close(wait=False)
+                self.assertEqual(os.listdir(temp_dir), ['page-1.html'])
+
+    def test_send_async(self):
+        browser = FakeBrowser()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch('webbrowser.get', return_value=browser):
+                with openpost.Dispatcher(rate=0) as dispatcher:
+
+                    async def send_all():
+                        return await asyncio.gather(*[dispatcher.send_async(make_poster(temp_dir, number, time_to_live=0))
+                                                      for number in range(3)])
+
+                    loop = asyncio.new_event_loop()
+                    try:
+                        self.assertEqual(loop.run_until_complete(send_all()), [True] * 3)
+                    finally:
+                        loop.close()
+            self.assertEqual(len(browser.launches), 3)
+            self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_launch_error(self):
+        browser = FakeBrowser()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch('webbrowser.get', return_value=browser):
+                with mock.patch.object(browser, 'open', side_effect=OSError('no browser')):
+                    with self.assertLogs('openpost.dispatch', 'ERROR'):
+                        with openpost.Dispatcher(rate=0, max_concurrent=1) as dispatcher:
+                            self.assertTrue(dispatcher.send(make_poster(temp_dir, 1, time_to_live=0)))
+                            dispatcher.join()
+                with openpost.Dispatcher(rate=0, max_concurrent=1) as dispatcher:
+                    self.assertTrue(dispatcher.send(make_poster(temp_dir, 2, time_to_live=0)))
+            self.assertEqual(len(browser.launches), 1)
+            self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_release_error(self):
+        browser = FakeBrowser()
+        removed = []
+
+        def fail():
+            raise OSError('busy')
+
+        with mock.patch('webbrowser.get', return_value=browser):
+            with self.assertLogs('openpost.dispatch', 'ERROR'):
+                with openpost.Dispatcher(rate=0) as dispatcher:
+                    dispatcher.launch('page-1.html', release=fail)
+                    dispatcher.launch('page-2.html', release=lambda: removed.append('page-2.html'))
+        self.assertEqual(removed, ['page-2.html'])
+        self.assertEqual(dispatcher.pending, 0)
+
+    def test_no_browser(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch('webbrowser.get', side_effect=webbrowser.Error('could not locate runnable browser')):
+                with self.assertLogs('openpost.dispatch', 'ERROR'):
+                    with openpost.Dispatcher(rate=0) as dispatcher:
+                        self.assertTrue(dispatcher.send(make_poster(temp_dir, 1, time_to_live=0)))
+            self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_launch_after_close(self):
+        removed = []
+        with mock.patch('webbrowser.get', return_value=FakeBrowser()):
+            dispatcher = openpost.Dispatcher(rate=0)
+            dispatcher.close()
+            with self.assertRaises(ValueError):
+                dispatcher.launch('page-1.html', release=lambda: removed.append('page-1.html'))
+        self.assertEqual(removed, ['page-1.html'])
+
+    def test_close_while_launching(self):
+        browser = FakeBrowser()
+        removed = []
+        queued = []
+
+        def send(number):
+            name = 'page-{0}.html'.format(number)
+            try:
+                queued.append(dispatcher.launch(name, release=lambda: removed.append(name)))
+            except ValueError:
+                pass
+
+        with mock.patch('webbrowser.get', return_value=browser):
+            dispatcher = openpost.Dispatcher(rate=0, queue_size=2)
+            threads = [threading.Thread(target=send, args=(number,)) for number in range(50)]
+            for thread in threads:
+                thread.start()
+            dispatcher.close(wait=False)
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(removed), 50)
+        self.assertEqual(len(browser.launches), len(queued))
+        self.assertEqual(dispatcher.pending, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for OpenPost pre-encoded rendering
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import openpost
+from openpost import encoded
+
+
+class MyTests(unittest.TestCase):
+
+    def test_make_html_bytes(self):
+        poster = openpost.OpenPost('localhost', headers=['<meta a>'], body='<p>é</p>', form_data={'one': ' 1 ', 'two': 'ü'})
+        self.assertEqual(poster.make_html_bytes(), poster.make_html().encode('utf-8'))
+        poster.url = 'otherhost'
+        self.assertEqual(poster.make_html_bytes(), poster.make_html().encode('utf-8'))
+        variant = poster.derive(two=None, three='3')
+        self.assertEqual(variant.make_html_bytes(), variant.make_html().encode('utf-8'))
+        with poster.overrides(one='x'):
+            self.assertEqual(poster.make_html_bytes(), poster.make_html().encode('utf-8'))
+        self.assertEqual(openpost.OpenPost('localhost').make_html_bytes(), b'')
+
+    def test_write_html(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'page'), form_data={'key{0}'.format(count): count for count in range(50)})
+            with mock.patch.object(encoded, 'IOV_MAX', 7):
+                self.assertTrue(poster.write_html())
+            with open(poster.output_file, 'r', encoding='utf-8') as input_file:
+                self.assertEqual(input_file.read(), poster.make_html())
+
+    def test_field_cache(self):
+        template = '<{0}>{1}</{0}>'
+        with mock.patch.object(encoded, 'FIELD_CACHE_LIMIT', 2), mock.patch.object(encoded, '_FIELDS', encoded.collections.OrderedDict()):
+            for key in ('a', 'b', 'a', 'c'):
+                self.assertEqual(encoded.field_segments(template, key), ('<{0}>'.format(key).encode('utf-8'), '</{0}>'.format(key).encode('utf-8')))
+            self.assertEqual(list(encoded._FIELDS), [(template, 'a'), (template, 'c')])
+
+    def test_write_segments_partial(self):
+        segments = [b'abc', b'', b'defg', b'h']
+        written = []
+
+        def short_writev(fd, batch):
+            data = b''.join(bytes(segment) for segment in batch)[:2]
+            written.append(data)
+            return os.write(fd, data)
+
+        with tempfile.TemporaryFile() as output_file:
+            with mock.patch('os.writev', side_effect=short_writev):
+                self.assertEqual(encoded.write_segments(output_file.fileno(), segments), 8)
+            output_file.seek(0)
+            self.assertEqual(output_file.read(), b'abcdefgh')
+        self.assertEqual(written, [b'ab', b'cd', b'ef', b'gh'])
+
+
+if __name__ == '__main__':
+    unittest.main()
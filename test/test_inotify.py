@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost inotify file watcher
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import openpost.inotify as test_module
+
+
+@unittest.skipUnless(test_module.available(), 'inotify not available')
+class MyTests(unittest.TestCase):
+
+    def test_read_detected(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'one.html')
+            with open(path, 'w', encoding='utf-8') as output_file:
+                output_file.write('one')
+            with test_module.Watch(path) as watch:
+                timer = threading.Timer(0.1, lambda: open(path, 'r', encoding='utf-8').close())
+                timer.start()
+                self.assertTrue(watch.wait_for(test_module.IN_CLOSE_NOWRITE, 5))
+                timer.join()
+
+    def test_timeout(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'one.html')
+            with open(path, 'w', encoding='utf-8') as output_file:
+                output_file.write('one')
+            with test_module.Watch(path) as watch:
+                start = time.monotonic()
+                self.assertFalse(watch.wait_for(test_module.IN_CLOSE_NOWRITE, 0.2))
+                self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_deleted(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'one.html')
+            with open(path, 'w', encoding='utf-8') as output_file:
+                output_file.write('one')
+            with test_module.Watch(path) as watch:
+                os.remove(path)
+                self.assertFalse(watch.wait_for(test_module.IN_CLOSE_NOWRITE, 5))
+
+    def test_missing_file(self):
+        with self.assertRaises(OSError):
+            test_module.Watch('/no/such/file.html')
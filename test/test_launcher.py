@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost batched browser launcher
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+import webbrowser
+
+from openpost.launcher import BatchLauncher, batch_command
+from openpost.metrics import REGISTRY
+
+#   Stand-in for a browser: records the pages it is given (leaving out options), one line per launch.
+FAKE_BROWSER = """\
+#!{0}
+import sys
+with open({1!r}, 'a', encoding='utf-8') as log_file:
+    log_file.write(' '.join(arg for arg in sys.argv[1:] if not arg.startswith('-')) + '\\n')
+sys.exit({2})
+"""
+
+
+def make_launcher(directory, status=0, **kwargs):
+    """Make a launcher using a fake Firefox, which accepts several pages at once."""
+    path = os.path.join(directory, 'fake_browser.py')
+    log = os.path.join(directory, 'browser.log')
+    with open(path, 'w', encoding='utf-8') as output_file:
+        output_file.write(FAKE_BROWSER.format(sys.executable, log, status))
+    os.chmod(path, 0o755)
+    launcher = BatchLauncher(**kwargs)
+    launcher.controller = webbrowser.Mozilla(path)
+    return launcher, log
+
+
+def read_log(log):
+    with open(log, 'r', encoding='utf-8') as input_file:
+        return input_file.read().splitlines()
+
+
+class MyTests(unittest.TestCase):
+
+    def test_batch_command(self):
+        self.assertEqual(batch_command(webbrowser.Mozilla('firefox'), ['a.html', 'b.html']),
+                         ['firefox', '-new-tab', 'a.html', '-new-tab', 'b.html'])
+        self.assertEqual(batch_command(webbrowser.Chrome('chrome'), ['a.html', 'b.html']), ['chrome', 'a.html', 'b.html'])
+        self.assertIsNone(batch_command(webbrowser.GenericBrowser(['xdg-open', '%s']), ['a.html', 'b.html']))
+        self.assertIsNone(batch_command(webbrowser.BackgroundBrowser(['xdg-open', '%s']), ['a.html', 'b.html']))
+        self.assertIsNone(batch_command(webbrowser.BaseBrowser(), ['a.html']))
+
+    def test_launch(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            launcher, log = make_launcher(temp_dir, max_pages=3)
+            REGISTRY.reset()
+            self.assertTrue(launcher.launch(['{0}.html'.format(count) for count in range(5)]))
+            self.assertEqual(read_log(log), ['0.html 1.html 2.html', '3.html 4.html'])
+            self.assertEqual(REGISTRY.as_dict()['counters']['browser_launches'], 2)
+
+    def test_launch_single(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            launcher, log = make_launcher(temp_dir)
+            launcher.controller = webbrowser.GenericBrowser([launcher.controller.name, '%s'])
+            REGISTRY.reset()
+            self.assertTrue(launcher.launch(['0.html', '1.html']))
+            self.assertEqual(read_log(log), ['0.html', '1.html'])
+            self.assertEqual(REGISTRY.as_dict()['counters']['browser_launches'], 2)
+
+    def test_launch_failure(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            launcher, log = make_launcher(temp_dir, status=1)
+            REGISTRY.reset()
+            self.assertFalse(launcher.launch(['0.html', '1.html']))
+            self.assertEqual(read_log(log), ['0.html 1.html'])
+            self.assertEqual(REGISTRY.as_dict()['counters']['launch_failures'], 2)
+
+    def test_open_window(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            launcher, log = make_launcher(temp_dir, window=0.2, max_pages=3)
+            with launcher:
+                for count in range(4):
+                    self.assertTrue(launcher.open('{0}.html'.format(count)))
+                self.assertEqual(read_log(log), ['0.html 1.html 2.html'])
+                time.sleep(1)
+                self.assertEqual(read_log(log), ['0.html 1.html 2.html', '3.html'])
+                launcher.open('4.html')
+            self.assertEqual(read_log(log), ['0.html 1.html 2.html', '3.html', '4.html'])
+
+
+if __name__ == '__main__':
+    unittest.main()
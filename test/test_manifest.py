@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost manifest and sweeper
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import openpost
+import openpost.manifest as test_module
+
+PAGE = '<html>\n  <head>\n  <title>OpenPost Redirector</title>\n  </head>\n</html>\n'
+
+
+def make_file(directory, name, content=PAGE, age=0):
+    path = os.path.join(directory, name)
+    with open(path, 'w', encoding='utf-8') as output_file:
+        output_file.write(content)
+    if age:
+        past = time.time() - age
+        os.utime(path, (past, past))
+    return path
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, test_module.MANIFEST_NAME), 'r', encoding='utf-8') as input_file:
+        return input_file.read()
+
+
+class MyTests(unittest.TestCase):
+
+    def test_record_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            test_module.record_file(os.path.join(temp_dir, 'one.html'), 100.5)
+            test_module.record_file(os.path.join(temp_dir, 'two.html'))
+            self.assertEqual(read_manifest(temp_dir), '100.500\tone.html\n-\ttwo.html\n')
+
+    def test_record_compacts(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            kept = make_file(temp_dir, 'kept.html')
+            test_module.record_file(kept)
+            for count in range(test_module.COMPACT_LINES * 3):
+                test_module.record_file(os.path.join(temp_dir, 'gone-{0}.html'.format(count % 10)), time.time() - 1)
+                test_module.record_file(kept)
+            lines = read_manifest(temp_dir).splitlines()
+            self.assertLessEqual(len(lines), test_module.COMPACT_LINES + 1)
+            self.assertIn('-\tkept.html', lines)
+            self.assertEqual(test_module.list_files(temp_dir), {'kept.html': None})
+
+    def test_sweep_listed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            expired = make_file(temp_dir, 'expired.html', age=3600)
+            pending = make_file(temp_dir, 'pending.html')
+            kept = make_file(temp_dir, 'kept.html', age=3600)
+            test_module.record_file(expired, time.time() - 1)
+            test_module.record_file(pending, time.time() + 60)
+            test_module.record_file(kept)
+            self.assertEqual(test_module.sweep_files(temp_dir), 1)
+            self.assertFalse(os.path.exists(expired))
+            self.assertTrue(os.path.exists(pending))
+            self.assertTrue(os.path.exists(kept))
+            self.assertNotIn('expired.html', read_manifest(temp_dir))
+            self.assertIn('pending.html', read_manifest(temp_dir))
+
+    def test_sweep_rewritten(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rewritten = make_file(temp_dir, 'rewritten.html')
+            test_module.record_file(rewritten, time.time() - 1)
+            self.assertEqual(test_module.sweep_files(temp_dir, orphans=False), 0)
+            self.assertTrue(os.path.exists(rewritten))
+            self.assertEqual(read_manifest(temp_dir), '')
+
+    def test_sweep_unlisted(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            orphan = make_file(temp_dir, 'orphan.html', age=3600)
+            recent = make_file(temp_dir, 'recent.html')
+            other = make_file(temp_dir, 'other.html', content='<html></html>', age=3600)
+            text = make_file(temp_dir, 'orphan.txt', age=3600)
+            self.assertEqual(test_module.sweep_files(temp_dir), 0)
+            self.assertTrue(os.path.exists(orphan))
+            self.assertEqual(test_module.sweep_files(temp_dir, orphans=True), 1)
+            self.assertFalse(os.path.exists(orphan))
+            self.assertTrue(os.path.exists(recent))
+            self.assertTrue(os.path.exists(other))
+            self.assertTrue(os.path.exists(text))
+            make_file(temp_dir, 'orphan.html', age=3600)
+            self.assertEqual(test_module.sweep_files(temp_dir, orphans=False), 0)
+
+    def test_sweep_nothing_expired(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            kept = make_file(temp_dir, 'kept.html')
+            test_module.record_file(kept)
+            test_module.record_file(kept)
+            before = read_manifest(temp_dir)
+            with mock.patch.object(test_module, '_rewrite') as rewrite:
+                self.assertEqual(test_module.sweep_files(temp_dir), 0)
+            rewrite.assert_not_called()
+            self.assertEqual(read_manifest(temp_dir), before)
+
+    def test_sweep_limit(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for count in range(10):
+                make_file(temp_dir, '{0}.html'.format(count), age=3600)
+            # The manifest file itself is one of the examined entries.
+            removed = test_module.sweep_files(temp_dir, limit=4, orphans=True)
+            self.assertIn(removed, (3, 4))
+            self.assertEqual(test_module.sweep_files(temp_dir, orphans=True) + removed, 10)
+
+    def test_write_html_records(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'one'), form_data={'one': '1'})
+            self.assertTrue(poster.write_html())
+            self.assertTrue(read_manifest(temp_dir).endswith('\tone.html\n'))
+            poster.keep_file = True
+            self.assertTrue(poster.write_html())
+            self.assertTrue(read_manifest(temp_dir).endswith('-\tone.html\n'))
+
+    def test_write_html_no_manifest(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'one'), form_data={'one': '1'}, manifest=False)
+            self.assertTrue(poster.write_html())
+            self.assertEqual(os.listdir(temp_dir), ['one.html'])
+
+    def test_startup_sweep(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            expired = make_file(temp_dir, 'expired.html', age=3600)
+            test_module.record_file(expired, time.time() - 1)
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'one'), form_data={'one': '1'})
+            self.assertTrue(poster.write_html())
+            self.assertFalse(os.path.exists(expired))
+            expired = make_file(temp_dir, 'expired.html', age=3600)
+            test_module.record_file(expired, time.time() - 1)
+            self.assertTrue(poster.write_html())
+            self.assertTrue(os.path.exists(expired))
+
+    def test_startup_sweep_unlisted(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            kept = openpost.OpenPost('localhost', os.path.join(temp_dir, 'kept'), form_data={'one': '1'}, keep_file=True, manifest=False)
+            self.assertTrue(kept.write_html())
+            past = time.time() - 3600
+            os.utime(kept.output_file, (past, past))
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'one'), form_data={'one': '1'})
+            self.assertTrue(poster.write_html())
+            self.assertTrue(os.path.exists(kept.output_file))
+
+    def test_shard_path(self):
+        self.assertEqual(test_module.shard_path('one.html', 0), '')
+        path = test_module.shard_path('one.html', 2, 3)
+        self.assertEqual(path, test_module.shard_path('one.html', 2, 3))
+        parts = path.split(os.sep)
+        self.assertEqual([len(part) for part in parts], [3, 3])
+        self.assertTrue(all(test_module.HEX_DIGITS.issuperset(part) for part in parts))
+        with self.assertRaises(ValueError):
+            test_module.shard_path('one.html', 1, 9)
+        with self.assertRaises(ValueError):
+            test_module.shard_path('one.html', 21, 2)
+
+    def test_sweep_sharded(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = {}
+            for name in ('expired.html', 'kept.html', 'orphan.html'):
+                subdirectory = os.path.join(temp_dir, test_module.shard_path(name, 2, 1))
+                os.makedirs(subdirectory, exist_ok=True)
+                paths[name] = make_file(subdirectory, name, age=3600)
+            test_module.record_file(paths['expired.html'], time.time() - 1, temp_dir)
+            test_module.record_file(paths['kept.html'], None, temp_dir)
+            self.assertEqual(len(test_module.list_files(temp_dir)), 2)
+            unrelated = os.path.join(temp_dir, 'cafe')
+            os.makedirs(unrelated)
+            other = make_file(unrelated, 'orphan.html', age=3600)
+            self.assertEqual(test_module.sweep_files(temp_dir, orphans=True, shard_depth=2, shard_width=1), 2)
+            self.assertFalse(os.path.exists(paths['expired.html']))
+            self.assertFalse(os.path.exists(paths['orphan.html']))
+            self.assertTrue(os.path.exists(other))
+            self.assertTrue(os.path.exists(paths['kept.html']))
+            kept = test_module.shard_path('kept.html', 2, 1).replace(os.sep, '/') + '/kept.html'
+            self.assertEqual(test_module.list_files(temp_dir), {kept: None})
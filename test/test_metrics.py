@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost metrics registry
+"""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import openpost
+import openpost.metrics as test_module
+
+
+class MyTests(unittest.TestCase):
+
+    def test_counter_threads(self):
+        registry = test_module.Registry()
+
+        def count():
+            for _count in range(1000):
+                registry.inc('hits')
+
+        threads = [threading.Thread(target=count) for _count in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(registry.as_dict()['counters'], {'hits': 8000})
+
+    def test_histogram(self):
+        registry = test_module.Registry()
+        for value in (0.5, 1, 1.5, 100):
+            registry.histogram('sizes', (1, 10)).observe(value)
+        self.assertEqual(registry.as_dict()['histograms']['sizes'], {'count': 4, 'sum': 103.0, 'buckets': {'1': 2, '10': 1, '+Inf': 1}})
+        with self.assertRaises(ValueError):
+            registry.counter('sizes')
+
+    def test_gauge_and_json(self):
+        registry = test_module.Registry()
+        registry.add('pending', 2)
+        registry.gauge('pending').dec()
+        self.assertEqual(json.loads(registry.as_json()), {'counters': {}, 'gauges': {'pending': 1}, 'histograms': {}})
+        registry.enabled = False
+        registry.add('pending', 5)
+        registry.inc('hits')
+        self.assertEqual(registry.as_dict()['gauges'], {'pending': 1})
+        registry.reset()
+        self.assertEqual(registry.as_dict(), {'counters': {}, 'gauges': {}, 'histograms': {}})
+
+    def test_send_post_metrics(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch.object(openpost, 'METRICS', test_module.Registry()) as registry:
+                poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'one'), time_to_live=0, form_data={'one': '1'})
+                with mock.patch('webbrowser.open_new_tab', return_value=False):
+                    self.assertTrue(poster.send_post())
+                metrics = openpost.get_metrics()
+                self.assertEqual(metrics, registry.as_dict())
+        self.assertEqual(metrics['counters']['pages_written'], 1)
+        self.assertGreater(metrics['counters']['bytes_written'], 100)
+        self.assertEqual(metrics['counters']['launch_failures'], 1)
+        self.assertEqual(metrics['gauges']['files_pending'], 0)
+        self.assertEqual(metrics['histograms']['write_seconds']['count'], 1)
+        self.assertEqual(metrics['histograms']['cleanup_lag_seconds']['count'], 1)
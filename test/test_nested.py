@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost nested form data
+"""
+
+import unittest
+
+import openpost
+from openpost import batch
+from openpost.nested import flatten, flatten_items
+
+
+class MyTests(unittest.TestCase):
+
+    def test_flatten(self):
+        data = {'one': '1', 'tag': ['a', 'b'], 'user': {'name': 'N', 'address': {'city': 'C'}, 'phone': None},
+                'items': [{'id': 1}, {'id': 2}], 'grid': [[1, 2], [3]], 'empty': {}}
+        self.assertEqual(list(flatten_items(data.items())), [
+            ('one', '1'), ('tag', 'a'), ('tag', 'b'), ('user[name]', 'N'), ('user[address][city]', 'C'),
+            ('items[0][id]', 1), ('items[1][id]', 2), ('grid[0]', 1), ('grid[0]', 2), ('grid[1]', 3)])
+        self.assertEqual(list(flatten('one', '1')), [('one', '1')])
+        self.assertEqual(list(flatten('one', None)), [])
+        deep = 'leaf'
+        for _level in range(5000):
+            deep = {'k': deep}
+        path, value = next(flatten('d', deep))
+        self.assertEqual(value, 'leaf')
+        self.assertEqual(path, 'd' + '[k]' * 5000)
+
+    def test_render_nested(self):
+        poster = openpost.OpenPost('localhost', form_data={'tag': ['a', 'b'], 'user': {'name': 'N'}})
+        flat = openpost.OpenPost('localhost', form_data=[('tag', 'a'), ('user[name]', 'N')])
+        nested = flat.NESTED_FIELD_TEMPLATE
+        flat_html = flat.make_html()
+        expected = flat_html.replace(flat.FIELD_TEMPLATE.format('tag', 'a'), nested.format('tag', 'a') + nested.format('tag', 'b'))
+        expected = expected.replace(flat.FIELD_TEMPLATE.format('user[name]', 'N'), nested.format('user[name]', 'N'))
+        self.assertEqual(poster.make_html(), expected)
+        self.assertEqual(poster.make_html_bytes().decode('utf-8'), expected)
+        derived = poster.derive(tag=['c'])
+        self.assertIn(nested.format('tag', 'c'), derived.make_html())
+        self.assertNotIn(nested.format('tag', 'a'), derived.make_html())
+        poster.add_key('user', {'name': 'M', 'roles': ['x', 'y']})
+        html = poster.make_html()
+        for path, value in (('user[name]', 'M'), ('user[roles]', 'x'), ('user[roles]', 'y')):
+            self.assertIn(nested.format(path, value), html)
+        streamed = openpost.OpenPost('localhost', form_data=iter([('tag', ['a', 'b']), ('user', {'name': 'N'})]))
+        self.assertEqual(streamed.make_html(), expected)
+        self.assertEqual(batch.compact_form({'tag': ['a', 'b']}), (('tag', 'a', True), ('tag', 'b', True)))
+
+    def test_render_nested_ids(self):
+        poster = openpost.OpenPost('localhost', form_data={'one': '1', 'tag': ['a', 'b'], 'grid': [[1], [2]]})
+        for html in (poster.make_html(), poster.make_html_bytes().decode('utf-8'), next(poster.render_batch([poster.form_data], workers=0)).decode('utf-8')):
+            self.assertEqual(html.count("name='tag'"), 2)
+            self.assertIn("name='one' id='one'", html)
+            self.assertEqual(html.count(' id='), 2)     # The form itself and the plain field
+
+
+if __name__ == '__main__':
+    unittest.main()
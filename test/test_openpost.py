@@ -5,8 +5,12 @@
 
 import os
 import sys
+import tempfile
+import threading
+import time
 import unittest
 from contextlib import contextmanager
+from unittest import mock
 
 import openpost as test_module
 
@@ -36,6 +40,10 @@ def suppress_allout():
             sys.stderr = old_stderr
 
 
+def html_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.html'))
+
+
 class MyTests(unittest.TestCase):
 
     def test_initialize_01(self):
@@ -126,6 +134,44 @@ class MyTests(unittest.TestCase):
             with suppress_allout():
                 poster._validate_data(1.5)
 
+    def test_validate_data_pairs(self):
+        poster = test_module.OpenPost()
+        self.assertEqual(poster._validate_data([('one', '1'), ['two', '2']]), {'one': '1', 'two': '2'})
+        with self.assertRaises(ValueError):
+            poster._validate_data([('one', '1'), ('two', '2', 'extra')])
+        stream = poster._validate_data({'one': '1'}.items())
+        self.assertIsInstance(stream, test_module.FieldStream)
+        self.assertEqual(list(stream), [('one', '1')])
+        with self.assertRaises(ValueError):
+            list(stream)
+
+    def test_form_data_stream(self):
+        read = []
+
+        def fields():
+            for count in range(3):
+                read.append(count)
+                yield 'key{0}'.format(count), count
+
+        poster = test_module.OpenPost('localhost', form_data=fields())
+        self.assertEqual(read, [])
+        expected = test_module.OpenPost('localhost', form_data={'key0': 0, 'key1': 1, 'key2': 2}).make_html()
+        self.assertEqual(poster.make_html(), expected)
+        self.assertEqual(read, [0, 1, 2])
+        with self.assertRaises(ValueError):
+            poster.make_html()
+        self.assertEqual(test_module.OpenPost('localhost', form_data=iter(())).make_html(), '')
+        poster = test_module.OpenPost('localhost', form_data=(item for item in [('one', '1')]))
+        poster.add_key('two', '2')
+        self.assertEqual(poster.form_data, {'one': '1', 'two': '2'})
+
+    def test_form_data_stream_invalid(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), form_data=iter([('one', '1'), 'bad']))
+            with self.assertRaises(ValueError):
+                poster.write_html()
+            self.assertEqual(html_files(temp_dir), [])
+
     def test_validate_url(self):
         poster = test_module.OpenPost()
         self.assertEqual(poster._validate_url('localhost'), 'localhost')
@@ -209,3 +255,289 @@ class MyTests(unittest.TestCase):
         with self.assertRaises(TypeError):
             with suppress_allout():
                 poster._make_string(['', ['a', 'b'], ''])
+
+    def test_content_name_01(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster1 = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), content_name=True, form_data={'one': '1'})
+            poster2 = test_module.OpenPost('localhost', os.path.join(temp_dir, 'two'), content_name=True, form_data={'one': '1'})
+            self.assertTrue(poster1.write_html())
+            self.assertTrue(poster2.write_html())
+            self.assertEqual(poster1.output_file, poster2.output_file)
+            self.assertEqual(len(os.path.basename(poster1.output_file)), 37)
+            self.assertEqual(html_files(temp_dir), [os.path.basename(poster1.output_file)])
+            poster2.add_key('two', '2')
+            self.assertTrue(poster2.write_html())
+            self.assertNotEqual(poster1.output_file, poster2.output_file)
+            self.assertEqual(len(html_files(temp_dir)), 2)
+
+    def test_shard_depth(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), form_data={'one': '1'}, shard_depth=2, shard_width=1)
+            self.assertTrue(poster.write_html())
+            relative = os.path.relpath(poster.output_file, temp_dir)
+            self.assertEqual(relative, os.path.join(test_module.shard_path('one.html', 2, 1), 'one.html'))
+            self.assertEqual(list(test_module.list_files(temp_dir)), [relative.replace(os.sep, '/')])
+
+    def test_content_name_02(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), time_to_live=5, content_name=True, form_data={'one': '1'})
+            self.assertTrue(poster.write_html())
+            past = time.time() - 2
+            os.utime(poster.output_file, (past, past))
+            self.assertTrue(poster.write_html())
+            self.assertGreater(os.stat(poster.output_file).st_mtime, past)
+            with open(poster.output_file, 'w', encoding='utf-8') as output_file:
+                output_file.write('stale')
+            past = time.time() - 10
+            os.utime(poster.output_file, (past, past))
+            self.assertTrue(poster.write_html())
+            with open(poster.output_file, 'r', encoding='utf-8') as input_file:
+                self.assertIn("name='one'", input_file.read())
+
+    def test_content_name_03(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), time_to_live=0, content_name=True, form_data={'one': '1'})
+            self.assertTrue(poster.write_html())
+            filename = poster.output_file
+            with test_module._PAGE_LOCK:
+                poster._acquire_file(filename)
+            with mock.patch('webbrowser.open_new_tab') as browser:
+                self.assertTrue(poster.send_post())
+            browser.assert_called_once_with(filename)
+            self.assertTrue(os.path.exists(filename))
+            poster._release_file(filename)
+            self.assertFalse(os.path.exists(filename))
+            self.assertNotIn(filename, test_module._PAGE_REFS)
+
+    def test_content_name_05(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), time_to_live=30, content_name=True, form_data={'one': '1'})
+            filename = poster._write_html(reserve=True)
+            self.assertEqual(test_module._PAGE_REFS[filename][0], 1)
+            self.assertEqual(poster._write_html(reserve=True), filename)
+            self.assertEqual(test_module._PAGE_REFS[filename][0], 2)
+            poster._release_file(filename)
+            self.assertTrue(os.path.exists(filename))
+            poster._release_file(filename)
+            self.assertNotIn(filename, test_module._PAGE_REFS)
+
+    def test_content_name_06(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), time_to_live=30, content_name=True, form_data={'one': '1'})
+            filename = poster._write_html()
+
+            def swept(path, *args):
+                os.remove(path)
+                raise FileNotFoundError(path)
+
+            with mock.patch('os.utime', side_effect=swept):
+                self.assertEqual(poster._write_html(reserve=True), filename)
+            self.assertTrue(os.path.exists(filename))
+            self.assertEqual(test_module._PAGE_REFS[filename][0], 1)
+            poster._release_file(filename)
+
+    def test_reserve_write_error(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), form_data={'one': '1'})
+            with mock.patch.object(poster, '_write_file', side_effect=OSError('disk full')):
+                with self.assertRaises(OSError):
+                    poster._write_html(reserve=True)
+            self.assertNotIn(os.path.join(temp_dir, 'one.html'), test_module._PAGE_REFS)
+            self.assertEqual(poster._write_html(reserve=True), os.path.join(temp_dir, 'one.html'))
+            poster._release_file(os.path.join(temp_dir, 'one.html'))
+
+    def test_send_post_keep_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), keep_file=True, form_data={'one': '1'})
+            with mock.patch('webbrowser.open_new_tab'):
+                self.assertTrue(poster.send_post())
+            self.assertTrue(os.path.exists(poster.output_file))
+            poster.keep_file = False
+            poster.time_to_live = 0
+            with mock.patch('webbrowser.open_new_tab'):
+                self.assertTrue(poster.send_post())
+            self.assertFalse(os.path.exists(poster.output_file))
+
+    def test_content_name_04(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), time_to_live=0, content_name=True, form_data={'one': '1'})
+            self.assertTrue(poster.write_html())
+            filename = poster.output_file
+            with test_module._PAGE_LOCK:
+                poster._acquire_file(filename)
+            future = time.time() + 30
+            os.utime(filename, (future, future))
+            poster._release_file(filename)
+            self.assertTrue(os.path.exists(filename))
+
+    def test_cleanup_access(self):
+        if not test_module.inotify.available():
+            self.skipTest('inotify not available')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), time_to_live=30, cleanup='access', form_data={'one': '1'})
+
+            def read_page(filename):
+                with open(filename, 'r', encoding='utf-8') as input_file:
+                    input_file.read()
+                return True
+
+            start = time.monotonic()
+            with mock.patch('webbrowser.open_new_tab', side_effect=read_page):
+                self.assertTrue(poster.send_post())
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertGreaterEqual(time.monotonic() - start, test_module.ACCESS_GRACE)
+            self.assertFalse(os.path.exists(poster.output_file))
+
+    def test_cleanup_access_limit(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'one'), time_to_live=0.3, cleanup='access', form_data={'one': '1'})
+            start = time.monotonic()
+            with mock.patch('webbrowser.open_new_tab'):
+                self.assertTrue(poster.send_post())
+            self.assertGreaterEqual(time.monotonic() - start, 0.3)
+            self.assertFalse(os.path.exists(poster.output_file))
+
+    def test_derive_01(self):
+        poster = test_module.OpenPost('localhost', form_data={'one': '1', 'two': '2', 'three': '3'})
+        derived = poster.derive(two=22, three=None, four='4')
+        self.assertEqual(dict(derived.form_data), {'one': '1', 'two': '22', 'four': '4'})
+        self.assertEqual(poster.form_data, {'one': '1', 'two': '2', 'three': '3'})
+        expected = test_module.OpenPost('localhost', form_data={'one': '1', 'two': '22', 'four': '4'})
+        self.assertEqual(derived.make_html(), expected.make_html())
+        self.assertEqual(derived.url, 'localhost')
+
+    def test_derive_02(self):
+        poster = test_module.OpenPost('localhost', form_data={'one': '1', 'two': '2'})
+        first = poster.derive(one='I')
+        second = poster.derive(two='II')
+        self.assertIs(first.form_data.base, second.form_data.base)
+        poster.add_key('three', '3')
+        third = poster.derive()
+        self.assertIsNot(third.form_data.base, first.form_data.base)
+        self.assertIn('three', third.form_data)
+        self.assertNotIn('three', first.form_data)
+        fourth = first.derive(two='II')
+        self.assertIs(fourth.form_data.base, first.form_data.base)
+        self.assertEqual(dict(fourth.form_data), {'one': 'I', 'two': 'II'})
+
+    def test_derive_03(self):
+        poster = test_module.OpenPost('localhost', form_data={'one': '1', 'two': '2'})
+        derived = poster.derive(one='I')
+        derived.add_key('three', '3')
+        derived.delete_key('two')
+        derived.url = 'otherhost'
+        self.assertEqual(dict(derived.form_data), {'one': 'I', 'three': '3'})
+        self.assertEqual(poster.form_data, {'one': '1', 'two': '2'})
+        self.assertEqual(poster.url, 'localhost')
+        self.assertIn("action=\"otherhost\"", derived.make_html())
+        derived.delete_key('one')
+        derived.delete_key('three')
+        self.assertEqual(derived.make_html(), '')
+
+    def test_derive_render_cache(self):
+        poster = test_module.OpenPost('localhost', form_data={'one': '1', 'two': '2', 'three': '3'})
+        poster.derive().make_html()
+        with mock.patch.object(test_module.OpenPost, '_render_field', wraps=test_module.OpenPost._render_field) as render:
+            poster.derive(two='II').make_html()
+        self.assertEqual([call.args[0] for call in render.call_args_list], ['two'])
+
+    def test_derive_write_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'page'), form_data={'one': '1', 'two': '2', 'three': '3'}, manifest=False)
+            self.assertTrue(poster.derive().write_html())
+            derived = poster.derive(two='II')
+            with mock.patch.object(test_module.OpenPost, '_render_field', wraps=test_module.OpenPost._render_field) as render:
+                self.assertTrue(derived.write_html())
+            self.assertEqual([call.args[0] for call in render.call_args_list], ['two'])
+            with open(derived.output_file, 'r', encoding='utf-8') as input_file:
+                self.assertEqual(input_file.read(), derived.make_html())
+
+    def test_shared_snapshot(self):
+        poster = test_module.OpenPost('localhost', form_data={'key{0}'.format(count): str(count) for count in range(200)})
+        errors = []
+        done = threading.Event()
+
+        def change():
+            count = 200
+            while not done.is_set():
+                poster.add_key('key{0}'.format(count), str(count))
+                poster.delete_key('key{0}'.format(count - 100))
+                count += 1
+
+        def render():
+            try:
+                for _count in range(200):
+                    self.assertIn('key50', poster.make_html())
+            except Exception as err:     # pylint: disable=broad-except
+                errors.append(err)
+
+        changer = threading.Thread(target=change)
+        changer.start()
+        renderers = [threading.Thread(target=render) for _count in range(4)]
+        for thread in renderers:
+            thread.start()
+        for thread in renderers:
+            thread.join()
+        done.set()
+        changer.join()
+        self.assertEqual(errors, [])
+
+    def test_thread_overrides(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = test_module.OpenPost('localhost', os.path.join(temp_dir, 'shared'), time_to_live=0.3, form_data={'one': '1', 'two': '2'})
+            barrier = threading.Barrier(2)
+            opened = {}
+
+            def send(user):
+                with poster.overrides(user=user, two=None):
+                    barrier.wait()
+                    self.assertTrue(poster.send_post())
+
+            def record(filename):
+                with open(filename, 'r', encoding='utf-8') as input_file:
+                    opened[filename] = input_file.read()
+                return True
+
+            with mock.patch('webbrowser.open_new_tab', side_effect=record):
+                threads = [threading.Thread(target=send, args=(user,)) for user in ('alice', 'bob')]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            self.assertEqual(len(opened), 2)
+            pages = sorted(opened.values(), key=lambda page: 'alice' not in page)
+            self.assertIn("'user' form='postform' style='display: none;'>alice<", pages[0])
+            self.assertIn("'user' form='postform' style='display: none;'>bob<", pages[1])
+            self.assertTrue(all("'one'" in page and "'two'" not in page for page in pages))
+            self.assertEqual(html_files(temp_dir), [])
+            self.assertEqual(poster.make_html(), test_module.OpenPost('localhost', form_data={'one': '1', 'two': '2'}).make_html())
+
+    def test_render_columns(self):
+        data = {'name': ['alice', ' bob ', 'carol'], 'count': range(3)}
+        poster = test_module.OpenPost('localhost', form_data={'fixed': 'f', 'name': 'x'})
+        pages = list(poster.render_columns(data))
+        self.assertEqual(len(pages), 3)
+        for row, page in enumerate(pages):
+            form_data = {'fixed': 'f', 'name': data['name'][row], 'count': row}
+            self.assertEqual(page, test_module.OpenPost('localhost', form_data=form_data).make_html())
+        with self.assertRaises(ValueError):
+            list(poster.render_columns({'one': [1, 2], 'two': [1]}))
+        with self.assertRaises(ValueError):
+            list(poster.render_columns([('one', [1])]))
+        for column in ('abc', b'abc'):
+            with self.assertRaises(TypeError):
+                list(poster.render_columns({'one': column}))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster.file_name = os.path.join(temp_dir, 'row')
+            self.assertEqual(poster.write_columns(data), 3)
+            self.assertEqual(html_files(temp_dir), ['row-0.html', 'row-1.html', 'row-2.html'])
+            self.assertEqual(sorted(test_module.list_files(temp_dir)), ['row-0.html', 'row-1.html', 'row-2.html'])
+            with open(os.path.join(temp_dir, 'row-1.html'), 'r', encoding='utf-8') as input_file:
+                self.assertEqual(input_file.read(), pages[1])
+
+    @unittest.skipIf(test_module.columns.pandas is None, 'pandas is not installed')
+    def test_render_columns_dataframe(self):
+        data = {'name': ['alice', ' bob '], 'count': [1, 2]}
+        poster = test_module.OpenPost('localhost')
+        frame = test_module.columns.pandas.DataFrame(data)
+        self.assertEqual(list(poster.render_columns(frame)), list(poster.render_columns(data)))
@@ -3,13 +3,58 @@
 """Tests for the OpenPost project
 """
 
+import json
 import os
+import re
+import signal
+import subprocess
 import sys
+import tempfile
 import time
 import unittest
+import webbrowser
 from contextlib import contextmanager
+from unittest import mock
 
 import cli.openpost as test_module
+from openpost.archive import Archive
+
+CLI_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cli', 'openpost.py')
+
+#   Stand-in for a browser: records the form id in the page it is given, then waits briefly and
+#   records the form id again to check that the page has not been replaced or removed meanwhile.
+FAKE_BROWSER = """\
+#!{0}
+import os, re, sys, time
+
+def page_id(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as input_file:
+            return re.search('name="id" value="([^"]*)"', input_file.read()).group(1)
+    except (OSError, AttributeError):
+        return 'missing'
+
+first = page_id(sys.argv[-1])
+time.sleep(float(os.environ.get('FAKE_BROWSER_DELAY', '0')))
+with open(os.environ['FAKE_BROWSER_LOG'], 'a', encoding='utf-8') as log_file:
+    log_file.write('{{0}} {{1}} {{2}}\\n'.format(first, page_id(sys.argv[-1]), sys.argv[-1]))
+"""
+
+
+def make_fake_browser(directory):
+    path = os.path.join(directory, 'fake_browser.py')
+    with open(path, 'w', encoding='utf-8') as output_file:
+        output_file.write(FAKE_BROWSER.format(sys.executable))
+    os.chmod(path, 0o755)
+    return path
+
+
+def browser_env(directory, delay=0):
+    env = dict(os.environ)
+    env['BROWSER'] = make_fake_browser(directory)
+    env['FAKE_BROWSER_LOG'] = os.path.join(directory, 'browser.log')
+    env['FAKE_BROWSER_DELAY'] = str(delay)
+    return env
 
 
 @contextmanager
@@ -37,6 +82,20 @@ def suppress_allout():
             sys.stderr = old_stderr
 
 
+def html_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.html'))
+
+
+def wait_for_cleanup(directory, timeout):
+    """Wait for the html files in a directory to be removed by the background cleanup."""
+    limit = time.time() + timeout
+    while html_files(directory):
+        if time.time() > limit:
+            return False
+        time.sleep(0.1)
+    return True
+
+
 class ArgsObject():
     """
     Temporary object used for testing to mimic the args object
@@ -44,6 +103,7 @@ class ArgsObject():
     """
     date_name = False
     random_name = False
+    unique_name = False
     FILENAME = None
     FILEPATH = None
     keep_file = False
@@ -202,7 +262,7 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.url = ''
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.exit_with_error()
         self.assertEqual(err.exception.code, -1)
         # unittest.main(exit=False)
@@ -211,7 +271,7 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.url = ''
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.exit_with_error(-1)
         self.assertEqual(err.exception.code, -1)
         # unittest.main(exit=False)
@@ -220,7 +280,7 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.url = ''
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.exit_with_error(101)
         self.assertEqual(err.exception.code, 101)
         # unittest.main(exit=False)
@@ -229,7 +289,7 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.SECONDS = -1
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_time_to_live(args)
         self.assertEqual(err.exception.code, 104)
         # unittest.main(exit=False)
@@ -238,7 +298,7 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.SECONDS = 61
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_time_to_live(args)
         self.assertEqual(err.exception.code, 104)
         # unittest.main(exit=False)
@@ -247,7 +307,7 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.FILEPATH = ''
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_file_path(args)
         self.assertEqual(err.exception.code, 105)
         # unittest.main(exit=False)
@@ -256,7 +316,7 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.FILEPATH = ' '
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_file_path(args)
         self.assertEqual(err.exception.code, 105)
         # unittest.main(exit=False)
@@ -265,7 +325,7 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.FILEPATH = 'cli/openpost.py'
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_file_path(args)
         self.assertEqual(err.exception.code, 106)
         # unittest.main(exit=False)
@@ -274,7 +334,7 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.FILENAME = ''
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_file_name(args)
         self.assertEqual(err.exception.code, 107)
         # unittest.main(exit=False)
@@ -283,63 +343,63 @@ class MyTests(unittest.TestCase):
         args = ArgsObject()
         args.FILENAME = ' '
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_file_name(args)
         self.assertEqual(err.exception.code, 107)
         # unittest.main(exit=False)
 
     def test_data_108_1(self):
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_form_data_string('')
         self.assertEqual(err.exception.code, 108)
         # unittest.main(exit=False)
 
     def test_data_108_2(self):
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_form_data_string(0)
         self.assertEqual(err.exception.code, 108)
         # unittest.main(exit=False)
 
     def test_data_108_3(self):
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_form_data_string(1.5)
         self.assertEqual(err.exception.code, 108)
         # unittest.main(exit=False)
 
     def test_data_108_4(self):
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_form_data_string(('a', 'b'))
         self.assertEqual(err.exception.code, 108)
         # unittest.main(exit=False)
 
     def test_data_108_5(self):
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_form_data_string({'key': 'value'})
         self.assertEqual(err.exception.code, 108)
         # unittest.main(exit=False)
 
     def test_data_109(self):
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_form_data_string(['no equals sign'])
         self.assertEqual(err.exception.code, 109)
         # unittest.main(exit=False)
 
     def test_data_110(self):
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_form_data_string(['=no key'])
         self.assertEqual(err.exception.code, 110)
         # unittest.main(exit=False)
 
     def test_data_111(self):
         with self.assertRaises(SystemExit) as err:
-            with suppress_stdout():
+            with suppress_allout():
                 test_module.make_form_data_string([])
         self.assertEqual(err.exception.code, 111)
         # unittest.main(exit=False)
@@ -401,3 +461,407 @@ class MyTests(unittest.TestCase):
                 test_module.parse_command_arguments(['localhost', 'key=value', '-k', '-t', '5'])
         self.assertEqual(err.exception.code, 2)
         # unittest.main(exit=False)
+
+    def test_main_sweep(self):
+        args = test_module.parse_command_arguments(['--sweep', '-p', 'test'])
+        self.assertTrue(args.sweep)
+        self.assertFalse(args.orphans)
+        self.assertIsNone(args.url)
+        self.assertEqual(args.FILEPATH, 'test')
+        self.assertTrue(test_module.parse_command_arguments(['--sweep', '--orphans']).orphans)
+        with self.assertRaises(SystemExit) as err:
+            with suppress_allout():
+                test_module.parse_command_arguments(['localhost', 'key=value', '--orphans'])
+        self.assertEqual(err.exception.code, 2)
+
+    def test_sweep_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            page = test_module.HTML_TEMPLATE.format('localhost', '')
+            names = ['expired.html', 'kept.html', 'orphan.html', 'recent.html']
+            for name in names:
+                with open(os.path.join(temp_dir, name), 'w', encoding='utf-8') as output_file:
+                    output_file.write(page)
+            past = time.time() - 3600
+            for name in names[:3]:
+                os.utime(os.path.join(temp_dir, name), (past, past))
+            test_module.record_file(os.path.join(temp_dir, 'expired.html'), time.time() - 1)
+            test_module.record_file(os.path.join(temp_dir, 'kept.html'), None)
+            self.assertEqual(test_module.sweep_files(temp_dir), 1)
+            self.assertEqual(sorted(name for name in os.listdir(temp_dir) if name.endswith('.html')), ['kept.html', 'orphan.html', 'recent.html'])
+            self.assertEqual(test_module.sweep_files(temp_dir, orphans=True), 1)
+            self.assertEqual(sorted(name for name in os.listdir(temp_dir) if name.endswith('.html')), ['kept.html', 'recent.html'])
+            with open(os.path.join(temp_dir, test_module.MANIFEST_NAME), 'r', encoding='utf-8') as input_file:
+                self.assertEqual(input_file.read(), '-\tkept.html\n')
+
+    def test_sweep_nothing_expired(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            test_module.record_file(os.path.join(temp_dir, 'kept.html'), None)
+            test_module.record_file(os.path.join(temp_dir, 'kept.html'), None)
+            with mock.patch.object(test_module, 'rewrite_manifest') as rewrite:
+                self.assertEqual(test_module.sweep_files(temp_dir), 0)
+            rewrite.assert_not_called()
+
+    def test_record_compacts(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for count in range(test_module.COMPACT_LINES * 3):
+                test_module.record_file(os.path.join(temp_dir, 'gone-{0}.html'.format(count % 10)), time.time() - 1)
+                test_module.record_file(os.path.join(temp_dir, 'kept.html'), None)
+            with open(os.path.join(temp_dir, test_module.MANIFEST_NAME), 'r', encoding='utf-8') as input_file:
+                lines = input_file.read().splitlines()
+            self.assertLessEqual(len(lines), test_module.COMPACT_LINES + 1)
+            self.assertIn('-\tkept.html', lines)
+
+    def test_name_unique(self):
+        name1 = test_module.unique_filename()
+        name2 = test_module.unique_filename()
+        self.assertNotEqual(name1, name2)
+        self.assertTrue(re.match(r'^openpost-{0}-\d+-[0-9a-f]{{8}}\.html$'.format(os.getpid()), name1))
+        args = ArgsObject()
+        args.unique_name = True
+        self.assertTrue(test_module.make_file_name(args).startswith('openpost-{0}-'.format(os.getpid())))
+
+    def test_write_html_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            html_file = test_module.write_html_file(temp_dir, 'one.html', 'first', exclusive=True)
+            self.assertEqual(html_file, os.path.join(temp_dir, 'one.html'))
+            html_file = test_module.write_html_file(temp_dir, 'one.html', 'second', exclusive=True)
+            self.assertNotEqual(html_file, os.path.join(temp_dir, 'one.html'))
+            self.assertTrue(os.path.basename(html_file).startswith('openpost-'))
+            html_file = test_module.write_html_file(temp_dir, 'one.html', 'third')
+            self.assertEqual(html_file, os.path.join(temp_dir, 'one.html'))
+            with open(html_file, 'r', encoding='utf-8') as input_file:
+                self.assertEqual(input_file.read(), 'third')
+
+    def test_concurrent_runs(self):
+        runs = 8
+        with tempfile.TemporaryDirectory() as temp_dir:
+            env = browser_env(temp_dir, delay=0.5)
+            processes = [
+                subprocess.Popen([sys.executable, CLI_SCRIPT, '-p', temp_dir, '-t', '1', 'localhost', 'id={0}'.format(count)], env=env, stdout=subprocess.DEVNULL)
+                for count in range(runs)
+            ]
+            for process in processes:
+                self.assertEqual(process.wait(timeout=30), 0)
+            with open(env['FAKE_BROWSER_LOG'], 'r', encoding='utf-8') as log_file:
+                launches = [line.split() for line in log_file]
+            self.assertEqual(len(launches), runs)
+            self.assertEqual(sorted(int(launch[0]) for launch in launches), list(range(runs)))
+            for first, second, _path in launches:
+                self.assertEqual(first, second)
+            self.assertEqual(len(set(launch[2] for launch in launches)), runs)
+            self.assertTrue(wait_for_cleanup(temp_dir, 10))
+
+    def run_cli(self, temp_dir, *args, env=None):
+        command = [sys.executable, CLI_SCRIPT, '-p', temp_dir] + list(args)
+        return subprocess.run(command, env=env or browser_env(temp_dir), stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30, check=False)
+
+    def test_detached_cleanup(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            start = time.time()
+            result = self.run_cli(temp_dir, '-t', '2', 'localhost', 'id=1')
+            self.assertEqual(result.returncode, 0)
+            self.assertLess(time.time() - start, 2)
+            self.assertEqual(html_files(temp_dir), ['openpost.html'])
+            self.assertTrue(wait_for_cleanup(temp_dir, 10))
+
+    def test_wait_cleanup(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            start = time.time()
+            result = self.run_cli(temp_dir, '-w', '-t', '1', 'localhost', 'id=1')
+            self.assertEqual(result.returncode, 0)
+            self.assertGreaterEqual(time.time() - start, 1)
+            self.assertEqual(html_files(temp_dir), [])
+
+    def test_exit_113(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.mkdir(os.path.join(temp_dir, 'folder.html'))
+            result = self.run_cli(temp_dir, '-f', 'folder', 'localhost', 'id=1')
+            self.assertEqual(result.returncode, 113)
+
+    def test_exit_114(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            env = browser_env(temp_dir)
+            env['BROWSER'] = 'false'
+            result = self.run_cli(temp_dir, 'localhost', 'id=1', env=env)
+            self.assertEqual(result.returncode, 114)
+            self.assertEqual(html_files(temp_dir), [])
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify not available')
+    def test_after_read_wait(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            start = time.time()
+            result = self.run_cli(temp_dir, '-w', '-a', '-t', '30', 'localhost', 'id=1')
+            self.assertEqual(result.returncode, 0)
+            self.assertLess(time.time() - start, 10)
+            self.assertEqual(html_files(temp_dir), [])
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify not available')
+    def test_after_read_detached(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = self.run_cli(temp_dir, '-a', '-t', '30', 'localhost', 'id=1')
+            self.assertEqual(result.returncode, 0)
+            self.assertTrue(wait_for_cleanup(temp_dir, 10))
+
+    def test_make_variations(self):
+        variations = test_module.make_variations(['a=1,2', 'b=x', 'a=3'])
+        self.assertEqual(list(variations.keys()), ['a', 'b'])
+        self.assertEqual(len(variations['a']), 3)
+        self.assertIn('<input type="hidden" name="a" value="3">', variations['a'][2])
+        with self.assertRaises(SystemExit) as err:
+            with suppress_stdout():
+                test_module.make_variations(['no separator'])
+        self.assertEqual(err.exception.code, 109)
+        with self.assertRaises(SystemExit) as err:
+            with suppress_stdout():
+                test_module.make_variations(['=1,2'])
+        self.assertEqual(err.exception.code, 110)
+
+    def test_vary(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = self.run_cli(temp_dir, '-f', 'page', '--vary', 'a=1,2', '--vary', 'b=x,y,z', 'localhost', 'fixed=f')
+            self.assertEqual(result.returncode, 0)
+            paths = result.stdout.decode('utf-8').split()
+            self.assertEqual(paths, [os.path.join(temp_dir, 'page-{0}.html'.format(index)) for index in range(6)])
+            self.assertEqual(html_files(temp_dir), ['page-{0}.html'.format(index) for index in range(6)])
+            with open(paths[4], 'r', encoding='utf-8') as input_file:
+                page = input_file.read()
+            self.assertIn('name="fixed" value="f"', page)
+            self.assertIn('name="a" value="2"', page)
+            self.assertIn('name="b" value="y"', page)
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, 'browser.log')))
+            with open(os.path.join(temp_dir, test_module.MANIFEST_NAME), 'r', encoding='utf-8') as input_file:
+                self.assertEqual(input_file.read(), ''.join('-\tpage-{0}.html\n'.format(index) for index in range(6)))
+
+    def test_vary_launch(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = self.run_cli(temp_dir, '-f', 'page', '--vary', 'a=1,2', '--vary', 'b=x,y,z', '--launch', '--max-pages', '4', '--stats', 'localhost')
+            self.assertEqual(result.returncode, 0)
+            with open(os.path.join(temp_dir, 'browser.log'), 'r', encoding='utf-8') as input_file:
+                launches = [line.split()[-1] for line in input_file.read().splitlines()]
+            self.assertEqual(launches, [os.path.join(temp_dir, 'page-{0}.html'.format(index)) for index in range(6)])
+            self.assertEqual(json.loads(result.stderr.decode('utf-8'))['counters']['browser_launches'], 6)
+            controller = webbrowser.Mozilla('firefox')
+            self.assertEqual(test_module.browser_command(controller, ['a.html', 'b.html']), ['firefox', '-new-tab', 'a.html', '-new-tab', 'b.html'])
+            self.assertIsNone(test_module.browser_command(webbrowser.BackgroundBrowser(['xdg-open', '%s']), ['a.html', 'b.html']))
+            result = self.run_cli(temp_dir, '--launch', 'localhost', 'id=1')
+            self.assertEqual(result.returncode, 2)
+
+    def test_archive(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            archive_path = os.path.join(temp_dir, 'archive')
+            result = self.run_cli(temp_dir, '-f', 'page', '--vary', 'a=1,2,3', '--archive', archive_path, 'localhost')
+            self.assertEqual(result.returncode, 0)
+            self.assertEqual(result.stdout.decode('utf-8').strip(), 'Archived 3 pages.')
+            self.assertEqual(html_files(temp_dir), [])
+            archive = Archive(archive_path)
+            self.assertEqual(list(archive.names()), ['page-0.html', 'page-1.html', 'page-2.html'])
+            self.assertIn(b'name="a" value="2"', archive.get('page-1.html'))
+            html_file = os.path.join(temp_dir, 'kept.html')
+            with open(html_file, 'w', encoding='utf-8') as output_file:
+                output_file.write('kept page')
+            with suppress_stdout():
+                test_module.remove_file_later(html_file, 0, None, (archive_path, 1024 * 1024), 'named.html')
+            self.assertFalse(os.path.exists(html_file))
+            self.assertEqual(archive.get('named.html'), b'kept page')
+            names = []
+            for content in ('first', 'second'):
+                with open(html_file, 'w', encoding='utf-8') as output_file:
+                    output_file.write(content)
+                test_module.remove_page(html_file, (archive_path, 1024 * 1024))
+                names.append(list(archive.names())[-1])
+            self.assertNotEqual(names[0], names[1])
+            self.assertTrue(names[0].startswith('kept-'))
+            self.assertEqual([archive.get(name) for name in names], [b'first', b'second'])
+            result = self.run_cli(temp_dir, '--archive', archive_path, 'localhost', 'id=1')
+            self.assertEqual(result.returncode, 2)
+
+    def test_make_shard(self):
+        args = ArgsObject()
+        self.assertEqual(test_module.make_shard(args), (0, 2))
+        args.SHARD = '3'
+        self.assertEqual(test_module.make_shard(args), (3, 2))
+        args.SHARD = '2:1'
+        self.assertEqual(test_module.make_shard(args), (2, 1))
+        for shard in ('x', '1:9', '1:2:3', '-1', '21:2'):
+            args.SHARD = shard
+            with self.assertRaises(SystemExit) as err:
+                with suppress_allout():
+                    test_module.make_shard(args)
+            self.assertEqual(err.exception.code, 115)
+
+    def test_shard(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = self.run_cli(temp_dir, '-f', 'page', '-k', '--shard', '2:1', 'localhost', 'one=1')
+            self.assertEqual(result.returncode, 0)
+            subdirectory = test_module.shard_path('page.html', (2, 1))
+            self.assertEqual(len(subdirectory.split(os.sep)), 2)
+            self.assertTrue(os.path.isfile(os.path.join(temp_dir, subdirectory, 'page.html')))
+            with open(os.path.join(temp_dir, test_module.MANIFEST_NAME), 'r', encoding='utf-8') as input_file:
+                self.assertEqual(input_file.read(), '-\t{0}/page.html\n'.format(subdirectory.replace(os.sep, '/')))
+            self.assertEqual(test_module.sweep_files(temp_dir), 0)
+
+    def test_read_stdin_chunks(self):
+        class Stream():
+            def __init__(self, chunks):
+                self.chunks = list(chunks)
+
+            def read1(self, _size):
+                return self.chunks.pop(0) if self.chunks else b''
+
+        chunks = test_module.read_stdin_chunks(Stream([b'  \n', b' one ', b' \n', b'two\n', b'  ', b'\n']))
+        self.assertEqual(b''.join(chunks), b'one  \ntwo')
+        self.assertEqual(list(test_module.read_stdin_chunks(Stream([b' ', b'\n']))), [])
+
+    def test_output_stdout(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            command = [sys.executable, CLI_SCRIPT, '-p', temp_dir, '-o', '-', '-s', 'localhost', 'one=1']
+            result = subprocess.run(command, input=b'  piped\ninput  \n', env=browser_env(temp_dir), stdout=subprocess.PIPE, timeout=30, check=False)
+            self.assertEqual(result.returncode, 0)
+            form_data = test_module.make_form_data_string(['one=1']) + test_module.STDIN_OPEN.format('stdin') + 'piped\ninput' + test_module.STDIN_CLOSE
+            self.assertEqual(result.stdout.decode('utf-8'), test_module.HTML_TEMPLATE.format('localhost', form_data))
+            self.assertEqual(html_files(temp_dir), [])
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, 'browser.log')))
+
+    def test_form_data_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = os.path.join(temp_dir, 'data')
+            os.mkdir(data_dir)
+            files = {'value.txt': '  file\nvalue \n', 'empty.txt': '', 'fields.json': '{"j1": "a<b", "j2": 3}',
+                     'pairs.json': '[["p1", "x"]]', 'fields.csv': 'c1,"one, two"\n\nc2,3\n', 'bad.json': '"text"', 'bad.csv': 'a,b,c\n'}
+            for name, content in files.items():
+                with open(os.path.join(data_dir, name), 'w', encoding='utf-8') as output_file:
+                    output_file.write(content)
+            args = ['one=1', 'text=@' + os.path.join(data_dir, 'value.txt'), 'empty=@' + os.path.join(data_dir, 'empty.txt'), 'at=@@home',
+                    '--json', os.path.join(data_dir, 'fields.json'), '--json', os.path.join(data_dir, 'pairs.json'), '--csv', os.path.join(data_dir, 'fields.csv')]
+            result = self.run_cli(temp_dir, '-o', '-', 'localhost', *args)
+            self.assertEqual(result.returncode, 0)
+            form_data = '\n'.join([
+                test_module.make_form_data_string(['one=1']) + test_module.STDIN_OPEN.format('text') + 'file\nvalue' + test_module.STDIN_CLOSE
+                + test_module.STDIN_OPEN.format('empty') + test_module.STDIN_CLOSE + test_module.make_form_data_string(['at=@home']),
+                test_module.make_input_item('j1', 'a<b'), test_module.make_input_item('j2', '3'), test_module.make_input_item('p1', 'x'),
+                test_module.make_input_item('c1', 'one, two'), test_module.make_input_item('c2', '3')])
+            page = test_module.HTML_TEMPLATE.format('localhost', form_data)
+            self.assertEqual(result.stdout.decode('utf-8'), page)
+            result = self.run_cli(temp_dir, '-k', '-f', 'page.html', 'localhost', *args)
+            self.assertEqual(result.returncode, 0)
+            with open(os.path.join(temp_dir, 'page.html'), 'r', encoding='utf-8') as input_file:
+                self.assertEqual(input_file.read(), page)
+            os.remove(os.path.join(temp_dir, 'page.html'))
+            for bad_args, error in ((['a=@' + os.path.join(data_dir, 'missing.txt')], 117), (['--json', os.path.join(data_dir, 'bad.json')], 118),
+                                    (['--csv', os.path.join(data_dir, 'bad.csv')], 118), (['--json', os.path.join(data_dir, 'value.txt')], 118)):
+                result = self.run_cli(temp_dir, '-k', 'localhost', 'one=1', *bad_args)
+                self.assertEqual(result.returncode, error)
+            self.assertEqual(html_files(temp_dir), [])
+
+    def test_output_stdout_error(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = self.run_cli(temp_dir, '-o', '-', 'localhost', 'a=@' + os.path.join(temp_dir, 'missing.txt'))
+            self.assertEqual(result.returncode, 117)
+            self.assertNotIn(test_module.ERRORS[117], result.stdout.decode('utf-8'))
+            self.assertIn(test_module.ERRORS[117], result.stderr.decode('utf-8'))
+
+    def test_form_data_file_escaped(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_file = os.path.join(temp_dir, 'value.txt')
+            with open(data_file, 'w', encoding='utf-8') as output_file:
+                output_file.write('a &amp; b < c</textarea>\u00e9>')
+            result = self.run_cli(temp_dir, '-o', '-', 'localhost', 'text=@' + data_file)
+            self.assertEqual(result.returncode, 0)
+            value = 'a &amp;amp; b &lt; c&lt;/textarea&gt;\u00e9&gt;'
+            page = test_module.HTML_TEMPLATE.format('localhost', test_module.STDIN_OPEN.format('text') + value + test_module.STDIN_CLOSE)
+            self.assertEqual(result.stdout.decode('utf-8'), page)
+            with open(data_file, 'rb') as input_file:
+                self.assertEqual(b''.join(map(test_module.escape_chunk, test_module.read_stdin_chunks(input_file))), value.encode('utf-8'))
+
+    def test_watch(self):
+        def write_json(content):
+            with open(data_file + '.tmp', 'w', encoding='utf-8') as output_file:
+                output_file.write(content)
+            os.replace(data_file + '.tmp', data_file)
+
+        def wait_for_launches(count):
+            limit = time.time() + 10
+            while time.time() < limit:
+                if os.path.exists(log_file):
+                    with open(log_file, 'r', encoding='utf-8') as input_file:
+                        lines = input_file.read().splitlines()
+                    if len(lines) >= count:
+                        return [line.split()[0] for line in lines]
+                time.sleep(0.05)
+            return None
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = os.path.join(temp_dir, 'data')
+            os.mkdir(data_dir)
+            data_file = os.path.join(data_dir, 'fields.json')
+            log_file = os.path.join(temp_dir, 'browser.log')
+            write_json('{"id": "one"}')
+            command = [sys.executable, CLI_SCRIPT, '-p', temp_dir, '-t', '30', '--watch', '--stats', 'localhost', 'fixed=1', '--json', data_file]
+            with subprocess.Popen(command, env=browser_env(temp_dir), stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+                self.assertEqual(wait_for_launches(1), ['one'])
+                write_json('{"id": "two"}')
+                self.assertEqual(wait_for_launches(2), ['one', 'two'])
+                write_json('not json')
+                time.sleep(0.5)
+                write_json('{"id": "three"}')
+                self.assertEqual(wait_for_launches(3), ['one', 'two', 'three'])
+                self.assertEqual(len(html_files(temp_dir)), 3)
+                process.send_signal(signal.SIGINT)
+                _stdout, stderr = process.communicate(timeout=10)
+            self.assertEqual(process.returncode, 0)
+            self.assertEqual(html_files(temp_dir), [])
+            stats = json.loads(stderr.decode('utf-8').strip().splitlines()[-1])
+            self.assertEqual(stats['counters']['pages_resubmitted'], 2)
+            self.assertEqual(stats['histograms']['render_seconds']['count'], 3)
+            result = self.run_cli(temp_dir, '--watch', 'localhost', 'id=1')
+            self.assertEqual(result.returncode, 119)
+            result = self.run_cli(temp_dir, '--watch', '-o', '-', 'localhost', '--json', data_file)
+            self.assertEqual(result.returncode, 2)
+
+    def test_output_fd(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            read_fd, write_fd = os.pipe()
+            command = [sys.executable, CLI_SCRIPT, '-p', temp_dir, '--output-fd', str(write_fd), 'localhost', 'one=1']
+            with subprocess.Popen(command, env=browser_env(temp_dir), pass_fds=(write_fd,)) as process:
+                os.close(write_fd)
+                with open(read_fd, 'rb') as input_file:
+                    page = input_file.read().decode('utf-8')
+            self.assertEqual(process.returncode, 0)
+            self.assertEqual(page, test_module.HTML_TEMPLATE.format('localhost', test_module.make_form_data_string(['one=1'])))
+            self.assertEqual(html_files(temp_dir), [])
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, 'browser.log')))
+            result = self.run_cli(temp_dir, '--output-fd', '99', 'localhost', 'one=1')
+            self.assertEqual(result.returncode, 116)
+            result = self.run_cli(temp_dir, '-o', '-', '--vary', 'a=1,2', 'localhost')
+            self.assertEqual(result.returncode, 2)
+
+    def test_stats(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = self.run_cli(temp_dir, '--stats', '-w', '-t', '0.1', 'localhost', 'one=1')
+            self.assertEqual(result.returncode, 0)
+            stats = json.loads(result.stderr.decode('utf-8').strip().splitlines()[-1])
+            self.assertEqual(stats['counters']['pages_written'], 1)
+            self.assertGreater(stats['counters']['bytes_written'], 100)
+            self.assertEqual(stats['gauges']['files_pending'], 0)
+            self.assertEqual(stats['histograms']['render_seconds']['count'], 1)
+            self.assertEqual(stats['histograms']['cleanup_lag_seconds']['buckets']['0.5'], 1)
+            env = browser_env(temp_dir)
+            env['BROWSER'] = 'false'
+            result = self.run_cli(temp_dir, '--stats', 'localhost', 'one=1', env=env)
+            self.assertEqual(result.returncode, 114)
+            stats = json.loads(result.stderr.decode('utf-8').strip().splitlines()[-1])
+            self.assertEqual(stats['counters']['launch_failures'], 1)
+            self.assertEqual(stats['gauges']['files_pending'], 0)
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            profile_file = os.path.join(temp_dir, 'run.prof')
+            result = self.run_cli(temp_dir, '--profile-file', profile_file, '-w', '-t', '0.1', 'localhost', 'one=1')
+            self.assertEqual(result.returncode, 0)
+            report = result.stderr.decode('utf-8')
+            for name in ('parse', 'form data', 'format', 'write', 'launch', 'cleanup', 'peak memory'):
+                self.assertRegex(report, r'\n  {0} +\d+\.\d+ (ms|KiB)\n'.format(name))
+            self.assertTrue(os.path.getsize(profile_file))
+            result = self.run_cli(temp_dir, '--profile', 'localhost')
+            self.assertEqual(result.returncode, 111)
+            self.assertIn('Profile:', result.stderr.decode('utf-8'))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost copy-on-write form data
+"""
+
+import unittest
+
+import openpost.overlay as test_module
+
+
+def render(key, value):
+    return '{0}={1};'.format(key, value)
+
+
+class MyTests(unittest.TestCase):
+
+    def test_frozen_form(self):
+        source = {'one': '1', 'two': '2'}
+        frozen = test_module.FrozenForm(source)
+        source['three'] = '3'
+        self.assertEqual(dict(frozen), {'one': '1', 'two': '2'})
+        self.assertEqual(frozen.lines(render), ['one=1;', 'two=2;'])
+        self.assertIs(frozen.line('one', None), frozen.lines(None)[0])
+
+    def test_overlay_mapping(self):
+        base = test_module.FrozenForm({'one': '1', 'two': '2', 'three': '3'})
+        overlay = test_module.FormOverlay({}, base)
+        overlay['two'] = 'II'
+        overlay['four'] = '4'
+        del overlay['three']
+        self.assertEqual(list(overlay), ['one', 'two', 'four'])
+        self.assertEqual(len(overlay), 3)
+        self.assertEqual(overlay['two'], 'II')
+        self.assertNotIn('three', overlay)
+        self.assertEqual(overlay.get('three'), None)
+        with self.assertRaises(KeyError):
+            overlay['three']    # pylint: disable=pointless-statement
+        with self.assertRaises(KeyError):
+            del overlay['three']
+        self.assertEqual(overlay.pop('three', 'gone'), 'gone')
+        self.assertEqual(overlay.pop('one'), '1')
+        overlay['three'] = 'III'
+        self.assertEqual(dict(overlay), {'two': 'II', 'three': 'III', 'four': '4'})
+        self.assertEqual(dict(base), {'one': '1', 'two': '2', 'three': '3'})
+        overlay.clear()
+        self.assertFalse(overlay)
+        self.assertEqual(len(overlay), 0)
+
+    def test_overlay_derive(self):
+        base = test_module.FrozenForm({'one': '1', 'two': '2'})
+        first = test_module.FormOverlay({}, base).derive({'one': None, 'three': '3'})
+        second = first.derive({'one': 'I', 'three': None})
+        self.assertEqual(dict(first), {'two': '2', 'three': '3'})
+        self.assertEqual(dict(second), {'one': 'I', 'two': '2'})
+        self.assertIs(first.base, base)
+        self.assertIs(second.base, base)
+
+    def test_overlay_lines(self):
+        calls = []
+
+        def counting_render(key, value):
+            calls.append(key)
+            return render(key, value)
+
+        base = test_module.FrozenForm({'one': '1', 'two': '2', 'three': '3'})
+        base.lines(counting_render)
+        calls.clear()
+        overlay = test_module.FormOverlay({'two': 'II', 'four': '4'}, base)
+        self.assertEqual(overlay.lines(counting_render), ['one=1;', 'two=II;', 'three=3;', 'four=4;'])
+        self.assertEqual(calls, ['two', 'four'])
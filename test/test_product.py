@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for the OpenPost cartesian product of form field values
+"""
+
+import itertools
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import openpost
+import openpost.product as test_module
+
+VALUES = {'a': ['1', '2', '3'], 'b': ['x', 'y'], 'c': ['p', 'q', 'r', 's']}
+
+
+def expected_product(values):
+    return [dict(zip(values.keys(), items)) for items in itertools.product(*values.values())]
+
+
+class MyTests(unittest.TestCase):
+
+    def test_product_size(self):
+        self.assertEqual(test_module.product_size(VALUES), 24)
+        self.assertEqual(test_module.product_size({'a': 'single'}), 1)
+        with self.assertRaises(ValueError):
+            test_module.product_size({'a': []})
+        with self.assertRaises(ValueError):
+            test_module.product_size([('a', ['1'])])
+
+    def test_iter_product(self):
+        self.assertEqual(list(test_module.iter_product(VALUES)), expected_product(VALUES))
+
+    def test_iter_product_range(self):
+        expected = expected_product(VALUES)
+        for start in range(25):
+            for stop in (start, start + 1, start + 7, None):
+                self.assertEqual(list(test_module.iter_product(VALUES, start, stop)), expected[start:stop])
+
+    def test_iter_product_lazy(self):
+        huge = {str(key): [str(value) for value in range(100)] for key in range(10)}
+        last = {str(key): '99' for key in range(10)}
+        self.assertEqual(test_module.product_size(huge), 10 ** 20)
+        items = list(test_module.iter_product(huge, start=10 ** 20 - 2))
+        self.assertEqual(items, [dict(last, **{'9': '98'}), last])
+
+    def test_render_product(self):
+        poster = openpost.OpenPost('localhost', form_data={'fixed': 'f'})
+        pages = list(poster.render_product({'a': ['1', '2'], 'b': ['x']}))
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(pages[1], openpost.OpenPost('localhost', form_data={'fixed': 'f', 'a': '2', 'b': 'x'}).make_html())
+
+    def check_written(self, temp_dir, count):
+        names = sorted(name for name in os.listdir(temp_dir) if name.endswith('.html'))
+        self.assertEqual(names, ['page-{0:02d}.html'.format(index) for index in range(count)])
+        with open(os.path.join(temp_dir, names[-1]), 'r', encoding='utf-8') as input_file:
+            self.assertIn(">s</textarea>", input_file.read())
+
+    def test_write_product(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'page'))
+            self.assertEqual(poster.write_product(VALUES), 24)
+            self.check_written(temp_dir, 24)
+            listed = openpost.list_files(temp_dir)
+            self.assertEqual(len(listed), 24)
+            self.assertTrue(all(expires is None for expires in listed.values()))
+
+    def test_write_product_threads(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'page'), keep_file=True)
+            with ThreadPoolExecutor(4) as executor:
+                self.assertEqual(poster.write_product(VALUES, executor=executor, chunk_size=5), 24)
+            self.check_written(temp_dir, 24)
+
+    def test_write_product_processes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'page'), keep_file=True)
+            with ProcessPoolExecutor(2) as executor:
+                self.assertEqual(poster.write_product(VALUES, executor=executor, chunk_size=7), 24)
+            self.check_written(temp_dir, 24)
+
+    def test_write_product_processes_archive(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            archive = openpost.Archive(os.path.join(temp_dir, 'archive'))
+            poster = openpost.OpenPost('localhost', os.path.join(temp_dir, 'page'), archive=archive, form_data={'fixed': 'f'})
+            with ProcessPoolExecutor(2) as executor:
+                self.assertEqual(poster.write_product(VALUES, executor=executor, chunk_size=7), 24)
+            self.check_written(temp_dir, 24)
+            self.assertIs(poster.archive, archive)
+            with open(os.path.join(temp_dir, 'page-00.html'), 'r', encoding='utf-8') as input_file:
+                self.assertIn(">f</textarea>", input_file.read())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for OpenPost sessions
+"""
+
+import os
+import tempfile
+import time
+import unittest
+import webbrowser
+from unittest import mock
+
+import openpost
+
+
+def mock_browser():
+    browser = mock.Mock()
+    browser.open.return_value = True
+    return mock.patch('webbrowser.get', return_value=browser)
+
+
+class MyTests(unittest.TestCase):
+
+    def test_session(self):
+        with mock_browser() as get_browser:
+            start = time.monotonic()
+            with openpost.OpenPost.session(url='localhost', time_to_live=0.5) as session:
+                for count in range(3):
+                    self.assertTrue(session.send(form_data={'count': str(count)}))
+                self.assertLess(time.monotonic() - start, 0.5)
+                self.assertEqual(session.pending, 3)
+                session.launcher.flush()
+                files = [call[0][0] for call in get_browser.return_value.open.call_args_list]
+                self.assertEqual(len(set(files)), 3)
+                self.assertTrue(all(os.path.dirname(name) == session.directory for name in files))
+                self.assertTrue(all(os.path.exists(name) for name in files))
+            self.assertGreaterEqual(time.monotonic() - start, 0.5)
+            self.assertEqual(get_browser.call_count, 1)
+            self.assertEqual(session.pending, 0)
+            self.assertFalse(os.path.exists(session.directory))
+            with self.assertRaises(ValueError):
+                session.send(form_data={'one': '1'})
+
+    def test_session_reap(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock_browser():
+                with openpost.OpenPost.session(directory=temp_dir, url='localhost') as session:
+                    first = session.post(form_data={'one': '1'}, time_to_live=0)
+                    self.assertTrue(first.send_post())
+                    second = session.post(form_data={'two': '2'}, keep_file=True)
+                    self.assertTrue(second.send_post())
+                    self.assertFalse(os.path.exists(first.output_file))
+                    self.assertEqual(session.pending, 0)
+                    third = session.post(form_data={'three': '3'}, time_to_live=60)
+                    self.assertTrue(third.send_post())
+                    start = time.monotonic()
+                    session.close(wait=False)
+                    self.assertLess(time.monotonic() - start, 1)
+                self.assertFalse(os.path.exists(third.output_file))
+                self.assertTrue(os.path.exists(second.output_file))
+                self.assertTrue(os.path.isdir(temp_dir))
+
+    def test_session_no_browser(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with mock.patch('webbrowser.get', side_effect=webbrowser.Error('no browser')):
+                before = openpost.get_metrics()['counters'].get('launch_failures', 0)
+                with openpost.OpenPost.session(directory=temp_dir, url='localhost') as session:
+                    page = session.post(form_data={'one': '1'}, keep_file=True)
+                    self.assertTrue(page.write_html())
+                    self.assertTrue(session.send(form_data={'two': '2'}, time_to_live=0))
+                    self.assertFalse(session.launcher.launch(['page.html']))
+                self.assertTrue(os.path.exists(page.output_file))
+                self.assertEqual(openpost.get_metrics()['counters']['launch_failures'], before + 2)